@@ -12,13 +12,13 @@ try:
 except Exception:
     HAVE_LITSERVE = False
 
-from ..core import Bot
+from ..core import get_bot
 from ..ai import Advisor
 
 if HAVE_LITSERVE:
     class AdviceEndpoint(Endpoint):
         def setup(self):
-            self.bot = Bot()
+            self.bot = get_bot()
             self.adv = Advisor()
 
         def predict(self, inp: Dict[str, Any]) -> Dict[str, Any]:
@@ -36,7 +36,7 @@ if HAVE_LITSERVE:
 
     class CleanEndpoint(Endpoint):
         def setup(self):
-            self.bot = Bot()
+            self.bot = get_bot()
 
         def predict(self, inp: Dict[str, Any]) -> Dict[str, Any]:
             file_b64 = inp.get("file_b64")
@@ -66,7 +66,7 @@ else:
         # Provide a shim object with to_fastapi for CLI reuse
         class Shim:
             def to_fastapi(self):
-                bot = Bot()
+                bot = get_bot()
                 adv = Advisor()
                 app = FastAPI()
 
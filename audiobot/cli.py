@@ -2,11 +2,10 @@ import argparse
 import sys
 from pathlib import Path
 
-from .processing.clean import clean_audio
-from .stems.demucs import separate_stems
-from .core import Bot
+from .core import get_bot
 
-# Optional ML training imports are lazy; we import inside handlers to avoid hard deps.
+# Heavy imports (scipy/pyloudnorm, numpy, ML, cloud SDKs) are lazy: handlers
+# import what they use, so `audiobot -h` and ffmpeg-only commands start fast.
 
 
 def cmd_clean(args: argparse.Namespace) -> int:
@@ -15,7 +14,7 @@ def cmd_clean(args: argparse.Namespace) -> int:
     out.parent.mkdir(parents=True, exist_ok=True)
     # ML denoiser path takes precedence when specified
     if getattr(args, "ml_model", ""):
-        bot = Bot()
+        bot = get_bot()
         res = bot.skills["denoise"].run(
             inp,
             out,
@@ -24,15 +23,22 @@ def cmd_clean(args: argparse.Namespace) -> int:
             chunk_seconds=getattr(args, "ml_chunk_seconds", 1.0),
             overlap_seconds=getattr(args, "ml_overlap", 0.1),
             device=(getattr(args, "ml_device", "") or None),
+            stereo_mode=getattr(args, "ml_stereo_mode", "channels"),
+            batch_size=getattr(args, "ml_batch_size", 16),
+            vad_gate=getattr(args, "ml_vad_gate", False),
+            vad_backend=getattr(args, "ml_vad_backend", "energy"),
+            max_rtf=getattr(args, "ml_max_rtf", None),
         )
         if not res.get("ok"):
             print("ML denoise failed:", res.get("log", ""))
             return 2
+        if res.get("vad"):
+            print(res.get("log", ""))
         print(f"Denoised (ML) -> {out}")
         return 0
     if args.preset:
         # Route to FFmpeg-based skill via Bot to honor presets
-        bot = Bot()
+        bot = get_bot()
         params = {
             "preset": args.preset,
             "air_bus": args.air_bus,
@@ -57,9 +63,8 @@ def cmd_clean(args: argparse.Namespace) -> int:
         }
         # Support DB presets via --preset db:NAME
         if str(args.preset).lower().startswith("db:"):
-            from .memory import Memory
             name = str(args.preset).split(":",1)[1]
-            dbp = Memory().get_preset(name)
+            dbp = bot.memory.get_preset(name)
             if isinstance(dbp, dict) and dbp:
                 params.update(dbp)
         res = bot.skills["clean"].run(inp, out, args.keep_float, **params)
@@ -69,6 +74,8 @@ def cmd_clean(args: argparse.Namespace) -> int:
         print(f"Cleaned (preset) -> {out}")
         return 0
     # Default Python DSP cleaner
+    from .processing.clean import clean_audio
+
     clean_audio(str(inp), str(out), target_lufs=args.lufs, deess=not args.no_deess)
     print(f"Cleaned -> {out}")
     return 0
@@ -78,25 +85,41 @@ def cmd_batch(args: argparse.Namespace) -> int:
     in_dir = Path(args.input)
     out_dir = Path(args.output)
     out_dir.mkdir(parents=True, exist_ok=True)
+    if getattr(args, "ml_model", ""):
+        # Chunks from all files share fixed-size inference batches
+        bot = get_bot()
+        pairs = [(p, out_dir / p.name) for p in sorted(in_dir.rglob("*.wav"))]
+        res = bot.skills["denoise_batch"].run(
+            pairs,
+            model_path=args.ml_model,
+            sample_rate=getattr(args, "ml_sample_rate", 48000),
+            chunk_seconds=getattr(args, "ml_chunk_seconds", 1.0),
+            overlap_seconds=getattr(args, "ml_overlap", 0.1),
+            device=(getattr(args, "ml_device", "") or None),
+            stereo_mode=getattr(args, "ml_stereo_mode", "channels"),
+            batch_size=getattr(args, "ml_batch_size", 32),
+            prefetch=getattr(args, "ml_prefetch", 8),
+            max_rtf=getattr(args, "ml_max_rtf", None),
+        )
+        for r in res.get("results", []):
+            if not r.get("ok"):
+                print("ML denoise failed for", r.get("input"), ":", r.get("log", ""))
+        if res.get("files") is None:
+            print("ML denoise failed:", res.get("log", ""))
+            return 2
+        rtf = res.get("rtf")
+        print(
+            f"Processed {res['files'] - res['failed']} files -> {out_dir} "
+            f"({res['audio_seconds']:.1f}s audio in {res['elapsed']:.1f}s"
+            + (f", RTF {rtf:.3f}" if rtf is not None else "")
+            + f", {res['batches']} batches, {100.0 * res['batch_fill']:.0f}% fill)"
+        )
+        return 1 if res["failed"] else 0
     count = 0
+    bot = get_bot() if getattr(args, "preset", "") else None
     for p in in_dir.rglob("*.wav"):
         dest = out_dir / p.name
-        if getattr(args, "ml_model", ""):
-            bot = Bot()
-            res = bot.skills["denoise"].run(
-                p,
-                dest,
-                model_path=args.ml_model,
-                sample_rate=getattr(args, "ml_sample_rate", 48000),
-                chunk_seconds=getattr(args, "ml_chunk_seconds", 1.0),
-                overlap_seconds=getattr(args, "ml_overlap", 0.1),
-                device=(getattr(args, "ml_device", "") or None),
-            )
-            if not res.get("ok"):
-                print("ML denoise failed for", p, ":", res.get("log", ""))
-                continue
-        elif getattr(args, "preset", ""):
-            bot = Bot()
+        if bot is not None:
             params = {
                 "preset": args.preset,
                 "air_bus": args.air_bus,
@@ -119,13 +142,14 @@ def cmd_batch(args: argparse.Namespace) -> int:
                 "post_deess_strength": args.post_deess_strength,
             }
             if str(args.preset).lower().startswith("db:"):
-                from .memory import Memory
                 name = str(args.preset).split(":",1)[1]
-                dbp = Memory().get_preset(name)
+                dbp = bot.memory.get_preset(name)
                 if isinstance(dbp, dict) and dbp:
                     params.update(dbp)
             bot.skills["clean"].run(p, dest, args.keep_float, **params)
         else:
+            from .processing.clean import clean_audio
+
             clean_audio(str(p), str(dest), target_lufs=args.lufs, deess=not args.no_deess)
         count += 1
     print(f"Processed {count} files -> {out_dir}")
@@ -136,7 +160,23 @@ def cmd_stems(args: argparse.Namespace) -> int:
     inp = Path(args.input)
     out_dir = Path(args.output)
     out_dir.mkdir(parents=True, exist_ok=True)
-    ok = separate_stems(str(inp), str(out_dir))
+    if getattr(args, "compare", False):
+        from .stems.demucs import separate_stems_result
+
+        single = separate_stems_result(str(inp), str(out_dir / "single"), model=args.model, cache=False)
+        chunked = separate_stems_result(str(inp), str(out_dir), model=args.model, jobs=args.jobs or 0, segment=args.segment or None, overlap=args.overlap, cache=False)
+        if not (single.get("ok") and chunked.get("ok")):
+            print("Separation failed:", single.get("log", ""), chunked.get("log", ""))
+            return 2
+        # the first single call may include the model load; report it separately
+        s_el, c_el = single["elapsed"] - single.get("load_s", 0.0), chunked["elapsed"] - chunked.get("load_s", 0.0)
+        print(f"single invocation: {single['elapsed']:.1f}s (model load {single.get('load_s', 0.0):.1f}s)")
+        print(f"chunked: {chunked['elapsed']:.1f}s ({chunked['segments']} chunks, {chunked['jobs']} processes, model load {chunked.get('load_s', 0.0):.1f}s)")
+        print(f"speedup excluding load: {s_el / max(c_el, 1e-9):.2f}x")
+        return 0
+    from .stems.demucs import separate_stems
+
+    ok = separate_stems(str(inp), str(out_dir), model=args.model, jobs=args.jobs, segment=args.segment or None, overlap=args.overlap, cache=not args.no_cache)
     if not ok:
         print("Warning: demucs not available; no stems created.")
     else:
@@ -168,6 +208,21 @@ def cmd_serve_lit(args: argparse.Namespace) -> int:
     return 0
 
 
+def _arch_arg(v: str) -> int:
+    # argparse types for the denoiser size overrides; 0 keeps the --size value
+    n = int(v)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"must be positive (0 keeps the size's value), got {n}")
+    return n
+
+
+def _kernel_arg(v: str) -> int:
+    n = _arch_arg(v)
+    if n and n % 2 == 0:
+        raise argparse.ArgumentTypeError(f"kernel size must be odd, got {n}")
+    return n
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="audiobot", description="Holy Spirit Vocal Engine CLI")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -197,6 +252,11 @@ def build_parser() -> argparse.ArgumentParser:
     pc.add_argument("--ml-chunk-seconds", type=float, default=1.0)
     pc.add_argument("--ml-overlap", type=float, default=0.1)
     pc.add_argument("--ml-device", type=str, default="", help="cpu or cuda (auto if empty)")
+    pc.add_argument("--ml-stereo-mode", choices=["channels", "mid_side"], default="channels", help="Denoise stereo per channel or as mid/side")
+    pc.add_argument("--ml-batch-size", type=int, default=16, help="Chunks per inference batch (all channels share batches)")
+    pc.add_argument("--ml-vad-gate", action="store_true", help="Run the model only on voice-active regions; attenuate silence")
+    pc.add_argument("--ml-vad-backend", choices=["energy", "silero"], default="energy")
+    pc.add_argument("--ml-max-rtf", type=float, default=None, help="Refuse models whose benchmarked realtime factor exceeds this")
     pc.set_defaults(func=cmd_clean)
 
     pb = sub.add_parser("batch", help="Batch process all WAVs in a folder")
@@ -223,13 +283,108 @@ def build_parser() -> argparse.ArgumentParser:
     pb.add_argument("--ml-chunk-seconds", type=float, default=1.0)
     pb.add_argument("--ml-overlap", type=float, default=0.1)
     pb.add_argument("--ml-device", type=str, default="")
+    pb.add_argument("--ml-stereo-mode", choices=["channels", "mid_side"], default="channels")
+    pb.add_argument("--ml-batch-size", type=int, default=32, help="Chunks per shared cross-file inference batch")
+    pb.add_argument("--ml-prefetch", type=int, default=8, help="Decoded files buffered ahead of inference")
+    pb.add_argument("--ml-max-rtf", type=float, default=None, help="Refuse models whose benchmarked realtime factor exceeds this")
     pb.set_defaults(func=cmd_batch)
 
     ps = sub.add_parser("stems", help="Demucs stem separation (if available)")
     ps.add_argument("input")
     ps.add_argument("-o", "--output", required=True)
+    ps.add_argument("--model", default="htdemucs")
+    ps.add_argument("-j", "--jobs", type=int, default=1, help="Processes for chunked separation (0 = all cores; 1 = single resident call)")
+    ps.add_argument("--segment", type=float, default=0.0, help="Chunk length in seconds (default 30 when chunking)")
+    ps.add_argument("--overlap", type=float, default=1.0, help="Seconds shared by neighbouring chunks (crossfaded)")
+    ps.add_argument("--compare", action="store_true", help="Also run the single-invocation path and report wall times")
+    ps.add_argument("--no-cache", action="store_true", help="Always separate; do not read or fill the stem cache")
     ps.set_defaults(func=cmd_stems)
 
+    pvc = sub.add_parser("vocal-chain", help="Separate stems, then clean the vocals while the other stems are published")
+    pvc.add_argument("input")
+    pvc.add_argument("-o", "--output", required=True, help="Directory for stems and the cleaned stem")
+    pvc.add_argument("--model", default="htdemucs")
+    pvc.add_argument("--target", default="vocals", help="Stem to clean")
+    pvc.add_argument("--preset", default="", help="Clean preset (built-in name or db:NAME)")
+    pvc.add_argument("--ml-model", default="", help="Denoise the stem with this checkpoint (or auto[:rtf]) instead")
+    pvc.add_argument("-j", "--jobs", type=int, default=1, help="Processes for chunked separation")
+    pvc.add_argument("--segment", type=float, default=0.0)
+    pvc.add_argument("--keep-float", action="store_true")
+    def _cmd_vocal_chain(a: argparse.Namespace) -> int:
+        out_dir = Path(a.output)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        r = get_bot().skills["vocal_chain"].run(
+            Path(a.input), out_dir, model=a.model, target=a.target, preset=a.preset, ml_model=a.ml_model, jobs=a.jobs, segment=a.segment or None, keep_float=a.keep_float
+        )
+        print(r["log"])
+        if r.get("output"):
+            print(f"{a.target} -> {r['output']}")
+        if r.get("timings"):
+            print(" ".join(f"{k}={v:.2f}s" for k, v in r["timings"].items()))
+        return 0 if r["ok"] else 2
+    pvc.set_defaults(func=_cmd_vocal_chain)
+
+    ppp = sub.add_parser("preprocess", help="VAD → speech concat → vocal separation → dereverb for a file or a whole folder")
+    ppp.add_argument("input", help="Audio file or directory")
+    ppp.add_argument("-o", "--output", required=True, help="Output file (file input) or directory")
+    ppp.add_argument("--pattern", default="*.wav", help="Glob for directory input")
+    ppp.add_argument("-j", "--workers", type=int, default=0, help="Processes for VAD/dereverb (default: cores - 1)")
+    ppp.add_argument("--model", default="htdemucs", help="Separation model kept resident in the worker")
+    ppp.add_argument("--no-separate", action="store_true", help="Skip vocal separation")
+    ppp.add_argument("--scratch", default="", help="Scratch dir for intermediates (default: $AUDIOBOT_SCRATCH, /dev/shm, system temp)")
+    ppp.add_argument("--scratch-mb", type=int, default=2048, help="Max MB of intermediates in flight")
+    ppp.add_argument("--report", default="", help="Write per-file stage timings as JSON here")
+    def _cmd_preprocess(a: argparse.Namespace) -> int:
+        from .pipeline.preprocess import preprocess_dir, preprocess_file
+
+        inp = Path(a.input)
+        if inp.is_file():
+            r = preprocess_file(inp, Path(a.output))
+            print(f"{r.segments_count} segments -> {r.output}  " + " ".join(f"{k}={v:.2f}s" for k, v in (r.timings or {}).items()))
+            return 0
+
+        def _line(f):
+            t = " ".join(f"{k}={v:.2f}s" for k, v in f.get("timings", {}).items())
+            print(f"{'ok ' if f['ok'] else 'ERR'} {f['input']}  {t}  {f.get('log', '')}".rstrip())
+
+        res = preprocess_dir(
+            inp,
+            Path(a.output),
+            pattern=a.pattern,
+            workers=a.workers or None,
+            separate=not a.no_separate,
+            model=a.model,
+            scratch_bytes=a.scratch_mb << 20,
+            scratch_root=a.scratch or None,
+            on_file=_line,
+        )
+        print(res["log"])
+        if res.get("stages"):
+            print("stage totals: " + " ".join(f"{k}={v:.1f}s" for k, v in res["stages"].items()))
+        if a.report:
+            import json
+
+            Path(a.report).write_text(json.dumps(res, indent=2), encoding="utf-8")
+        return 0 if res["ok"] else 2
+    ppp.set_defaults(func=_cmd_preprocess)
+
+    pss = sub.add_parser("serve-sep", help="Keep separation models resident and serve jobs over a local socket")
+    pss.add_argument("--address", default="", help="host:port or Unix socket path (default: $AUDIOBOT_SEP_ADDRESS or 127.0.0.1:50071)")
+    pss.add_argument("--loader", default="", help="module:function returning a separator (default: in-process Demucs)")
+    pss.add_argument("--preload", action="append", default=[], help="Model name to load at startup (repeatable)")
+    def _cmd_serve_sep(a: argparse.Namespace) -> int:
+        from .stems.service import DEFAULT_ADDRESS, SERVICE_ENV, serve
+        from .stems.worker import DEFAULT_LOADER
+        import os
+
+        try:
+            serve(a.address or os.getenv(SERVICE_ENV) or DEFAULT_ADDRESS, loader=a.loader or DEFAULT_LOADER, preload=tuple(a.preload))
+        except RuntimeError as e:
+            print(f"serve-sep: {e}", file=sys.stderr)
+            return 2
+        return 0
+    pss.set_defaults(func=_cmd_serve_sep)
+
     pw = sub.add_parser("serve-web", help="Run FastAPI web server")
     pw.add_argument("-H", "--host", default="127.0.0.1")
     pw.add_argument("-p", "--port", type=int, default=8000)
@@ -245,7 +400,7 @@ def build_parser() -> argparse.ArgumentParser:
     pvd.add_argument("url")
     pvd.add_argument("-o", "--output", default="web/uploads")
     def _cmd_vd(a: argparse.Namespace) -> int:
-        bot = Bot()
+        bot = get_bot()
         res = bot.skills["download"].run(a.url, a.output)
         if not res.get("ok"):
             print("Download failed:", res.get("log", ""))
@@ -259,7 +414,7 @@ def build_parser() -> argparse.ArgumentParser:
     pva.add_argument("url")
     pva.add_argument("-o", "--output", default="web/outputs")
     def _cmd_va(a: argparse.Namespace) -> int:
-        bot = Bot()
+        bot = get_bot()
         d = bot.skills["download"].run(a.url, "web/uploads")
         if not d.get("ok") or not d.get("path"):
             print("Download failed:", d.get("log", ""))
@@ -281,7 +436,7 @@ def build_parser() -> argparse.ArgumentParser:
     pvs.add_argument("url")
     pvs.add_argument("-o", "--output", default="web/outputs")
     def _cmd_vs(a: argparse.Namespace) -> int:
-        bot = Bot()
+        bot = get_bot()
         d = bot.skills["download"].run(a.url, "web/uploads")
         if not d.get("ok") or not d.get("path"):
             print("Download failed:", d.get("log", ""))
@@ -294,6 +449,8 @@ def build_parser() -> argparse.ArgumentParser:
         if not e.get("ok"):
             print("Extract failed:", e.get("log", ""))
             return 2
+        from .stems.demucs import separate_stems
+
         ok = separate_stems(str(wav), str(out_dir))
         if not ok:
             print("Warning: demucs not available; no stems created.")
@@ -314,6 +471,23 @@ def build_parser() -> argparse.ArgumentParser:
     ptn.add_argument("--lr", type=float, default=1e-3)
     ptn.add_argument("--outdir", default="web/outputs/models")
     ptn.add_argument("--save-onnx", action="store_true")
+    ptn.add_argument("--causal", action="store_true", help="Train the causal (streaming) variant")
+    ptn.add_argument("--size", choices=["tiny", "small", "base", "large"], default="base", help="Model size family")
+    ptn.add_argument("--channels", type=_arch_arg, default=0, help="Override the size's conv channels")
+    ptn.add_argument("--layers", type=_arch_arg, default=0, help="Override the size's residual block count")
+    ptn.add_argument("--kernel-size", type=_kernel_arg, default=0, help="Override the size's kernel size (odd)")
+    ptn.add_argument("--cache-dir", default="", help="Decode the dataset once into mmap shards here (reused across runs)")
+    ptn.add_argument("--manifest-dir", default="", help="Where to cache dataset manifests (default: inside each data dir)")
+    ptn.add_argument("--rebuild-manifest", action="store_true", help="Rescan data dirs instead of using cached manifests")
+    ptn.add_argument("--download-workers", type=int, default=8, help="Concurrent downloads when staging gs:// data")
+    ptn.add_argument("--seed", type=int, default=1234)
+    ptn.add_argument("--val-fraction", type=float, default=0.1, help="Share of files held out for validation (split by path hash)")
+    ptn.add_argument("--bench-clip", default="", help="Clean WAV for the end-of-training benchmark (default: 60 s of val data)")
+    ptn.add_argument("--no-bench", action="store_true", help="Skip the end-of-training latency/quality benchmark")
+    ptn.add_argument("--procs", type=int, default=0, help="CPU DDP over gloo with N processes (0: single process)")
+    ptn.add_argument("--threads-per-proc", type=int, default=0, help="Torch threads per process (0: cores / procs - workers)")
+    ptn.add_argument("--max-steps", type=int, default=-1)
+    ptn.add_argument("--scaling-sweep", default="", help="e.g. 1,2,4: short run per process count, then a samples/s table")
     def _cmd_train_noise(a: argparse.Namespace) -> int:
         try:
             from .pipeline.train_noise import main as train_main  # type: ignore
@@ -337,9 +511,48 @@ def build_parser() -> argparse.ArgumentParser:
         ]
         if a.save_onnx:
             argv.append("--save-onnx")
+        if a.causal:
+            argv.append("--causal")
+        argv += ["--size", a.size, "--channels", str(a.channels), "--layers", str(a.layers), "--kernel-size", str(a.kernel_size)]
+        if a.cache_dir:
+            argv += ["--cache-dir", a.cache_dir]
+        if a.manifest_dir:
+            argv += ["--manifest-dir", a.manifest_dir]
+        if a.rebuild_manifest:
+            argv.append("--rebuild-manifest")
+        argv += ["--download-workers", str(a.download_workers), "--seed", str(a.seed)]
+        argv += ["--procs", str(a.procs), "--threads-per-proc", str(a.threads_per_proc), "--max-steps", str(a.max_steps)]
+        argv += ["--val-fraction", str(a.val_fraction)]
+        if a.bench_clip:
+            argv += ["--bench-clip", a.bench_clip]
+        if a.no_bench:
+            argv.append("--no-bench")
+        if a.scaling_sweep:
+            argv += ["--scaling-sweep", a.scaling_sweep]
         return train_main(argv)
     ptn.set_defaults(func=_cmd_train_noise)
 
+    # One-time dataset compile into memory-mapped shards
+    pcd = sub.add_parser("compile-dataset", help="Pre-decode training WAVs into memory-mapped shards")
+    pcd.add_argument("--clean-dir", required=True)
+    pcd.add_argument("--noisy-dir", default="")
+    pcd.add_argument("--cache-dir", required=True)
+    pcd.add_argument("--sample-rate", type=int, default=48000)
+    pcd.add_argument("--rebuild-manifest", action="store_true", help="Rescan data dirs instead of using cached manifests")
+    def _cmd_compile_dataset(a: argparse.Namespace) -> int:
+        try:
+            from .pipeline.datasets import AudioDataConfig, AudioDataset  # type: ignore
+        except Exception as e:
+            print("Training deps missing. Install torch, librosa, soundfile.")
+            print(e)
+            return 2
+        cfg = AudioDataConfig(sample_rate=a.sample_rate, pair_dirs=bool(a.noisy_dir), cache_dir=a.cache_dir, rebuild_manifest=a.rebuild_manifest)
+        ds = AudioDataset(clean_dir=a.clean_dir, noisy_dir=(a.noisy_dir or None), cfg=cfg)
+        total = float(ds.clean_index.lengths().sum()) / a.sample_rate if ds.clean_index is not None else 0.0
+        print(f"Cached {len(ds.clean_paths)} files ({len(ds)} crops/epoch,  {total / 3600.0:.2f} h) -> {a.cache_dir}")
+        return 0
+    pcd.set_defaults(func=_cmd_compile_dataset)
+
     # Vertex AI training job submission
     pvx = sub.add_parser("vertex-train-noise", help="Submit Vertex AI CustomTrainingJob for denoiser")
     pvx.add_argument("--project", required=True)
@@ -406,8 +619,13 @@ def build_parser() -> argparse.ArgumentParser:
     pdi.add_argument("--ml-chunk-seconds", type=float, default=1.0)
     pdi.add_argument("--ml-overlap", type=float, default=0.1)
     pdi.add_argument("--ml-device", type=str, default="")
+    pdi.add_argument("--ml-stereo-mode", choices=["channels", "mid_side"], default="channels")
+    pdi.add_argument("--ml-batch-size", type=int, default=16)
+    pdi.add_argument("--ml-vad-gate", action="store_true")
+    pdi.add_argument("--ml-vad-backend", choices=["energy", "silero"], default="energy")
+    pdi.add_argument("--ml-max-rtf", type=float, default=None, help="Refuse models whose benchmarked realtime factor exceeds this")
     def _cmd_infer_noise(a: argparse.Namespace) -> int:
-        bot = Bot()
+        bot = get_bot()
         res = bot.skills["denoise"].run(
             Path(a.input),
             Path(a.output),
@@ -416,14 +634,142 @@ def build_parser() -> argparse.ArgumentParser:
             chunk_seconds=a.ml_chunk_seconds,
             overlap_seconds=a.ml_overlap,
             device=(a.ml_device or None),
+            stereo_mode=a.ml_stereo_mode,
+            batch_size=a.ml_batch_size,
+            vad_gate=a.ml_vad_gate,
+            vad_backend=a.ml_vad_backend,
+            max_rtf=a.ml_max_rtf,
         )
         if not res.get("ok"):
             print("Denoise failed:", res.get("log", ""))
             return 2
+        if res.get("vad"):
+            print(res.get("log", ""))
         print("Denoised ->", res.get("output"))
         return 0
     pdi.set_defaults(func=_cmd_infer_noise)
 
+    # Streaming (causal) denoiser realtime check
+    psb = sub.add_parser("stream-bench", help="Measure causal streaming denoiser realtime factor on one CPU core")
+    psb.add_argument("--ml-model", required=True)
+    psb.add_argument("--ml-sample-rate", type=int, default=48000)
+    psb.add_argument("--frame-ms", type=float, default=10.0)
+    psb.add_argument("--seconds", type=float, default=10.0)
+    def _cmd_stream_bench(a: argparse.Namespace) -> int:
+        from .skills.ml_stream import load_streaming_denoiser
+
+        engine = load_streaming_denoiser(a.ml_model, sample_rate=a.ml_sample_rate, frame_ms=a.frame_ms)
+        r = engine.benchmark(seconds=a.seconds, threads=1)
+        print(f"frame {r['frame']} samples, algorithmic latency {r['latency_ms']:.1f} ms, RTF {r['rtf']:.3f} (1 thread)")
+        return 0 if r["rtf"] < 1.0 else 2
+    psb.set_defaults(func=_cmd_stream_bench)
+
+    # Model registry: sizes and measured realtime factor on this machine
+    pmm = sub.add_parser("ml-models", help="List denoiser checkpoints with their realtime factor here; --max-rtf picks one")
+    pmm.add_argument("--dir", action="append", default=[], help="Model dir (default: web/outputs/models and $AUDIOBOT_MODEL_DIRS)")
+    pmm.add_argument("--max-rtf", type=float, default=None)
+    pmm.add_argument("--refresh", action="store_true", help="Re-measure instead of using cached timings")
+    def _cmd_ml_models(a: argparse.Namespace) -> int:
+        from .skills.ml_registry import discover, machine_rtf, select_model
+
+        dirs = [Path(d) for d in a.dir] or None
+        infos = discover(dirs)
+        if not infos:
+            print("No denoiser checkpoints found")
+            return 1
+        for i in infos:
+            rtf = machine_rtf(i, refresh=a.refresh)
+            arch = i.arch
+            print(f"{i.path}  {i.params / 1e3:8.0f}k params  {arch['channels']}ch x{arch['n_layers']} k{arch['kernel_size']}{' causal' if i.causal else ''}  RTF {rtf:.3f}")
+        if a.max_rtf is not None:
+            res = select_model(a.max_rtf, dirs=dirs)
+            print(res["log"])
+            return 0 if res["ok"] else 2
+        return 0
+    pmm.set_defaults(func=_cmd_ml_models)
+
+    pbi = sub.add_parser("bench-import", help="Cold-start wall time and an -X importtime report for a CLI command")
+    pbi.add_argument("-n", "--runs", type=int, default=5, help="Cold starts to time")
+    pbi.add_argument("--top", type=int, default=15, help="Slowest imports to list (cumulative)")
+    pbi.add_argument("--budget-ms", type=float, default=300.0, help="Exit 1 when the median start exceeds this")
+    pbi.add_argument("cmd", nargs=argparse.REMAINDER, help="Command to start (default: clean --help)")
+    def _cmd_bench_import(a: argparse.Namespace) -> int:
+        import statistics
+        import subprocess
+        import time
+
+        argv = [sys.executable, "-m", "audiobot.cli", *(a.cmd or ["clean", "--help"])]
+        walls = []
+        for _ in range(max(1, a.runs)):
+            t0 = time.perf_counter()
+            subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            walls.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"])
+        bare = (time.perf_counter() - t0) * 1000
+        proc = subprocess.run([sys.executable, "-X", "importtime", *argv[1:]], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        rows = []  # (cumulative us, self us, module, depth)
+        for line in proc.stderr.splitlines():
+            parts = line[len("import time:") :].split("|") if line.startswith("import time:") else []
+            if len(parts) != 3 or not parts[0].strip().isdigit():
+                continue
+            name = parts[2].rstrip()
+            rows.append((int(parts[1]), int(parts[0]), name.strip(), (len(name) - len(name.lstrip()) - 1) // 2))
+        total = sum(r[0] for r in rows if r[3] == 0)
+        median = statistics.median(walls)
+        print(f"{' '.join(argv[3:])}: median {median:.0f} ms over {len(walls)} cold starts (bare interpreter {bare:.0f} ms), imports {total / 1000:.0f} ms")
+        for cum, own, name, depth in sorted(rows, reverse=True)[: a.top]:
+            print(f"  {cum / 1000:8.1f} ms  {own / 1000:7.1f} ms self  {'  ' * depth}{name}")
+        return 0 if median <= a.budget_ms else 1
+    pbi.set_defaults(func=_cmd_bench_import)
+
+    pdb = sub.add_parser("db", help="Job/metrics database maintenance")
+    dbsub = pdb.add_subparsers(dest="db_cmd", required=True)
+    pdbb = dbsub.add_parser("bench", help="Concurrent writers: per-call connections vs the pooled WAL connection vs the write-behind journal")
+    pdbb.add_argument("--writers", type=int, default=32)
+    pdbb.add_argument("--jobs", type=int, default=50, help="Jobs (each with two metrics) per writer")
+    def _cmd_db_bench(a: argparse.Namespace) -> int:
+        import tempfile
+
+        from .memory import bench_writers
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in ("per-call", "pooled", "journal"):
+                r = bench_writers(Path(tmp) / f"bench_{mode}.db", writers=a.writers, jobs=a.jobs, mode=mode)
+                print(
+                    f"{r['mode']:>8}: {r['jobs']} jobs in {r['elapsed']:.2f}s ({r['jobs_per_s']:.0f}/s)  "
+                    f"p50 {r['p50_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms  locked errors {r['errors']}"
+                )
+        return 0
+    pdbb.set_defaults(func=_cmd_db_bench)
+
+    pdbc = dbsub.add_parser("compact", help="Roll up finished days, prune old jobs and reclaim space")
+    pdbc.add_argument("--db", default="", help="Database path (default data/audiobot.db)")
+    pdbc.add_argument("--days", type=float, default=None, help="Delete jobs older than this (default $AUDIOBOT_DB_RETAIN_DAYS or 90; 0 keeps all)")
+    pdbc.add_argument("--max-rows", type=int, default=None, help="Keep at most this many jobs per kind (default $AUDIOBOT_DB_RETAIN_ROWS; 0 = no limit)")
+    pdbc.add_argument("--params-days", type=float, default=0.0, help="Drop the params JSON of jobs older than this")
+    pdbc.add_argument("--trends", action="store_true", help="Print the daily rollups afterwards")
+    def _cmd_db_compact(a: argparse.Namespace) -> int:
+        import os
+
+        from .memory import DEFAULT_DB, RETAIN_DAYS_ENV, RETAIN_ROWS_ENV, Memory
+
+        mem = Memory(Path(a.db) if a.db else DEFAULT_DB)
+        days = a.days if a.days is not None else float(os.getenv(RETAIN_DAYS_ENV, "90"))
+        rows = a.max_rows if a.max_rows is not None else int(os.getenv(RETAIN_ROWS_ENV, "0"))
+        r = mem.compact(max_age_days=days or None, max_rows_per_kind=rows or None, params_days=a.params_days or None)
+        p = r["pruned"]
+        print(
+            f"rolled up {r['rolled_up_days']} days; pruned {p['jobs']} jobs, {p['metrics']} metrics, params of {p['params']}; "
+            f"{r['bytes_before'] / 1e6:.1f} MB -> {r['bytes_after'] / 1e6:.1f} MB in {r['elapsed']:.1f}s"
+        )
+        if a.trends:
+            for d in mem.rollups():
+                ms = " ".join(f"{k}={v['mean']:.3g}/p95 {v['p95']:.3g}" for k, v in sorted(d["metrics"].items()))
+                print(f"{d['day']} {d['kind']:<12} {d['jobs']:>6} jobs  ok {d['ok_rate']:.0%}  {ms}".rstrip())
+        return 0
+    pdbc.set_defaults(func=_cmd_db_compact)
+
     return p
 
 
@@ -1,14 +1,94 @@
 from __future__ import annotations
 
 import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .memory import Memory
-from .skills import build_filter_chain, clean_audio, separate_stems, analyze_audio, transcribe_audio
-from .sync.gcs import upload_if_configured
-from .sync.ipfs import pin_file
+
+
+# Built-in "db:" presets, added to a database once; bump PRESET_SEED_VERSION
+# to add new entries to existing databases (user edits are never overwritten).
+PRESET_SEED_VERSION = 1
+DEFAULT_PRESETS: Dict[str, Dict[str, Any]] = {
+    "VERY_NOISY_VOX": {
+        "preset": "very_noisy_vox",
+        "noise_reduce": 12.0,
+        "noise_floor": -28.0,
+        "deess_center": 0.25,
+        "deess_strength": 1.2,
+        "highpass": 80,
+        "lowpass": 18000,
+        "limiter": 0.95,
+        "gate": True,
+        "air_bus": True,
+        "air_mix": 0.2,
+        "declick": True,
+        "declip": True,
+        "post_deess_center": 0.35,
+        "post_deess_strength": 0.0,
+    },
+    "LOUD_SLAM": {
+        "preset": "very_noisy_vox",
+        "noise_reduce": 10.0,
+        "noise_floor": -30.0,
+        "deess_center": 0.28,
+        "deess_strength": 1.3,
+        "highpass": 90,
+        "lowpass": 18000,
+        "limiter": 0.99,
+        "gate": True,
+        "air_bus": True,
+        "air_mix": 0.22,
+        "declick": True,
+        "declip": True,
+        "post_deess_center": 0.35,
+        "post_deess_strength": 0.6,
+    },
+    "VERY_LOUD_CRISPY": {
+        "preset": "very_loud_crispy",
+        "noise_reduce": 8.0,
+        "noise_floor": -30.0,
+        "deess_center": 0.28,
+        "deess_strength": 1.3,
+        "highpass": 90,
+        "lowpass": 20000,
+        "limiter": 0.99,
+        "gate": True,
+        "air_bus": True,
+        "air_mix": 0.25,
+        "declick": True,
+        "declip": True,
+        "post_deess_center": 0.35,
+        "post_deess_strength": 0.4,
+    },
+    "MAX_LOUDNESS": {
+        "preset": "max_loudness",
+        "noise_reduce": 8.0,
+        "noise_floor": -32.0,
+        "deess_center": 0.30,
+        "deess_strength": 1.4,
+        "highpass": 100,
+        "lowpass": 20000,
+        "limiter": 0.99,
+        "gate": True,
+        "gate_thresh_db": -45.0,
+        "air_bus": True,
+        "air_mix": 0.30,
+        "air_highpass_hz": 10000,
+        "air_shelf_gain_db": 4.0,
+        "air_deess_strength": 1.6,
+        "declick": True,
+        "declip": True,
+        "post_deess_center": 0.35,
+        "post_deess_strength": 0.7,
+    },
+}
 
 
 @dataclass
@@ -38,101 +118,15 @@ class Bot:
         self.register("inspect", self._skill_inspect, "Inspect audio properties")
         # self.register("download", self._skill_download, "Download video by URL (yt-dlp)")
         # self.register("extract", self._skill_extract, "Extract audio track from media")
-        # Seed default presets if missing
+        # Seed default presets once per database (best-effort; ignore DB errors here)
         try:
-            if not self.memory.get_preset("VERY_NOISY_VOX"):
-                self.memory.save_preset(
-                    "VERY_NOISY_VOX",
-                    {
-                        "preset": "very_noisy_vox",
-                        "noise_reduce": 12.0,
-                        "noise_floor": -28.0,
-                        "deess_center": 0.25,
-                        "deess_strength": 1.2,
-                        "highpass": 80,
-                        "lowpass": 18000,
-                        "limiter": 0.95,
-                        "gate": True,
-                        "air_bus": True,
-                        "air_mix": 0.2,
-                        "declick": True,
-                        "declip": True,
-                        "post_deess_center": 0.35,
-                        "post_deess_strength": 0.0,
-                    },
-                )
-            if not self.memory.get_preset("LOUD_SLAM"):
-                self.memory.save_preset(
-                    "LOUD_SLAM",
-                    {
-                        "preset": "very_noisy_vox",
-                        "noise_reduce": 10.0,
-                        "noise_floor": -30.0,
-                        "deess_center": 0.28,
-                        "deess_strength": 1.3,
-                        "highpass": 90,
-                        "lowpass": 18000,
-                        "limiter": 0.99,
-                        "gate": True,
-                        "air_bus": True,
-                        "air_mix": 0.22,
-                        "declick": True,
-                        "declip": True,
-                        "post_deess_center": 0.35,
-                        "post_deess_strength": 0.6,
-                    },
-                )
-            if not self.memory.get_preset("VERY_LOUD_CRISPY"):
-                self.memory.save_preset(
-                    "VERY_LOUD_CRISPY",
-                    {
-                        "preset": "very_loud_crispy",
-                        "noise_reduce": 8.0,
-                        "noise_floor": -30.0,
-                        "deess_center": 0.28,
-                        "deess_strength": 1.3,
-                        "highpass": 90,
-                        "lowpass": 20000,
-                        "limiter": 0.99,
-                        "gate": True,
-                        "air_bus": True,
-                        "air_mix": 0.25,
-                        "declick": True,
-                        "declip": True,
-                        "post_deess_center": 0.35,
-                        "post_deess_strength": 0.4,
-                    },
-                )
-            if not self.memory.get_preset("MAX_LOUDNESS"):
-                self.memory.save_preset(
-                    "MAX_LOUDNESS",
-                    {
-                        "preset": "max_loudness",
-                        "noise_reduce": 8.0,
-                        "noise_floor": -32.0,
-                        "deess_center": 0.30,
-                        "deess_strength": 1.4,
-                        "highpass": 100,
-                        "lowpass": 20000,
-                        "limiter": 0.99,
-                        "gate": True,
-                        "gate_thresh_db": -45.0,
-                        "air_bus": True,
-                        "air_mix": 0.30,
-                        "air_highpass_hz": 10000,
-                        "air_shelf_gain_db": 4.0,
-                        "air_deess_strength": 1.6,
-                        "declick": True,
-                        "declip": True,
-                        "post_deess_center": 0.35,
-                        "post_deess_strength": 0.7,
-                    },
-                )
+            self.memory.seed_presets(DEFAULT_PRESETS, PRESET_SEED_VERSION)
         except Exception:
-            # Preset seeding is best-effort; ignore DB errors here
             pass
         self.register("transcribe", self._skill_transcribe, "Transcribe audio with Google Speech-to-Text")
         self.register("denoise", self._skill_denoise, "ML denoiser inference (PyTorch/ONNX)")
+        self.register("denoise_batch", self._skill_denoise_batch, "Cross-file batched ML denoiser inference")
+        self.register("vocal_chain", self._skill_vocal_chain, "Separate stems, then clean the vocals while the other stems publish")
 
     # Skill wrappers using memory bookkeeping
     def _skill_clean(
@@ -142,32 +136,21 @@ class Bot:
         keep_float: bool = False,
         **params: Any,
     ) -> Dict[str, Any]:
+        from .skills import analyze_audio, build_filter_chain, clean_audio
+
         input_path = Path(input_path)
         output_path = Path(output_path) if output_path else input_path.with_name(f"{input_path.stem}_clean.wav")
         af = build_filter_chain(**params)
         proc = clean_audio(input_path, output_path, af, keep_float)
         ok = output_path.exists() and output_path.stat().st_size > 0 and proc.returncode == 0
-        job_id = self.memory.record_job("clean", str(input_path), str(output_path), {"keep_float": keep_float, **params}, ok)
         # Quick metrics
         metrics = analyze_audio(output_path) if ok else {}
-        if metrics:
-            if metrics.get("rms") is not None:
-                self.memory.record_metric(job_id, "rms", float(metrics["rms"]))
-            if metrics.get("peak") is not None:
-                self.memory.record_metric(job_id, "peak", float(metrics["peak"]))
+        self.memory.log_job("clean", str(input_path), str(output_path), {"keep_float": keep_float, **params}, ok, {"rms": metrics.get("rms"), "peak": metrics.get("peak")})
         ipfs = None
         gs_url = None
         if ok:
-            try:
-                gs_url = upload_if_configured(str(output_path))
-            except Exception:
-                gs_url = None
-            try:
-                pin = pin_file(str(output_path))
-                if pin:
-                    ipfs = {"cid": pin.get("cid", ""), "url": pin.get("gateway_url")}
-            except Exception:
-                ipfs = None
+            pub = self._publish(output_path)
+            gs_url, ipfs = pub["gcs"], pub["ipfs"]
         return {"ok": ok, "output": str(output_path) if ok else None, "gcs": gs_url, "ipfs": ipfs, "log": proc.stdout}
 
     def _skill_separate(
@@ -177,32 +160,131 @@ class Bot:
         model: str = "htdemucs",
         stems: int = 4,
         two_stems_target: str = "vocals",
+        jobs: int = 1,
+        segment: Optional[float] = None,
+        overlap: float = 1.0,
+        cache: bool = True,
     ) -> Dict[str, Any]:
+        from .skills import separate_stems
+
         input_path = Path(input_path)
         output_base = Path(output_base) if output_base else input_path.parent
-        res = separate_stems(input_path, output_base, model=model, stems=stems, two_stems_target=two_stems_target)
+        res = separate_stems(
+            input_path, output_base, model=model, stems=stems, two_stems_target=two_stems_target, jobs=jobs, segment=segment, overlap=overlap, cache=cache, memory=self.memory
+        )
         ok = (res.get("returncode", 1) == 0) and len(res.get("stems", [])) > 0
-        self.memory.record_job(
+        self.memory.log_job(
             "separate", str(input_path), str(output_base), {"model": model, "stems": stems, "two_stems_target": two_stems_target}, ok
         )
         uploaded = []
         if ok:
-            stems_list = res.get("stems", [])
-            for name in stems_list:
-                p = output_base / name if not Path(name).is_absolute() else Path(name)
-                entry = {"name": name, "gcs": None, "ipfs": None}
-                try:
-                    entry["gcs"] = upload_if_configured(str(p))
-                except Exception:
-                    pass
+            paths = [output_base / name for name in res.get("stems", [])]
+            with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+                uploaded = list(pool.map(self._publish, paths))
+        return {"ok": ok, "stems": res.get("stems", []), "uploaded": uploaded, "log": res.get("log", ""), "elapsed": res.get("elapsed"), "cached": res.get("cached", False)}
+
+    def _publish(self, path: Path) -> Dict[str, Any]:
+        """Upload to GCS and pin to IPFS when configured; failures leave the field None."""
+        from .sync.gcs import upload_if_configured
+        from .sync.ipfs import pin_file
+
+        entry: Dict[str, Any] = {"name": Path(path).name, "gcs": None, "ipfs": None}
+        try:
+            entry["gcs"] = upload_if_configured(str(path))
+        except Exception:
+            pass
+        try:
+            pin = pin_file(str(path))
+            if pin:
+                entry["ipfs"] = {"cid": pin.get("cid", ""), "url": pin.get("gateway_url")}
+        except Exception:
+            pass
+        return entry
+
+    def resolve_clean_params(self, preset: str = "", **params: Any) -> Dict[str, Any]:
+        """Clean-chain params for `preset`: a built-in name, or `db:NAME` merged from Memory."""
+        preset = (preset or "").strip()
+        out = dict(params)
+        if preset.lower().startswith("db:"):
+            out.update(self.memory.get_preset(preset.split(":", 1)[1]) or {})
+        elif preset:
+            out["preset"] = preset
+        return out
+
+    def _skill_vocal_chain(
+        self,
+        input_path: Path,
+        output_base: Optional[Path] = None,
+        model: str = "htdemucs",
+        target: str = "vocals",
+        preset: str = "",
+        ml_model: str = "",
+        jobs: int = 1,
+        segment: Optional[float] = None,
+        overlap: float = 1.0,
+        keep_float: bool = False,
+        **clean_params: Any,
+    ) -> Dict[str, Any]:
+        """Separate, then clean the `target` stem while the other stems are published.
+
+        Stems are handed over as local files. The `target` stem goes through
+        the ML denoiser when `ml_model` is set, else the FFmpeg clean chain
+        (`preset` as in /process; the Python cleaner without ffmpeg).
+        Publishing every stem to GCS/IPFS runs on the same thread pool, so
+        after separation the wall time is roughly the slower of the two.
+        """
+        from .skills import separate_stems
+
+        t0 = time.perf_counter()
+        input_path = Path(input_path)
+        output_base = Path(output_base) if output_base else input_path.parent
+        sep = separate_stems(input_path, output_base, model=model, stems=4, jobs=jobs, segment=segment, overlap=overlap, memory=self.memory)
+        t_sep = time.perf_counter() - t0
+        stems = [output_base / n for n in sep.get("stems", [])]
+        vocals = next((p for p in stems if p.stem.endswith(f"_{target}")), None)
+        params = {"model": model, "target": target, "preset": preset, "ml_model": ml_model, "jobs": jobs, "segment": segment}
+        if sep.get("returncode", 1) != 0 or vocals is None:
+            self.memory.log_job("vocal_chain", str(input_path), str(output_base), params, False)
+            return {"ok": False, "stems": sep.get("stems", []), "output": None, "log": sep.get("log", "") or f"no '{target}' stem produced"}
+
+        out = output_base / f"{input_path.stem}_{target}_clean.wav"
+
+        def chain() -> Tuple[Dict[str, Any], float]:
+            t = time.perf_counter()
+            if ml_model:
+                r = self._skill_denoise(vocals, out, model_path=ml_model)
+            elif not shutil.which("ffmpeg"):
+                from .processing.clean import clean_audio as py_clean_audio
+
                 try:
-                    pin = pin_file(str(p))
-                    if pin:
-                        entry["ipfs"] = {"cid": pin.get("cid", ""), "url": pin.get("gateway_url")}
-                except Exception:
-                    pass
-                uploaded.append(entry)
-        return {"ok": ok, "stems": res.get("stems", []), "uploaded": uploaded, "log": res.get("log", "")}
+                    py_clean_audio(str(vocals), str(out))
+                    r = {"ok": True, "output": str(out), "log": "python-clean (ffmpeg not available)"}
+                    r.update({k: v for k, v in self._publish(out).items() if k != "name"})
+                except Exception as e:
+                    r = {"ok": False, "output": None, "log": f"python-clean failed: {e}"}
+            else:
+                r = self._skill_clean(vocals, out, keep_float, **self.resolve_clean_params(preset, **clean_params))
+            return r, time.perf_counter() - t
+
+        with ThreadPoolExecutor(max_workers=1 + len(stems)) as pool:
+            vf = pool.submit(chain)
+            pubs = [pool.submit(self._publish, p) for p in stems]
+            vres, t_vocal = vf.result()
+            uploaded = [f.result() for f in pubs]
+        total = time.perf_counter() - t0
+        ok = bool(vres.get("ok"))
+        timings = {"separate": t_sep, "vocal": t_vocal, "total": total}
+        self.memory.log_job("vocal_chain", str(input_path), str(out), params, ok, {f"{k}_s": v for k, v in timings.items()})
+        return {
+            "ok": ok,
+            "stems": sep.get("stems", []),
+            "output": str(out) if ok else None,
+            "vocal": vres,
+            "uploaded": uploaded,
+            "cached": sep.get("cached", False),
+            "timings": timings,
+            "log": f"{sep.get('log', '')}; {target} {'ML denoise' if ml_model else 'clean'} {t_vocal:.1f}s; total {total:.1f}s ({total / max(t_sep, 1e-9):.2f}x separation)",
+        }
 
     def _skill_denoise(
         self,
@@ -213,39 +295,113 @@ class Bot:
         chunk_seconds: float = 1.0,
         overlap_seconds: float = 0.1,
         device: str | None = None,
+        stereo_mode: str = "channels",
+        batch_size: int = 16,
+        vad_gate: bool = False,
+        vad_backend: str = "energy",
+        max_rtf: Optional[float] = None,
     ) -> Dict[str, Any]:
         from .skills import ml_denoise
 
         input_path = Path(input_path)
         output_path = Path(output_path) if output_path else input_path.with_name(f"{input_path.stem}_ml.wav")
-        res = ml_denoise(input_path, output_path, model_path=model_path, sample_rate=sample_rate, chunk_seconds=chunk_seconds, overlap_seconds=overlap_seconds, device=device)
+        res = ml_denoise(
+            input_path,
+            output_path,
+            model_path=model_path,
+            sample_rate=sample_rate,
+            chunk_seconds=chunk_seconds,
+            overlap_seconds=overlap_seconds,
+            device=device,
+            stereo_mode=stereo_mode,
+            batch_size=batch_size,
+            vad_gate=vad_gate,
+            vad_backend=vad_backend,
+            max_rtf=max_rtf,
+        )
         ok = bool(res.get("ok")) and output_path.exists()
-        job_id = self.memory.record_job(
+        vad = res.get("vad") or {}
+        self.memory.log_job(
             "denoise",
             str(input_path),
             str(output_path),
-            {"model_path": model_path, "sample_rate": sample_rate, "chunk_seconds": chunk_seconds, "overlap_seconds": overlap_seconds},
+            {
+                "model_path": model_path,
+                "sample_rate": sample_rate,
+                "chunk_seconds": chunk_seconds,
+                "overlap_seconds": overlap_seconds,
+                "stereo_mode": stereo_mode,
+                "batch_size": batch_size,
+                "vad_gate": vad_gate,
+            },
             ok,
+            {"vad_skipped": vad["skipped"], "vad_est_speedup": vad["est_speedup"]} if vad else None,
         )
         gs_url = None
         ipfs = None
         if ok:
-            try:
-                gs_url = upload_if_configured(str(output_path))
-            except Exception:
-                gs_url = None
-            try:
-                pin = pin_file(str(output_path))
-                if pin:
-                    ipfs = {"cid": pin.get("cid", ""), "url": pin.get("gateway_url")}
-            except Exception:
-                ipfs = None
-        return {"ok": ok, "output": str(output_path) if ok else None, "gcs": gs_url, "ipfs": ipfs, "log": res.get("log", "")}
+            pub = self._publish(output_path)
+            gs_url, ipfs = pub["gcs"], pub["ipfs"]
+        return {"ok": ok, "output": str(output_path) if ok else None, "gcs": gs_url, "ipfs": ipfs, "vad": vad or None, "log": res.get("log", "")}
+
+    def _skill_denoise_batch(
+        self,
+        pairs: List[Tuple[Path, Path]],
+        model_path: str = "",
+        sample_rate: int = 48000,
+        chunk_seconds: float = 1.0,
+        overlap_seconds: float = 0.1,
+        device: str | None = None,
+        stereo_mode: str = "channels",
+        batch_size: int = 32,
+        prefetch: int = 8,
+        max_rtf: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        from .skills import ml_denoise_batch
+
+        params = {
+            "model_path": model_path,
+            "sample_rate": sample_rate,
+            "chunk_seconds": chunk_seconds,
+            "overlap_seconds": overlap_seconds,
+            "stereo_mode": stereo_mode,
+            "batch_size": batch_size,
+            "batched": True,
+        }
+
+        # Uploads run beside inference instead of stalling the batch loop
+        uploads = []
+
+        def on_done(r: Dict[str, Any]) -> None:
+            self.memory.log_job("denoise", r["input"], r.get("output") or "", params, bool(r.get("ok")))
+            if r.get("ok"):
+                uploads.append((r, pool.submit(self._publish, r["output"])))
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            res = ml_denoise_batch(
+                pairs,
+                model_path=model_path,
+                sample_rate=sample_rate,
+                chunk_seconds=chunk_seconds,
+                overlap_seconds=overlap_seconds,
+                device=device,
+                stereo_mode=stereo_mode,
+                batch_size=batch_size,
+                prefetch=prefetch,
+                on_done=on_done,
+                max_rtf=max_rtf,
+            )
+            for r, fut in uploads:
+                pub = fut.result()
+                r["gcs"], r["ipfs"] = pub["gcs"], pub["ipfs"]
+        return res
 
     def _skill_inspect(self, input_path: Path) -> Dict[str, Any]:
+        from .skills import analyze_audio
+
         input_path = Path(input_path)
         res = analyze_audio(input_path)
-        self.memory.record_job("inspect", str(input_path), "", {}, True)
+        self.memory.log_job("inspect", str(input_path), "", {}, True)
         return res
 
     # def _skill_download(self, url: str, out_dir: Optional[Path] = None) -> Dict[str, Any]:
@@ -265,10 +421,12 @@ class Bot:
     #     return {"ok": ok, "output": str(output_path) if ok else None, "log": proc.stdout}
 
     def _skill_transcribe(self, input_path: Path) -> Dict[str, Any]:
+        from .skills import transcribe_audio
+
         input_path = Path(input_path)
         res = transcribe_audio(input_path)
         ok = bool(res.get("ok"))
-        self.memory.record_job("transcribe", str(input_path), "", {}, ok)
+        self.memory.log_job("transcribe", str(input_path), "", {}, ok)
         return res
 
     # Simple trainable preferences: averages per usage context
@@ -294,3 +452,21 @@ class Bot:
                 continue
             base[k] = v
         return base
+
+
+_BOT: Optional[Bot] = None
+_BOT_LOCK = threading.Lock()
+
+
+def get_bot() -> Bot:
+    """The process-wide Bot (default database), built on first use.
+
+    Skills are safe to share between threads: Memory keeps a connection per
+    thread and jobs are recorded through its write-behind journal.
+    """
+    global _BOT
+    if _BOT is None:
+        with _BOT_LOCK:
+            if _BOT is None:
+                _BOT = Bot()
+    return _BOT
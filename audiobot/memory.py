@@ -1,20 +1,91 @@
+import atexit
 import json
+import math
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple, List
+from typing import Any, Dict, Iterator, Optional, Tuple, List
 
 
 DEFAULT_DB = Path("data") / "audiobot.db"
+BUSY_TIMEOUT = 10.0  # seconds a writer waits for the lock before "database is locked"
+FLUSH_ENV = "AUDIOBOT_DB_FLUSH_S"  # journal flush interval; 0 records jobs synchronously
+RETAIN_DAYS_ENV = "AUDIOBOT_DB_RETAIN_DAYS"  # `db compact` default age limit (0 keeps everything)
+RETAIN_ROWS_ENV = "AUDIOBOT_DB_RETAIN_ROWS"  # `db compact` default rows kept per kind (0 = no limit)
+
+# One connection per (thread, database), reused by every Memory instance in that
+# thread; WAL lets readers run alongside the single writer.
+_LOCAL = threading.local()
+_READY: set = set()
+_READY_LOCK = threading.Lock()
+# Preset cache per database: (kv "presets_rev", {name: params}). A thread
+# revalidates it only after PRAGMA data_version shows another connection wrote.
+_PRESETS: Dict[str, Tuple[Any, Dict[str, Dict[str, Any]]]] = {}
+_SEEDED: set = set()
+
+
+def _connection(path: Path) -> sqlite3.Connection:
+    if getattr(_LOCAL, "pid", None) != os.getpid():
+        _LOCAL.pid, _LOCAL.conns, _LOCAL.seen = os.getpid(), {}, {}  # never reuse a connection across fork
+    key = str(path)
+    con = _LOCAL.conns.get(key)
+    if con is None:
+        con = sqlite3.connect(key, timeout=BUSY_TIMEOUT, isolation_level=None)
+        # must precede journal_mode=WAL, which writes the header of a new file;
+        # existing databases keep their mode until `compact` runs VACUUM
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.OperationalError:
+            pass  # e.g. a filesystem without shared memory; stay in rollback mode
+        con.execute("PRAGMA synchronous=NORMAL")
+        _LOCAL.conns[key] = con
+    return con
 
 
 class Memory:
     def __init__(self, db_path: Path = DEFAULT_DB) -> None:
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._init_db()
+        key = str(self.db_path)
+        if key not in _READY:
+            with _READY_LOCK:
+                if key not in _READY:
+                    self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._init_db()
+                    _READY.add(key)
+
+    def _con(self) -> sqlite3.Connection:
+        return _connection(self.db_path)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """One commit for everything written inside the block (nested blocks join the outer one)."""
+        con = self._con()
+        if con.in_transaction:
+            yield con
+            return
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.rollback()
+            raise
+        con.execute("COMMIT")
+
+    def close(self) -> None:
+        """Close this thread's connection (it is reopened on next use)."""
+        con = getattr(_LOCAL, "conns", {}).pop(str(self.db_path), None)
+        if con is not None:
+            con.close()
 
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as con:
+        with self.transaction() as con:
             cur = con.cursor()
             cur.execute(
                 """
@@ -47,6 +118,9 @@ class Memory:
                 )
                 """
             )
+            cur.execute("CREATE INDEX IF NOT EXISTS metrics_job ON metrics(job_id)")
+            cur.execute("CREATE INDEX IF NOT EXISTS jobs_kind_created ON jobs(kind, created_at)")
+            cur.execute("CREATE INDEX IF NOT EXISTS jobs_created ON jobs(created_at)")
             cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS presets (
@@ -55,73 +129,563 @@ class Memory:
                 )
                 """
             )
-            con.commit()
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stem_cache (
+                    key TEXT PRIMARY KEY,
+                    params TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used REAL,
+                    hits INTEGER DEFAULT 0
+                )
+                """
+            )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stem_cache_files (
+                    key TEXT,
+                    source TEXT,
+                    digest TEXT,
+                    PRIMARY KEY(key, source)
+                )
+                """
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS stem_cache_files_digest ON stem_cache_files(digest)")
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stem_blobs (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER
+                )
+                """
+            )
+            # daily per-kind aggregates that outlive pruned jobs
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_rollups (
+                    day TEXT,
+                    kind TEXT,
+                    jobs INTEGER,
+                    ok INTEGER,
+                    PRIMARY KEY(day, kind)
+                )
+                """
+            )
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metric_rollups (
+                    day TEXT,
+                    kind TEXT,
+                    key TEXT,
+                    n INTEGER,
+                    mean REAL,
+                    p95 REAL,
+                    PRIMARY KEY(day, kind, key)
+                )
+                """
+            )
 
     def kv_get(self, key: str) -> Optional[Any]:
-        with sqlite3.connect(self.db_path) as con:
-            cur = con.execute("SELECT value FROM kv WHERE key=?", (key,))
-            row = cur.fetchone()
-            return json.loads(row[0]) if row else None
+        row = self._con().execute("SELECT value FROM kv WHERE key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
 
     def kv_set(self, key: str, value: Any) -> None:
         payload = json.dumps(value)
-        with sqlite3.connect(self.db_path) as con:
+        with self.transaction() as con:
             con.execute("REPLACE INTO kv(key,value) VALUES(?,?)", (key, payload))
-            con.commit()
 
     def record_job(self, kind: str, input_path: str, output_path: Optional[str], params: Dict[str, Any], ok: bool) -> int:
         payload = json.dumps(params)
-        with sqlite3.connect(self.db_path) as con:
-            cur = con.cursor()
-            cur.execute(
+        with self.transaction() as con:
+            cur = con.execute(
                 "INSERT INTO jobs(kind,input_path,output_path,params,ok) VALUES(?,?,?,?,?)",
                 (kind, input_path, output_path or "", payload, 1 if ok else 0),
             )
-            job_id = cur.lastrowid
-            con.commit()
-            return int(job_id)
+            return int(cur.lastrowid)
 
     def record_metric(self, job_id: int, key: str, value: float) -> None:
-        with sqlite3.connect(self.db_path) as con:
+        with self.transaction() as con:
             con.execute("INSERT INTO metrics(job_id,key,value) VALUES(?,?,?)", (job_id, key, float(value)))
-            con.commit()
+
+    def record_metrics(self, job_id: int, metrics: Dict[str, float]) -> None:
+        """Insert several metrics for `job_id` in one statement (None values are skipped)."""
+        rows = [(job_id, k, float(v)) for k, v in metrics.items() if v is not None]
+        if rows:
+            with self.transaction() as con:
+                con.executemany("INSERT INTO metrics(job_id,key,value) VALUES(?,?,?)", rows)
+
+    def log_job(
+        self,
+        kind: str,
+        input_path: str,
+        output_path: Optional[str],
+        params: Dict[str, Any],
+        ok: bool,
+        metrics: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Record a job and its metrics through the write-behind journal (no id is returned).
+
+        Params and metrics are serialized here, so values that cannot be
+        stored raise in the caller rather than in the journal thread, and
+        created_at is the time of this call, not of the batched commit.
+        """
+        rows = [(k, float(v)) for k, v in (metrics or {}).items() if v is not None]
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())  # CURRENT_TIMESTAMP's format
+        job = (kind, input_path, output_path or "", json.dumps(params), 1 if ok else 0, created, rows)
+        journal = _journal(self)
+        if journal is None:
+            self._write_jobs([job])
+        else:
+            journal.record(*job)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until journaled jobs are committed."""
+        journal = _JOURNALS.get((os.getpid(), str(self.db_path)))
+        if journal is not None:
+            journal.flush(timeout)
+
+    def _write_jobs(self, jobs: List[Tuple[Any, ...]]) -> None:
+        """Insert jobs already serialized by `log_job`."""
+        with self.transaction() as con:
+            for *job, metrics in jobs:
+                job_id = con.execute("INSERT INTO jobs(kind,input_path,output_path,params,ok,created_at) VALUES(?,?,?,?,?,?)", job).lastrowid
+                if metrics:
+                    con.executemany("INSERT INTO metrics(job_id,key,value) VALUES(?,?,?)", [(job_id, k, v) for k, v in metrics])
 
     def save_preset(self, name: str, params: Dict[str, Any]) -> None:
-        with sqlite3.connect(self.db_path) as con:
+        with self.transaction() as con:
             con.execute("REPLACE INTO presets(name,params) VALUES(?,?)", (name, json.dumps(params)))
-            con.commit()
+            con.execute("REPLACE INTO kv(key,value) VALUES('presets_rev',?)", (json.dumps(time.time_ns()),))
+        _PRESETS.pop(str(self.db_path), None)
+
+    def _presets(self) -> Dict[str, Dict[str, Any]]:
+        key = str(self.db_path)
+        con = self._con()
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        cached = _PRESETS.get(key)
+        if cached is not None and _LOCAL.seen.get(key) == version:
+            return cached[1]
+        rev = self.kv_get("presets_rev")
+        if cached is None or cached[0] != rev:
+            rows = con.execute("SELECT name, params FROM presets ORDER BY name").fetchall()
+            cached = _PRESETS[key] = (rev, {name: json.loads(params) for name, params in rows})
+        _LOCAL.seen[key] = version
+        return cached[1]
 
     def list_presets(self) -> List[Tuple[str, Dict[str, Any]]]:
-        with sqlite3.connect(self.db_path) as con:
-            cur = con.execute("SELECT name, params FROM presets ORDER BY name")
-            rows = cur.fetchall()
-            return [(name, json.loads(params)) for name, params in rows]
+        return [(name, dict(params)) for name, params in self._presets().items()]
 
     def get_preset(self, name: str) -> Optional[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as con:
-            cur = con.execute("SELECT params FROM presets WHERE name=?", (name,))
-            row = cur.fetchone()
-            return json.loads(row[0]) if row else None
-
-    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as con:
-            con.row_factory = sqlite3.Row
-            cur = con.execute(
-                "SELECT id, kind, input_path, output_path, params, ok, created_at FROM jobs ORDER BY id DESC LIMIT ?",
-                (int(limit),),
-            )
-            jobs = []
-            for row in cur.fetchall():
-                job = dict(row)
+        params = self._presets().get(name)
+        return dict(params) if params is not None else None
+
+    def seed_presets(self, presets: Dict[str, Dict[str, Any]], version: int) -> None:
+        """Add missing `presets` once per database and seed `version` (stamped in kv)."""
+        key = (str(self.db_path), version)
+        if key in _SEEDED:
+            return
+        if (self.kv_get("preset_seed_version") or 0) < version:
+            with self.transaction() as con:
+                con.executemany("INSERT OR IGNORE INTO presets(name,params) VALUES(?,?)", [(n, json.dumps(p)) for n, p in presets.items()])
+                con.execute("REPLACE INTO kv(key,value) VALUES('preset_seed_version',?)", (json.dumps(version),))
+                con.execute("REPLACE INTO kv(key,value) VALUES('presets_rev',?)", (json.dumps(time.time_ns()),))
+            _PRESETS.pop(str(self.db_path), None)
+        _SEEDED.add(key)
+
+    def list_jobs(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        return self.job_page(limit=limit, **filters)["jobs"]
+
+    def job_page(
+        self,
+        limit: int = 50,
+        before: Optional[int] = None,
+        kind: Optional[str] = None,
+        ok: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Newest-first jobs with their metrics, in one query.
+
+        Keyset pagination: pass the returned `next` (a job id) as `before` for
+        the following page. `since`/`until` are inclusive dates or timestamps
+        ("YYYY-MM-DD[ HH:MM:SS]", UTC like created_at). Every page is an index
+        range scan on jobs(created_at) or jobs(kind, created_at) plus one
+        metrics(job_id) lookup per row, so its cost does not grow with the table.
+        """
+        con = self._con()
+        where, args = [], []  # type: List[str], List[Any]
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        if ok is not None:
+            where.append("ok = ?")
+            args.append(1 if ok else 0)
+        if since:
+            where.append("created_at >= ?")
+            args.append(since.replace("T", " "))
+        if until:
+            until = until.replace("T", " ")
+            where.append("created_at <= ?")
+            args.append(f"{until} 23:59:59" if len(until) == 10 else until)
+        if before is not None:
+            row = con.execute("SELECT created_at FROM jobs WHERE id = ?", (int(before),)).fetchone()
+            if row:
+                where.append("(created_at, id) < (?, ?)")
+                args += [row[0], int(before)]
+            else:
+                # the cursor job was pruned since the page was served; ids are
+                # assigned in insertion order, so resume from the id alone
+                where.append("id < ?")
+                args.append(int(before))
+        sql = (
+            "SELECT id, kind, input_path, output_path, params, ok, created_at,"
+            " (SELECT json_group_object(key, value) FROM metrics WHERE job_id = jobs.id) AS metrics"
+            f" FROM jobs {'WHERE ' + ' AND '.join(where) if where else ''}"
+            " ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        cur = con.cursor()
+        cur.row_factory = sqlite3.Row
+        rows = cur.execute(sql, (*args, int(limit) + 1)).fetchall()
+        jobs = []
+        for row in rows[: int(limit)]:
+            job = dict(row)
+            for col, default in (("params", "{}"), ("metrics", "{}")):
                 try:
-                    job["params"] = json.loads(job.get("params") or "{}")
+                    job[col] = json.loads(job.get(col) or default)
                 except Exception:
-                    job["params"] = {}
-                # metrics per job
-                mcur = con.execute("SELECT key, value FROM metrics WHERE job_id=?", (row["id"],))
-                metrics = {}
-                for k, v in mcur.fetchall():
-                    metrics[k] = v
-                job["metrics"] = metrics
-                jobs.append(job)
-            return jobs
+                    job[col] = {}
+            jobs.append(job)
+        return {"jobs": jobs, "next": jobs[-1]["id"] if len(rows) > int(limit) else None}
+
+    # Stem cache index: entries -> {source: blob digest}; blobs are shared between entries.
+    def stem_cache_get(self, key: str) -> Optional[Dict[str, str]]:
+        with self.transaction() as con:
+            rows = con.execute("SELECT source, digest FROM stem_cache_files WHERE key=?", (key,)).fetchall()
+            if not rows:
+                return None
+            con.execute("UPDATE stem_cache SET last_used=?, hits=hits+1 WHERE key=?", (time.time(), key))
+            return {source: digest for source, digest in rows}
+
+    def stem_cache_put(self, key: str, files: Dict[str, Tuple[str, int]], params: Dict[str, Any]) -> None:
+        """Index `files` ({source: (digest, size)}) under `key`."""
+        with self.transaction() as con:
+            con.execute("REPLACE INTO stem_cache(key,params,last_used,hits) VALUES(?,?,?,0)", (key, json.dumps(params), time.time()))
+            con.execute("DELETE FROM stem_cache_files WHERE key=?", (key,))
+            con.executemany("INSERT INTO stem_cache_files(key,source,digest) VALUES(?,?,?)", [(key, s, d) for s, (d, _) in files.items()])
+            con.executemany("INSERT OR IGNORE INTO stem_blobs(digest,size) VALUES(?,?)", [(d, int(n)) for d, n in files.values()])
+
+    def stem_cache_drop(self, keys: List[str]) -> List[str]:
+        """Remove entries; returns the digests of blobs no longer referenced (dropped from the index)."""
+        with self.transaction() as con:
+            con.executemany("DELETE FROM stem_cache WHERE key=?", [(k,) for k in keys])
+            con.executemany("DELETE FROM stem_cache_files WHERE key=?", [(k,) for k in keys])
+            orphans = [r[0] for r in con.execute("SELECT digest FROM stem_blobs WHERE digest NOT IN (SELECT digest FROM stem_cache_files)")]
+            con.executemany("DELETE FROM stem_blobs WHERE digest=?", [(d,) for d in orphans])
+            return orphans
+
+    def stem_cache_evict(self, max_bytes: int) -> List[str]:
+        """Drop least recently used entries until blobs fit in `max_bytes`; returns orphaned digests."""
+        orphans: List[str] = []
+        with self.transaction() as con:
+            total = con.execute("SELECT COALESCE(SUM(size),0) FROM stem_blobs").fetchone()[0]
+            if total <= max_bytes:
+                return []
+            for (k,) in con.execute("SELECT key FROM stem_cache ORDER BY last_used ASC").fetchall():
+                orphans += self.stem_cache_drop([k])
+                total = con.execute("SELECT COALESCE(SUM(size),0) FROM stem_blobs").fetchone()[0]
+                if total <= max_bytes:
+                    break
+        return orphans
+
+    def stem_cache_stats(self) -> Dict[str, Any]:
+        con = self._con()
+        entries, hits = con.execute("SELECT COUNT(*), COALESCE(SUM(hits),0) FROM stem_cache").fetchone()
+        blobs, size = con.execute("SELECT COUNT(*), COALESCE(SUM(size),0) FROM stem_blobs").fetchone()
+        return {"entries": entries, "hits": hits, "blobs": blobs, "bytes": size}
+
+    # Retention: completed days are rolled up before any of their jobs are pruned.
+    def rollup(self) -> int:
+        """Aggregate every finished (UTC) day not rolled up yet; returns the number of days added."""
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        done = self.kv_get("rollups_through") or ""
+        con = self._con()
+        days = [
+            r[0]
+            for r in con.execute(
+                "SELECT DISTINCT substr(created_at, 1, 10) FROM jobs WHERE created_at >= ? AND created_at < ? ORDER BY 1",
+                (f"{done} 99" if done else "", today),
+            )
+        ]
+        for day in days:
+            lo, hi = day, (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            values: Dict[Tuple[str, str], List[float]] = {}
+            for kind, key, value in con.execute(
+                "SELECT j.kind, m.key, m.value FROM jobs j JOIN metrics m ON m.job_id = j.id WHERE j.created_at >= ? AND j.created_at < ?", (lo, hi)
+            ):
+                if value is not None:
+                    values.setdefault((kind, key), []).append(float(value))
+            with self.transaction() as tx:
+                tx.execute(
+                    "REPLACE INTO job_rollups(day,kind,jobs,ok) SELECT ?, kind, COUNT(*), SUM(ok) FROM jobs WHERE created_at >= ? AND created_at < ? GROUP BY kind",
+                    (day, lo, hi),
+                )
+                rows = []
+                for (kind, key), vals in values.items():
+                    vals.sort()
+                    p95 = vals[min(len(vals) - 1, math.ceil(0.95 * len(vals)) - 1)]
+                    rows.append((day, kind, key, len(vals), sum(vals) / len(vals), p95))
+                tx.executemany("REPLACE INTO metric_rollups(day,kind,key,n,mean,p95) VALUES(?,?,?,?,?,?)", rows)
+                tx.execute("REPLACE INTO kv(key,value) VALUES('rollups_through',?)", (json.dumps(day),))
+        return len(days)
+
+    def rollups(self, kind: Optional[str] = None, since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Daily aggregates, oldest first: jobs, ok_rate and {metric: {n, mean, p95}}."""
+        con = self._con()
+        where, args = ["1"], []  # type: List[str], List[Any]
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        if since:
+            where.append("day >= ?")
+            args.append(since[:10])
+        cond = " AND ".join(where)
+        out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for day, k, jobs, ok in con.execute(f"SELECT day, kind, jobs, ok FROM job_rollups WHERE {cond} ORDER BY day, kind", args):
+            out[(day, k)] = {"day": day, "kind": k, "jobs": jobs, "ok_rate": ok / jobs if jobs else None, "metrics": {}}
+        for day, k, key, n, mean, p95 in con.execute(f"SELECT day, kind, key, n, mean, p95 FROM metric_rollups WHERE {cond}", args):
+            if (day, k) in out:
+                out[(day, k)]["metrics"][key] = {"n": n, "mean": mean, "p95": p95}
+        return list(out.values())
+
+    def prune(self, max_age_days: Optional[float] = None, max_rows_per_kind: Optional[int] = None, params_days: Optional[float] = None) -> Dict[str, int]:
+        """Delete jobs (and their metrics) older than `max_age_days` or beyond the newest
+        `max_rows_per_kind` of their kind; clear `params` of jobs older than `params_days`.
+
+        Only days already rolled up are touched, so rows from the current day are kept.
+        """
+        done = self.kv_get("rollups_through")
+        if not done:
+            return {"jobs": 0, "metrics": 0, "params": 0}
+        limit = f"{done} 99"  # end of the last rolled-up day
+        conds: List[Tuple[str, Tuple[Any, ...]]] = []
+        if max_age_days:
+            cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+            conds.append(("created_at < ?", (min(cutoff, limit),)))
+        if max_rows_per_kind:
+            con = self._con()
+            for (kind,) in con.execute("SELECT DISTINCT kind FROM jobs").fetchall():
+                edge = con.execute(
+                    "SELECT created_at, id FROM jobs WHERE kind IS ? ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?", (kind, int(max_rows_per_kind) - 1)
+                ).fetchone()
+                if edge:
+                    conds.append(("kind IS ? AND (created_at, id) < (?, ?) AND created_at < ?", (kind, edge[0], edge[1], limit)))
+        stats = {"jobs": 0, "metrics": 0, "params": 0}
+        with self.transaction() as con:
+            for cond, args in conds:
+                stats["metrics"] += con.execute(f"DELETE FROM metrics WHERE job_id IN (SELECT id FROM jobs WHERE {cond})", args).rowcount
+                stats["jobs"] += con.execute(f"DELETE FROM jobs WHERE {cond}", args).rowcount
+            if params_days:
+                cutoff = (datetime.utcnow() - timedelta(days=params_days)).strftime("%Y-%m-%d %H:%M:%S")
+                stats["params"] = con.execute("UPDATE jobs SET params = NULL WHERE created_at < ? AND params IS NOT NULL", (cutoff,)).rowcount
+        return stats
+
+    def size_bytes(self) -> int:
+        """Database file plus its WAL."""
+        return sum(p.stat().st_size for p in (self.db_path, self.db_path.with_name(self.db_path.name + "-wal")) if p.exists())
+
+    def compact(self, max_age_days: Optional[float] = None, max_rows_per_kind: Optional[int] = None, params_days: Optional[float] = None) -> Dict[str, Any]:
+        """Roll up finished days, prune by the retention policy and give freed pages back to the filesystem."""
+        t0 = time.perf_counter()
+        self.flush()
+        before = self.size_bytes()
+        days = self.rollup()
+        pruned = self.prune(max_age_days, max_rows_per_kind, params_days)
+        con = self._con()
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("VACUUM")  # one-time conversion of a database created without it
+        else:
+            con.execute("PRAGMA incremental_vacuum")
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        con.execute("PRAGMA optimize")
+        return {"rolled_up_days": days, "pruned": pruned, "bytes_before": before, "bytes_after": self.size_bytes(), "elapsed": time.perf_counter() - t0}
+
+
+class JobJournal:
+    """Background writer that commits queued job records in batches.
+
+    Records are committed at most `interval` seconds after they are queued
+    (or sooner once `batch` are pending), so a crash loses at most one
+    interval of history. When `max_pending` records are waiting, `record`
+    writes synchronously instead of blocking or dropping.
+    """
+
+    def __init__(self, memory: Memory, interval: float = 1.0, max_pending: int = 4096, batch: int = 512) -> None:
+        self.memory = memory
+        self.interval = interval
+        self.batch = batch
+        self.sync_writes = 0
+        self._q: "queue.Queue[Any]" = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="audiobot-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, *job: Any) -> None:
+        try:
+            self._q.put_nowait(job)
+        except queue.Full:
+            self.sync_writes += 1
+            self.memory._write_jobs([job])
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        done = threading.Event()
+        self._q.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        if self._thread.is_alive():
+            self._q.put(None)
+            self._thread.join(timeout)
+
+    def _commit(self, jobs: List[Tuple[Any, ...]]) -> None:
+        err: Exception
+        for attempt in range(2):
+            try:
+                self.memory._write_jobs(jobs)
+                return
+            except sqlite3.OperationalError as e:  # locked/busy: worth one retry
+                err = e
+                time.sleep(0.5)
+            except Exception as e:
+                err = e
+                break
+        print(f"audiobot: dropped {len(jobs)} job records: {err!r}", file=sys.stderr)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._q.get()
+            jobs: List[Tuple[Any, ...]] = []
+            flushed: Optional[threading.Event] = None
+            deadline = time.monotonic() + self.interval
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                if isinstance(item, threading.Event):
+                    flushed = item
+                    break
+                jobs.append(item)
+                if len(jobs) >= self.batch:
+                    break
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            try:
+                if jobs:
+                    self._commit(jobs)
+            except Exception as e:  # never let one batch stop the writer
+                print(f"audiobot: dropped {len(jobs)} job records: {e!r}", file=sys.stderr)
+            if flushed is not None:
+                flushed.set()
+
+
+_JOURNALS: Dict[Tuple[int, str], JobJournal] = {}
+_JOURNALS_LOCK = threading.Lock()
+
+
+def _close_journals() -> None:
+    for j in list(_JOURNALS.values()):
+        j.close()
+
+
+def _journal(memory: Memory) -> Optional[JobJournal]:
+    """The process-wide journal for `memory`'s database; None when $AUDIOBOT_DB_FLUSH_S is 0."""
+    key = (os.getpid(), str(memory.db_path))
+    journal = _JOURNALS.get(key)
+    if journal is None:
+        interval = float(os.getenv(FLUSH_ENV, "1.0"))
+        if interval <= 0:
+            return None
+        with _JOURNALS_LOCK:
+            journal = _JOURNALS.get(key)
+            if journal is None:
+                if not _JOURNALS:
+                    atexit.register(_close_journals)
+                journal = _JOURNALS[key] = JobJournal(Memory(memory.db_path), interval=interval)
+    return journal
+
+
+def _legacy_write(db_path: Path, i: int) -> None:
+    # the pre-pooling pattern: a fresh connection and commit per call
+    with sqlite3.connect(db_path) as con:
+        cur = con.execute("INSERT INTO jobs(kind,input_path,output_path,params,ok) VALUES(?,?,?,?,?)", ("bench", f"in{i}.wav", f"out{i}.wav", "{}", 1))
+        job_id = cur.lastrowid
+        con.commit()
+    for key, value in (("rms", 0.1), ("peak", 0.9)):
+        with sqlite3.connect(db_path) as con:
+            con.execute("INSERT INTO metrics(job_id,key,value) VALUES(?,?,?)", (job_id, key, value))
+            con.commit()
+
+
+def bench_writers(db_path: Path, writers: int = 32, jobs: int = 50, mode: str = "pooled") -> Dict[str, Any]:
+    """`writers` threads each record `jobs` jobs with two metrics, as `_skill_clean` does.
+
+    Modes: "per-call" is the old connection-per-call pattern on a
+    rollback-journal database; "pooled" writes through Memory (per-thread WAL
+    connection, one transaction per job); "journal" uses `log_job`, timing only
+    the caller (the elapsed time includes the final flush). `db_path` should
+    be a fresh file.
+    """
+    db_path = Path(db_path)
+    if mode != "per-call":
+        mem = Memory(db_path)
+    else:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(db_path) as con:
+            con.execute("CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, input_path TEXT, output_path TEXT, params TEXT, ok INTEGER, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+            con.execute("CREATE TABLE IF NOT EXISTS metrics (job_id INTEGER, key TEXT, value REAL)")
+    errors: List[str] = []
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def work(w: int) -> None:
+        for j in range(jobs):
+            t = time.perf_counter()
+            try:
+                if mode == "journal":
+                    mem.log_job("bench", f"in{w}_{j}.wav", f"out{w}_{j}.wav", {}, True, {"rms": 0.1, "peak": 0.9})
+                elif mode == "pooled":
+                    with mem.transaction():
+                        job_id = mem.record_job("bench", f"in{w}_{j}.wav", f"out{w}_{j}.wav", {}, True)
+                        mem.record_metrics(job_id, {"rms": 0.1, "peak": 0.9})
+                else:
+                    _legacy_write(db_path, j)
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(writers)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    if mode == "journal":
+        mem.flush()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")  # noqa: E731
+    return {
+        "mode": mode,
+        "writers": writers,
+        "jobs": len(latencies),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "jobs_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": pct(0.5),
+        "p99_ms": pct(0.99),
+    }
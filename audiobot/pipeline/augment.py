@@ -0,0 +1,124 @@
+"""Batched noise synthesis for denoiser training.
+
+The per-item helpers in datasets.py run one FFT and one Python click loop per
+sample inside each worker and draw from the global `random`/`np.random`
+state. Here the same corruptions (sibilance boost, clicks/pops, mains hum,
+broadband noise, with the same probabilities and parameter ranges) are
+applied to a whole [B, T] batch at once in the DataLoader collate step, and
+every draw comes from a generator seeded from the worker's torch seed, so a
+run seeded with `pl.seed_everything` is reproducible for any worker count.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+_RNG: Optional[Tuple[int, np.random.Generator]] = None
+
+
+def worker_rng(seed: Optional[int] = None) -> np.random.Generator:
+    """Generator for the current DataLoader worker (or the main process).
+
+    Seeded from the worker's torch seed (base seed + worker id), which the
+    loader re-draws each epoch from the torch RNG; `seed` overrides it in the
+    main process.
+    """
+    global _RNG
+    info = torch.utils.data.get_worker_info()
+    if info is not None:
+        s = int(info.seed)
+    else:
+        s = int(seed) if seed is not None else int(torch.initial_seed())
+    if _RNG is None or _RNG[0] != s:
+        _RNG = (s, np.random.default_rng(s % (2**63)))
+    return _RNG[1]
+
+
+def batch_sibilance(z: np.ndarray, sr: int, apply: np.ndarray, gain_db: np.ndarray, min_hz: float = 6000.0, max_hz: float = 10000.0) -> np.ndarray:
+    rows = np.flatnonzero(apply)
+    if len(rows) == 0:
+        return z
+    Z = np.fft.rfft(z[rows], axis=1)
+    freqs = np.fft.rfftfreq(z.shape[1], 1.0 / sr)
+    band = (freqs >= min_hz) & (freqs <= max_hz)
+    Z[:, band] *= (10 ** (gain_db[rows] / 20.0))[:, None]
+    y = np.fft.irfft(Z, n=z.shape[1], axis=1).astype(np.float32)
+    y /= np.maximum(1.0, np.max(np.abs(y), axis=1) + 1e-12)[:, None]
+    z[rows] = y
+    return z
+
+
+def batch_clicks_pops(z: np.ndarray, rng: np.random.Generator, apply: np.ndarray, rate: np.ndarray, pop_amp: np.ndarray) -> np.ndarray:
+    b, n = z.shape
+    n_clicks = np.maximum(1, (rate * 10).astype(np.int64))
+    k = int(n_clicks.max())
+    pos = rng.integers(0, max(1, n - 1), size=(b, k))
+    is_click = rng.random((b, k)) < 0.5
+    width = np.where(is_click, 1, rng.integers(2, 17, size=(b, k)))
+    amp = np.where(rng.random((b, k)) < 0.5, 1.0, -1.0) * pop_amp[:, None]
+    offs = np.arange(16)
+    cols = pos[..., None] + offs
+    mask = ((np.arange(k)[None, :] < n_clicks[:, None]) & apply[:, None])[..., None] & (offs < width[..., None]) & (cols < n)
+    rr = np.broadcast_to(np.arange(b)[:, None, None], cols.shape)
+    np.add.at(z, (rr[mask], cols[mask]), np.broadcast_to(amp[..., None], cols.shape)[mask].astype(np.float32))
+    rows = np.flatnonzero(apply)
+    z[rows] = np.clip(z[rows], -1.0, 1.0)
+    return z
+
+
+def batch_hum(z: np.ndarray, sr: int, apply: np.ndarray, hum_hz: np.ndarray, gain: np.ndarray) -> np.ndarray:
+    rows = np.flatnonzero(apply)
+    if len(rows) == 0:
+        return z
+    # only a couple of mains frequencies: synthesize each tone once per batch
+    freqs, which = np.unique(hum_hz[rows], return_inverse=True)
+    t = np.arange(z.shape[1]) / sr
+    ph = 2 * math.pi * freqs[:, None] * t[None, :]
+    tones = (np.sin(ph) + 0.3 * np.sin(2 * ph)).astype(np.float32)
+    z[rows] = np.clip(z[rows] + gain[rows, None].astype(np.float32) * tones[which], -1.0, 1.0)
+    return z
+
+
+def batch_broadband_noise(z: np.ndarray, rng: np.random.Generator, apply: np.ndarray, snr_db: np.ndarray) -> np.ndarray:
+    rows = np.flatnonzero(apply)
+    if len(rows) == 0:
+        return z
+    x = z[rows]
+    power = np.mean(x**2, axis=1) + 1e-8
+    noise_power = power / (10 ** (snr_db[rows] / 10.0))
+    noise = rng.standard_normal(x.shape, dtype=np.float32)
+    noise *= np.sqrt(noise_power).astype(np.float32)[:, None]
+    z[rows] = np.clip(x + noise, -1.0, 1.0)
+    return z
+
+
+def synthesize_batch(clean: np.ndarray, sr: int, rng: np.random.Generator) -> np.ndarray:
+    """Corrupt a [B, T] batch of clean crops; mirrors AudioDataset._synthesize per row.
+
+    The stage helpers modify `z` in place; only the working copy made here is touched.
+    """
+    b = clean.shape[0]
+    z = clean.astype(np.float32, copy=True)
+    z = batch_sibilance(z, sr, rng.random(b) < 0.9, rng.uniform(5.0, 12.0, b))
+    z = batch_clicks_pops(z, rng, rng.random(b) < 0.8, rng.uniform(0.2, 0.8, b), rng.uniform(0.3, 0.9, b))
+    z = batch_hum(z, sr, rng.random(b) < 0.7, rng.choice([50.0, 60.0], b), rng.uniform(0.005, 0.03, b))
+    z = batch_broadband_noise(z, rng, rng.random(b) < 0.9, rng.uniform(0.0, 15.0, b))
+    return z.astype(np.float32)
+
+
+class NoiseSynthCollate:
+    """DataLoader collate_fn: stack clean crops and synthesize the noisy batch in one pass."""
+
+    def __init__(self, sample_rate: int, seed: Optional[int] = None) -> None:
+        self.sample_rate = int(sample_rate)
+        self.seed = seed
+
+    def __call__(self, batch: List[Tuple[torch.Tensor, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        clean = np.stack([c.numpy() for _, c in batch])
+        noisy = synthesize_batch(clean, self.sample_rate, worker_rng(self.seed))
+        return torch.from_numpy(noisy), torch.from_numpy(clean)
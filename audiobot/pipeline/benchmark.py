@@ -0,0 +1,161 @@
+"""Post-training benchmark for denoiser checkpoints.
+
+`benchmark_model` runs a model through the production inference path
+(`skills.ml_denoise._infer`, same chunking and overlap-add) on a fixed
+60-second reference clip, in a fresh spawned process so peak RSS reflects
+inference alone. `write_model_meta` stores the result with the model:
+under `ckpt["audiobot"]` for Torch checkpoints and in a `<model>.json`
+sidecar for ONNX. `ml_denoise(max_rtf=...)` reads it back to refuse models
+that are too slow.
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .augment import synthesize_batch
+
+
+REFERENCE_SECONDS = 60.0
+REFERENCE_SEED = 20240601
+
+
+def reference_clip(ds=None, sample_rate: int = 48000, seconds: float = REFERENCE_SECONDS, clip_path: str = "") -> Tuple[np.ndarray, np.ndarray, str]:
+    """Deterministic (clean, noisy, source) pair of exactly `seconds`.
+
+    Clean audio comes from `clip_path`, else from the dataset's files in
+    manifest order (tiled if short), else from a synthetic harmonic signal.
+    Without paired data the noisy side is synthesized with a fixed seed.
+    """
+    n = int(sample_rate * seconds)
+    noisy: Optional[np.ndarray] = None
+    if clip_path:
+        import soundfile as sf  # type: ignore
+        import librosa  # type: ignore
+
+        y, sr = sf.read(clip_path, always_2d=True, dtype="float32")
+        y = y.mean(axis=1)
+        if sr != sample_rate:
+            y = librosa.resample(y, orig_sr=sr, target_sr=sample_rate, res_type="kaiser_best")
+        clean, source = np.resize(np.asarray(y, dtype=np.float32), n), Path(clip_path).name
+    elif ds is not None and len(ds.clean_paths):
+        parts, noisy_parts, have = [], [], 0
+        for f in range(len(ds.clean_paths)):
+            parts.append(ds.audio(f))
+            if ds.noisy_paths is not None:
+                noisy_parts.append(ds.audio(f, noisy=True)[: len(parts[-1])])
+                parts[-1] = parts[-1][: len(noisy_parts[-1])]
+            have += len(parts[-1])
+            if have >= n:
+                break
+        clean = np.resize(np.concatenate(parts), n).astype(np.float32)
+        if noisy_parts:
+            noisy = np.resize(np.concatenate(noisy_parts), n).astype(np.float32)
+        source = f"{len(parts)} dataset file(s)"
+    else:
+        t = np.arange(n) / float(sample_rate)
+        f0 = 140.0 + 40.0 * np.sin(2 * np.pi * 0.3 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        env = (np.sin(2 * np.pi * 1.5 * t) > -0.2).astype(np.float32)
+        clean = (env * sum(np.sin(k * phase) / k for k in range(1, 8)) * 0.3).astype(np.float32)
+        source = "synthetic"
+    peak = float(np.max(np.abs(clean))) or 1.0
+    clean = clean / peak
+    if noisy is None:
+        # in 1 s blocks, like the training crops
+        rng = np.random.default_rng(REFERENCE_SEED)
+        blocks = clean.reshape(-1, sample_rate) if n % sample_rate == 0 else clean[None, :]
+        noisy = synthesize_batch(blocks, sample_rate, rng).reshape(-1)
+    else:
+        noisy = noisy / peak
+    return clean, noisy.astype(np.float32), source
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return kb / 1024.0  # Linux reports KiB
+    except Exception:
+        return None
+
+
+def _bench_worker(model_path: str, clean: np.ndarray, noisy: np.ndarray, sample_rate: int, chunk_seconds: float, overlap_seconds: float, batch_size: int, threads: int) -> Dict[str, Any]:
+    import torch
+
+    from ..skills.ml_denoise import _infer, _load_predictor
+    from .metrics import multires_stft_distance, si_sdr
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    predict = _load_predictor(Path(model_path), device="cpu")
+    _infer(predict, noisy[None, : sample_rate], sample_rate, chunk_seconds, overlap_seconds, batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    y = _infer(predict, noisy[None, :], sample_rate, chunk_seconds, overlap_seconds, batch_size=batch_size)[0]
+    elapsed = time.perf_counter() - t0
+    seconds = len(noisy) / float(sample_rate)
+    p, c, x = (torch.from_numpy(np.ascontiguousarray(a, dtype=np.float32))[None] for a in (y, clean, noisy))
+    sdr, sdr_in = float(si_sdr(p, c)[0]), float(si_sdr(x, c)[0])
+    return {
+        "seconds": seconds,
+        "elapsed": elapsed,
+        "rtf": elapsed / seconds,
+        "threads": int(torch.get_num_threads()),
+        "peak_rss_mb": _peak_rss_mb(),
+        "si_sdr": sdr,
+        "si_sdr_in": sdr_in,
+        "si_sdri": sdr - sdr_in,
+        "mrstft": float(multires_stft_distance(p, c)[0]),
+    }
+
+
+def benchmark_model(
+    model_path: str,
+    clean: np.ndarray,
+    noisy: np.ndarray,
+    sample_rate: int = 48000,
+    chunk_seconds: float = 1.0,
+    overlap_seconds: float = 0.1,
+    batch_size: int = 16,
+    threads: int = 0,
+) -> Dict[str, Any]:
+    """Time and score `model_path` on (clean, noisy) in a spawned process."""
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        res = pool.submit(_bench_worker, str(model_path), clean, noisy, sample_rate, chunk_seconds, overlap_seconds, batch_size, threads).result()
+    res.update(model=Path(model_path).name, time=time.time(), sample_rate=sample_rate, chunk_seconds=chunk_seconds, overlap_seconds=overlap_seconds)
+    return res
+
+
+def write_model_meta(model_path: str, meta: Dict[str, Any]) -> None:
+    """Merge `meta` into the model's metadata (checkpoint key or ONNX sidecar)."""
+    p = Path(model_path)
+    if p.suffix.lower() == ".onnx":
+        side = p.with_name(p.name + ".json")
+        cur: Dict[str, Any] = {}
+        if side.exists():
+            try:
+                cur = json.loads(side.read_text(encoding="utf-8"))
+            except Exception:
+                cur = {}
+        cur.update(meta)
+        side.write_text(json.dumps(cur, indent=2), encoding="utf-8")
+        return
+    import torch
+
+    ckpt = torch.load(str(p), map_location="cpu")
+    if not isinstance(ckpt, dict):
+        raise RuntimeError("Unsupported checkpoint format")
+    ckpt.setdefault("audiobot", {}).update(meta)
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+    torch.save(ckpt, str(tmp))
+    os.replace(tmp, p)
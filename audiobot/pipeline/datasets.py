@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import hashlib
 import math
+import os
 import random
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import soundfile as sf  # type: ignore
 import librosa  # type: ignore
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
+
+from .augment import NoiseSynthCollate, synthesize_batch, worker_rng
+from .manifest import Manifest, load_manifest
+from .shards import ShardIndex, compile_shards
 
 
 def _resample(y: np.ndarray, sr: int, target_sr: int) -> Tuple[np.ndarray, int]:
@@ -77,14 +83,33 @@ def _apply_broadband_noise(y: np.ndarray, snr_db: float = 10.0) -> np.ndarray:
     return z
 
 
-def _random_crop(y: np.ndarray, length: int) -> np.ndarray:
-    if len(y) <= length:
-        if len(y) == length:
-            return y
-        pad = length - len(y)
-        return np.pad(y, (0, pad))
-    start = random.randint(0, len(y) - length)
-    return y[start : start + length]
+# source samples read on each side of a crop window so the resampler's filter
+# has real context at the edges (kaiser_best spans 64 zero crossings)
+_RESAMPLE_MARGIN = 256
+# per-crop peak normalization gain is capped (+26 dB) so near-silent crops stay quiet
+_MIN_CROP_PEAK = 0.05
+
+
+def _subset(m: Manifest, keep: List[int]) -> Manifest:
+    return Manifest(m.root, m.pattern, [m.entries[i] for i in keep])
+
+
+def _crop_at(y: np.ndarray, start: int, length: int) -> np.ndarray:
+    # copies only the crop, so mmap-backed inputs stay zero-copy until here
+    z = np.zeros(length, dtype=np.float32)
+    seg = y[start : start + length]
+    z[: len(seg)] = seg
+    return z
+
+
+def split_of(rel_path: str, val_fraction: float) -> str:
+    """'val' or 'train' for a file, from a hash of its path relative to the data dir.
+
+    Stable across machines and runs, and adding files never moves existing
+    ones between splits.
+    """
+    h = int(hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:8], 16) / float(2**32)
+    return "val" if h < val_fraction else "train"
 
 
 @dataclass
@@ -92,28 +117,76 @@ class AudioDataConfig:
     sample_rate: int = 48000
     chunk_seconds: float = 1.0
     pair_dirs: bool = False  # if True, expects clean_dir and noisy_dir, else synthesize noise
+    cache_dir: Optional[str] = None  # if set, decode once into mmap shards (see shards.py)
+    batch_augment: bool = True  # synthesize noise per batch in collate (see augment.py) instead of per item
+    manifest_dir: Optional[str] = None  # where clean/noisy manifests are cached; default: inside each data dir
+    rebuild_manifest: bool = False  # rescan the data dirs instead of trusting a cached manifest
+    split: str = "all"  # "train" or "val": deterministic file-level split (see split_of)
+    val_fraction: float = 0.1
+    eval_mode: bool = False  # fixed crop offsets and per-index seeded noise, for validation
+    seed: int = 0  # noise seed in eval_mode
 
 
 class AudioDataset(Dataset):
+    """Random fixed-length crops, drawn in proportion to file duration.
+
+    One item is one crop: a file contributes ceil(duration / chunk) items per
+    epoch, each taken at a jittered offset inside its own slot. Without a
+    shard cache, only the crop window (plus resampling margin) is read from
+    disk and the crop is peak-normalized on its own.
+    """
+
     def __init__(
         self,
         clean_dir: str,
         noisy_dir: Optional[str] = None,
         cfg: AudioDataConfig = AudioDataConfig(),
     ) -> None:
-        self.clean_paths: List[Path] = [
-            p for p in Path(clean_dir).rglob("*.wav")
-        ]
-        self.noisy_paths: Optional[List[Path]] = None
         self.cfg = cfg
+        self.clean_manifest = self._manifest(clean_dir, "clean")
+        self.noisy_manifest: Optional[Manifest] = None
         if cfg.pair_dirs:
             assert noisy_dir is not None, "noisy_dir required when pair_dirs=True"
-            self.noisy_paths = [p for p in Path(noisy_dir).rglob("*.wav")]
-            assert len(self.clean_paths) == len(self.noisy_paths), "paired datasets must be same length"
+            self.noisy_manifest = self._manifest(noisy_dir, "noisy")
+            assert len(self.clean_manifest) == len(self.noisy_manifest), "paired datasets must be same length"
+        if cfg.split != "all":
+            # pairs follow the clean file's split
+            keep = [i for i, e in enumerate(self.clean_manifest.entries) if split_of(e.path, cfg.val_fraction) == cfg.split]
+            self.clean_manifest = _subset(self.clean_manifest, keep)
+            if self.noisy_manifest is not None:
+                self.noisy_manifest = _subset(self.noisy_manifest, keep)
+        self.clean_paths: List[Path] = self.clean_manifest.paths()
+        self.noisy_paths: Optional[List[Path]] = self.noisy_manifest.paths() if self.noisy_manifest is not None else None
         self.chunk_len = int(cfg.sample_rate * cfg.chunk_seconds)
+        self.clean_index: Optional[ShardIndex] = None
+        self.noisy_index: Optional[ShardIndex] = None
+        if cfg.cache_dir:
+            # splits are disjoint, so each keeps its own shards and nothing is decoded twice
+            suffix = "" if cfg.split == "all" else f"-{cfg.split}"
+            self.clean_index = self._compile(self.clean_paths, Path(cfg.cache_dir) / f"clean{suffix}")
+            if self.noisy_paths is not None:
+                self.noisy_index = self._compile(self.noisy_paths, Path(cfg.cache_dir) / f"noisy{suffix}")
+
+        if self.clean_index is not None:
+            lengths = self.clean_index.lengths()
+        else:
+            lengths = self.clean_manifest.frames_at(cfg.sample_rate)
+        if self.noisy_manifest is not None:
+            noisy_lengths = self.noisy_index.lengths() if self.noisy_index is not None else self.noisy_manifest.frames_at(cfg.sample_rate)
+            lengths = np.minimum(lengths, noisy_lengths)
+        self.lengths = lengths
+        self.crops = np.maximum(1, -(-lengths // max(1, self.chunk_len)))
+        self._crop_ends = np.cumsum(self.crops)
+
+    def _manifest(self, root: str, name: str) -> Manifest:
+        path = str(Path(self.cfg.manifest_dir) / f"{name}.json") if self.cfg.manifest_dir else None
+        return load_manifest(root, path, rebuild=self.cfg.rebuild_manifest)
+
+    def _compile(self, paths: List[Path], cache_dir: Path) -> ShardIndex:
+        return compile_shards(paths, cache_dir, self._load, sample_rate=self.cfg.sample_rate, normalize="peak")
 
     def __len__(self) -> int:
-        return len(self.clean_paths)
+        return int(self._crop_ends[-1]) if len(self._crop_ends) else 0
 
     def _load(self, p: Path) -> np.ndarray:
         y, sr = sf.read(str(p), always_2d=False)
@@ -136,17 +209,146 @@ class AudioDataset(Dataset):
             z = _apply_broadband_noise(z, snr_db=random.uniform(0.0, 15.0))
         return z
 
+    def _read_window(self, manifest: Manifest, i: int, start: int, length: int) -> np.ndarray:
+        """Read `length` samples at target-rate offset `start` without decoding the rest of the file."""
+        e = manifest.entries[i]
+        path = str(Path(manifest.root) / e.path)
+        target = self.cfg.sample_rate
+        if e.sample_rate == target:
+            y, _ = sf.read(path, start=start, frames=length, dtype="float32", always_2d=False)
+            return _to_mono(y).astype(np.float32)
+        # window start on the common sample grid of both rates, so the resampled
+        # window lines up exactly with a whole-file resample
+        g = math.gcd(e.sample_rate, target)
+        step, tstep = e.sample_rate // g, target // g
+        ratio = e.sample_rate / float(target)
+        a = max(0, (int(start * ratio) - _RESAMPLE_MARGIN) // step * step)
+        off = start - (a // step) * tstep
+        b = min(e.frames, a + int(math.ceil((off + length) * ratio)) + _RESAMPLE_MARGIN)
+        y, _ = sf.read(path, start=a, frames=b - a, dtype="float32", always_2d=False)
+        y, _ = _resample(_to_mono(y), e.sample_rate, target)
+        return np.asarray(y[off : off + length], dtype=np.float32)
+
+    def audio(self, f: int, noisy: bool = False) -> np.ndarray:
+        """Whole file `f` at the target rate, peak-normalized."""
+        index = self.noisy_index if noisy else self.clean_index
+        if index is not None:
+            return np.asarray(index.array(f), dtype=np.float32)
+        manifest = self.noisy_manifest if noisy else self.clean_manifest
+        y = self._read_window(manifest, f, 0, manifest.entries[f].frames_at(self.cfg.sample_rate))  # type: ignore[arg-type]
+        peak = float(np.max(np.abs(y))) if len(y) else 0.0
+        return y / (peak + 1e-12) if peak > 0 else y
+
+    def _locate(self, idx: int) -> Tuple[int, int]:
+        f = int(np.searchsorted(self._crop_ends, idx, side="right"))
+        return f, idx - int(self._crop_ends[f] - self.crops[f])
+
+    @property
+    def collate_fn(self) -> Optional[NoiseSynthCollate]:
+        if self.noisy_paths is None and self.cfg.batch_augment and not self.cfg.eval_mode:
+            return NoiseSynthCollate(self.cfg.sample_rate)
+        return None
+
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        clean = self._load(self.clean_paths[idx])
-        if self.noisy_paths is not None:
-            noisy = self._load(self.noisy_paths[idx])  # type: ignore[index]
+        f, slot = self._locate(idx)
+        n = self.chunk_len
+        jitter = 0 if self.cfg.eval_mode else int(worker_rng().integers(0, max(1, n)))
+        start = min(slot * n + jitter, max(0, int(self.lengths[f]) - n))
+        noisy: Optional[np.ndarray] = None
+        if self.clean_index is not None:
+            # shards hold whole, already normalized files
+            clean = _crop_at(self.clean_index.array(f), start, n)
+            if self.noisy_index is not None:
+                noisy = _crop_at(self.noisy_index.array(f), start, n)
         else:
-            noisy = self._synthesize(clean)
-        clean = _random_crop(clean, self.chunk_len)
-        noisy = _random_crop(noisy, self.chunk_len)
-        return torch.from_numpy(noisy), torch.from_numpy(clean)
+            clean = _crop_at(self._read_window(self.clean_manifest, f, start, n), 0, n)
+            peak = float(np.max(np.abs(clean))) if n else 0.0
+            if self.noisy_manifest is not None:
+                # same window and same gain on both sides of a pair so targets stay aligned
+                noisy = _crop_at(self._read_window(self.noisy_manifest, f, start, n), 0, n)
+                peak = max(peak, float(np.max(np.abs(noisy))) if n else 0.0)
+            if peak > 0:
+                gain = 1.0 / max(peak, _MIN_CROP_PEAK)
+                clean *= gain
+                if noisy is not None:
+                    noisy *= gain
+        if noisy is None and self.cfg.eval_mode:
+            # same corruption for this index every epoch and for any worker count
+            rng = np.random.default_rng([self.cfg.seed, idx])
+            noisy = synthesize_batch(clean[None, :], self.cfg.sample_rate, rng)[0]
+        elif noisy is None:
+            # batch_augment: noisy side is synthesized for the whole batch by collate_fn
+            noisy = clean if self.cfg.batch_augment else self._synthesize(clean)
+        return torch.from_numpy(noisy.astype(np.float32)), torch.from_numpy(clean)
+
+
+def _rank_world() -> Tuple[int, int]:
+    import torch.distributed as dist
+
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return int(os.environ.get("RANK", os.environ.get("LOCAL_RANK", 0))), int(os.environ.get("WORLD_SIZE", 1))
+
+
+class ShardAwareSampler(Sampler):
+    """Distributed sampler over AudioDataset crops that keeps each rank on its own shards.
+
+    Crops are laid out in storage order (shard, offset) and split into
+    `world` contiguous, equal ranges, so each process only maps and pages in
+    its slice of the cache; shuffling happens within a rank's range. Every
+    rank yields total // world indices per epoch so DDP steps stay in
+    lockstep. Rank and world size are read when iterating, after the process
+    group exists.
+    """
+
+    def __init__(self, ds: "AudioDataset", shuffle: bool = True, seed: int = 0) -> None:
+        self.ds = ds
+        self.shuffle = shuffle
+        self.seed = int(seed)
+        self.epoch = 0
+        self._plans: Dict[int, List[np.ndarray]] = {}
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = int(epoch)
+
+    def _plan(self, world: int) -> List[np.ndarray]:
+        plan = self._plans.get(world)
+        if plan is not None:
+            return plan
+        ds = self.ds
+        files = np.arange(len(ds.crops))
+        if ds.clean_index is not None:
+            # storage order, so a contiguous run of crops is a contiguous run of shards
+            entries = ds.clean_index.entries
+            files = np.array(sorted(files, key=lambda f: (entries[f].shard, entries[f].offset)), dtype=np.int64)
+        starts = ds._crop_ends - ds.crops
+        order = np.concatenate([np.arange(starts[f], starts[f] + ds.crops[f], dtype=np.int64) for f in files]) if len(files) else np.zeros(0, dtype=np.int64)
+        plan = np.array_split(order, world)
+        self._plans[world] = plan
+        return plan
+
+    def __len__(self) -> int:
+        _, world = _rank_world()
+        return max(1, len(self.ds) // world)
+
+    def __iter__(self) -> Iterator[int]:
+        rank, world = _rank_world()
+        idx = self._plan(world)[rank]
+        if self.shuffle:
+            idx = np.random.default_rng(self.seed + self.epoch).permutation(idx)
+        n = max(1, len(self.ds) // world)
+        idx = idx[:n] if len(idx) >= n else np.resize(idx, n)
+        return iter(idx.tolist())
 
 
-def make_loader(ds: Dataset, batch_size: int = 16, workers: int = 2, shuffle: bool = True) -> DataLoader:
-    return DataLoader(ds, batch_size=batch_size, shuffle=shuffle, num_workers=workers, pin_memory=True)
+def make_loader(ds: Dataset, batch_size: int = 16, workers: int = 2, shuffle: bool = True, sampler: Optional[Sampler] = None) -> DataLoader:
+    return DataLoader(
+        ds,
+        batch_size=batch_size,
+        shuffle=(shuffle and sampler is None),
+        sampler=sampler,
+        num_workers=workers,
+        pin_memory=True,
+        collate_fn=getattr(ds, "collate_fn", None),
+    )
 
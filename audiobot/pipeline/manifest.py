@@ -0,0 +1,109 @@
+"""Cached dataset manifest for training.
+
+`load_manifest` scans a directory for audio once and records frames, sample
+rate and channel count per file (from the file header; nothing is decoded) in
+a JSON manifest. Later runs load the manifest instead of walking the tree, so
+datasets know every file's duration up front: crops can be drawn in
+proportion to duration and read as short windows with `sf.read(start=,
+frames=)`.
+
+The manifest is not rescanned automatically; pass `rebuild=True` (CLI:
+`--rebuild-manifest`) after adding or removing files.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = ".audiobot_manifest.json"
+
+
+@dataclass
+class ManifestEntry:
+    path: str  # relative to the manifest root
+    frames: int
+    sample_rate: int
+    channels: int
+
+    def frames_at(self, sample_rate: int) -> int:
+        return int(self.frames * sample_rate // self.sample_rate)
+
+
+@dataclass
+class Manifest:
+    root: str
+    pattern: str
+    entries: List[ManifestEntry]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def paths(self) -> List[Path]:
+        return [Path(self.root) / e.path for e in self.entries]
+
+    def frames_at(self, sample_rate: int) -> np.ndarray:
+        return np.array([e.frames_at(sample_rate) for e in self.entries], dtype=np.int64)
+
+    def seconds(self) -> float:
+        return float(sum(e.frames / float(e.sample_rate) for e in self.entries))
+
+
+def scan(root: Path, pattern: str = "*.wav") -> Manifest:
+    """Walk `root` and read each file's header; unreadable files are skipped."""
+    import soundfile as sf  # type: ignore
+
+    root = Path(root)
+    entries: List[ManifestEntry] = []
+    for p in sorted(root.rglob(pattern)):
+        try:
+            info = sf.info(str(p))
+        except Exception:
+            continue
+        if info.frames <= 0:
+            continue
+        entries.append(ManifestEntry(p.relative_to(root).as_posix(), int(info.frames), int(info.samplerate), int(info.channels)))
+    return Manifest(str(root), pattern, entries)
+
+
+def _read(path: Path) -> Optional[Manifest]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return Manifest(data["root"], data["pattern"], [ManifestEntry(**e) for e in data["entries"]])
+    except Exception:
+        return None
+
+
+def _write(m: Manifest, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    payload = {"version": MANIFEST_VERSION, "root": m.root, "pattern": m.pattern, "entries": [asdict(e) for e in m.entries]}
+    tmp.write_text(json.dumps(payload), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def load_manifest(root: str, manifest_path: Optional[str] = None, pattern: str = "*.wav", rebuild: bool = False) -> Manifest:
+    """Load the cached manifest for `root`, scanning and writing it on first use.
+
+    Defaults to `<root>/.audiobot_manifest.json`. A cached manifest built for
+    another root or pattern is rebuilt.
+    """
+    root_p = Path(root).resolve()
+    path = Path(manifest_path) if manifest_path else root_p / MANIFEST_NAME
+    m = None if rebuild else _read(path)
+    if m is None or m.root != str(root_p) or m.pattern != pattern:
+        m = scan(root_p, pattern)
+        try:
+            _write(m, path)
+        except OSError:
+            pass  # read-only dataset dir: fall back to scanning each run
+    return m
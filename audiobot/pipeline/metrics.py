@@ -0,0 +1,36 @@
+"""Batched denoiser quality metrics (torch, [B, T] tensors)."""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import torch
+
+
+def si_sdr(pred: torch.Tensor, target: torch.Tensor, eps: float = 1e-8) -> torch.Tensor:
+    """Scale-invariant SDR in dB per row; returns [B]."""
+    pred = pred - pred.mean(dim=-1, keepdim=True)
+    target = target - target.mean(dim=-1, keepdim=True)
+    alpha = (pred * target).sum(dim=-1, keepdim=True) / (target.pow(2).sum(dim=-1, keepdim=True) + eps)
+    proj = alpha * target
+    noise = pred - proj
+    return 10.0 * torch.log10((proj.pow(2).sum(dim=-1) + eps) / (noise.pow(2).sum(dim=-1) + eps))
+
+
+def multires_stft_distance(
+    pred: torch.Tensor,
+    target: torch.Tensor,
+    fft_sizes: Sequence[int] = (512, 1024, 2048),
+    eps: float = 1e-7,
+) -> torch.Tensor:
+    """Spectral convergence + log-magnitude L1, averaged over resolutions; returns [B]."""
+    total = torch.zeros(pred.shape[0], device=pred.device)
+    for n_fft in fft_sizes:
+        win = torch.hann_window(n_fft, device=pred.device)
+        kw = dict(n_fft=n_fft, hop_length=n_fft // 4, window=win, return_complex=True)
+        mp = torch.stft(pred, **kw).abs()
+        mt = torch.stft(target, **kw).abs()
+        sc = torch.linalg.vector_norm(mt - mp, dim=(-2, -1)) / (torch.linalg.vector_norm(mt, dim=(-2, -1)) + eps)
+        mag = (torch.log(mt + eps) - torch.log(mp + eps)).abs().mean(dim=(-2, -1))
+        total = total + sc + mag
+    return total / len(fft_sizes)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
 import torch
+import torch.nn.functional as F
 from torch import nn
 
 
@@ -39,3 +42,112 @@ class DenoiserNet(nn.Module):
         y = self.out(h)
         return y.squeeze(1)
 
+
+
+class CausalDenoiserNet(nn.Module):
+    """Causal variant of DenoiserNet for low-latency streaming.
+
+    Same layers and parameter names as DenoiserNet, but every conv is padded
+    on the left only, so output sample t depends on inputs <= t. For frame-by-
+    frame use, `forward_stream` carries a per-layer history buffer holding the
+    last (kernel_size - 1) * dilation samples that layer needs.
+    """
+
+    def __init__(self, channels: int = 64, n_layers: int = 8, kernel_size: int = 9):
+        super().__init__()
+        self.inp = nn.Conv1d(1, channels, kernel_size)
+        blocks = []
+        ctx = [kernel_size - 1]
+        for i in range(n_layers):
+            dil = 2 ** (i % 4)
+            blocks.append(
+                nn.Sequential(
+                    nn.Conv1d(channels, channels, kernel_size, dilation=dil),
+                    nn.ReLU(inplace=True),
+                    nn.Conv1d(channels, channels, 1),
+                )
+            )
+            ctx.append((kernel_size - 1) * dil)
+        self.blocks = nn.ModuleList(blocks)
+        self.out = nn.Conv1d(channels, 1, 1)
+        self.channels = channels
+        self.context = ctx
+
+    @property
+    def receptive_field(self) -> int:
+        return sum(self.context) + 1
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        # x: [B, T] or [B, 1, T]
+        if x.dim() == 2:
+            x = x.unsqueeze(1)
+        h = self.inp(F.pad(x, (self.context[0], 0)))
+        for blk, ctx in zip(self.blocks, self.context[1:]):
+            h = h + blk(F.pad(h, (ctx, 0)))
+            h = torch.relu(h)
+        y = self.out(h)
+        return y.squeeze(1)
+
+    def init_state(self, batch: int = 1, device: Optional[torch.device] = None) -> List[torch.Tensor]:
+        shapes = [(batch, 1, self.context[0])] + [(batch, self.channels, c) for c in self.context[1:]]
+        return [torch.zeros(s, device=device) for s in shapes]
+
+    def forward_stream(self, x: torch.Tensor, state: List[torch.Tensor]) -> Tuple[torch.Tensor, List[torch.Tensor]]:
+        """Process one frame [B, T] given the history from previous frames.
+
+        Returns the denoised frame and the updated state; concatenating the
+        outputs of consecutive frames equals `forward` on the whole signal.
+        """
+        if x.dim() == 2:
+            x = x.unsqueeze(1)
+        new_state = []
+        buf = torch.cat([state[0], x], dim=-1)
+        new_state.append(buf[..., buf.shape[-1] - self.context[0] :])
+        h = self.inp(buf)
+        for blk, ctx, hist in zip(self.blocks, self.context[1:], state[1:]):
+            buf = torch.cat([hist, h], dim=-1)
+            new_state.append(buf[..., buf.shape[-1] - ctx :])
+            h = torch.relu(h + blk(buf))
+        return self.out(h).squeeze(1), new_state
+
+
+# Size family: parameter count and CPU cost grow roughly with channels^2 * layers.
+MODEL_SIZES: Dict[str, Dict[str, int]] = {
+    "tiny": {"channels": 16, "n_layers": 4, "kernel_size": 7},
+    "small": {"channels": 32, "n_layers": 6, "kernel_size": 9},
+    "base": {"channels": 64, "n_layers": 8, "kernel_size": 9},
+    "large": {"channels": 128, "n_layers": 12, "kernel_size": 9},
+}
+
+
+def resolve_arch(size: str = "base", channels: int = 0, n_layers: int = 0, kernel_size: int = 0) -> Dict[str, int]:
+    """Architecture for a size name, with any non-zero explicit value overriding it."""
+    if size not in MODEL_SIZES:
+        raise ValueError(f"unknown model size {size!r}; choose from {', '.join(MODEL_SIZES)}")
+    arch = dict(MODEL_SIZES[size])
+    for k, v in (("channels", channels), ("n_layers", n_layers), ("kernel_size", kernel_size)):
+        if v:
+            arch[k] = int(v)
+    check_arch(**arch)
+    return arch
+
+
+def check_arch(channels: int, n_layers: int, kernel_size: int) -> None:
+    """Raise ValueError for an architecture DenoiserNet cannot build."""
+    if channels <= 0 or n_layers <= 0:
+        raise ValueError(f"channels and n_layers must be positive, got {channels} and {n_layers}")
+    if kernel_size <= 0 or kernel_size % 2 == 0:
+        # padding is kernel_size // 2, so an even kernel yields T+1 samples and breaks the residual add
+        raise ValueError(f"kernel_size must be a positive odd number, got {kernel_size}")
+
+
+def build_denoiser(channels: int = 64, n_layers: int = 8, kernel_size: int = 9, causal: bool = False) -> nn.Module:
+    cls = CausalDenoiserNet if causal else DenoiserNet
+    return cls(channels=channels, n_layers=n_layers, kernel_size=kernel_size)
+
+
+def arch_from_state_dict(state: Mapping[str, Any]) -> Dict[str, int]:
+    """Recover (channels, n_layers, kernel_size) from DenoiserNet weights (for checkpoints without hparams)."""
+    w = state["inp.weight"]  # [channels, 1, kernel_size]
+    layers = {int(k.split(".")[1]) for k in state if k.startswith("blocks.")}
+    return {"channels": int(w.shape[0]), "n_layers": (max(layers) + 1) if layers else 0, "kernel_size": int(w.shape[-1])}
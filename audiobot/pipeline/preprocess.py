@@ -1,65 +1,199 @@
+import math
+import multiprocessing as mp
 import os
+import shutil
 import tempfile
-import subprocess
+import threading
+import time
+import weakref
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 import numpy as np
 import soundfile as sf
 
 
-def _load_silero():
+SILERO_ENV = "AUDIOBOT_SILERO_VAD"  # path to silero_vad.jit or silero_vad.onnx (v5)
+SILERO_SR = 16000
+SILERO_WINDOW = 512  # samples per model call at 16 kHz (32 ms)
+_SILERO_CONTEXT = 64  # samples of the previous window the v5 model sees (ONNX input)
+_SILERO_CACHE: Dict[str, Optional["SileroVAD"]] = {}
+_SILERO_LOCK = threading.Lock()
+
+
+def silero_model_path(path: Optional[str] = None) -> Optional[Path]:
+    """First existing local Silero VAD model; never touches the network.
+
+    Order: `path`, $AUDIOBOT_SILERO_VAD, ./models/silero_vad.jit, the files
+    bundled with the `silero-vad` pip package, an existing torch.hub checkout.
+    """
+    cands: List[Path] = []
+    for p in (path, os.getenv(SILERO_ENV)):
+        if p:
+            cands.append(Path(p))
+    cands.append(Path("models") / "silero_vad.jit")
+    try:
+        import silero_vad  # type: ignore
+
+        cands.append(Path(silero_vad.__file__).parent / "data" / "silero_vad.jit")
+    except Exception:
+        pass
     try:
         import torch
-        model, utils = torch.hub.load(
-            repo_or_dir='snakers4/silero-vad',
-            model='silero_vad',
-            force_reload=False,
-            trust_repo=True,
-            onnx=False,
-        ), None
-        return model
+
+        hub = Path(torch.hub.get_dir()) / "snakers4_silero-vad_master"
+        cands += [hub / "src" / "silero_vad" / "data" / "silero_vad.jit", hub / "files" / "silero_vad.jit"]
     except Exception:
-        return None
+        pass
+    for c in cands:
+        if c.is_file():
+            return c
+    return None
+
+
+class SileroVAD:
+    """Silero VAD (v5) on 16 kHz audio in fixed 512-sample windows.
+
+    The signal is cut into up to `streams` contiguous pieces that run as rows
+    of one batch, each stepping through its windows with its own carried
+    recurrent state. Every row but the first starts `warmup` windows before
+    its piece so the state has settled by the time its own outputs are kept.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()  # the TorchScript model keeps its state on the module
+        if self.path.suffix.lower() == ".onnx":
+            import onnxruntime as ort  # type: ignore
+
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = 1
+            self._sess = ort.InferenceSession(str(self.path), sess_options=opts, providers=["CPUExecutionProvider"])
+            self._jit = None
+        else:
+            import torch
 
+            self._jit = torch.jit.load(str(self.path), map_location="cpu").eval()
+            self._sess = None
 
-def vad_silero(audio: np.ndarray, sr: int, thresh: float = 0.5, window_ms: float = 30.0) -> np.ndarray:
+    def _run(self, X: np.ndarray) -> np.ndarray:
+        """X: [B, T, 512] windows; returns [B, T] speech probabilities."""
+        b, t, _ = X.shape
+        out = np.empty((b, t), dtype=np.float32)
+        if self._jit is not None:
+            import torch
+
+            with self._lock, torch.inference_mode():
+                self._jit.reset_states()
+                xs = torch.from_numpy(X)
+                for i in range(t):
+                    out[:, i] = self._jit(xs[:, i], SILERO_SR).reshape(-1).numpy()
+            return out
+        state = np.zeros((2, b, 128), dtype=np.float32)
+        ctx = np.zeros((b, _SILERO_CONTEXT), dtype=np.float32)
+        sr = np.array(SILERO_SR, dtype=np.int64)
+        for i in range(t):
+            inp = np.concatenate([ctx, X[:, i]], axis=1)
+            y, state = self._sess.run(None, {"input": inp, "state": state, "sr": sr})
+            out[:, i] = np.asarray(y).reshape(-1)
+            ctx = inp[:, -_SILERO_CONTEXT:]
+        return out
+
+    def window_probs(self, audio16k: np.ndarray, streams: int = 16, warmup: int = 64, min_stream_s: float = 30.0) -> np.ndarray:
+        """Speech probability per 512-sample window of mono 16 kHz audio.
+
+        Streams are at least `min_stream_s` long, so clips under twice that run
+        as a single exact stream; longer audio trades a 2 s (64-window) warm-up
+        per stream boundary for batch parallelism.
+        """
+        n_win = int(math.ceil(len(audio16k) / SILERO_WINDOW))
+        if n_win == 0:
+            return np.zeros(0, dtype=np.float32)
+        per_min = max(1, int(min_stream_s * SILERO_SR / SILERO_WINDOW))
+        streams = max(1, min(int(streams), n_win // per_min))
+        W = np.zeros((n_win + 1, SILERO_WINDOW), dtype=np.float32)  # last row: all-zero pad window
+        flat = W[:n_win].reshape(-1)
+        flat[: len(audio16k)] = audio16k
+        per = int(math.ceil(n_win / max(1, int(streams))))
+        rows = int(math.ceil(n_win / per))
+        # row 0 starts cold at the true start, exactly like a single stream; the
+        # others start `warmup` windows early on real audio and drop those outputs
+        lead = np.where(np.arange(rows) == 0, 0, min(int(warmup), per))
+        first = np.arange(rows) * per - lead
+        idx = first[:, None] + np.arange(per + lead.max())[None, :]
+        idx = np.where(idx < n_win, idx, n_win)
+        probs = self._run(W[idx])
+        keep = lead[:, None] + np.arange(per)[None, :]
+        return np.take_along_axis(probs, keep, axis=1).reshape(-1)[:n_win]
+
+
+def load_silero(path: Optional[str] = None) -> Optional[SileroVAD]:
+    """Per-process cached Silero engine (None if no local model or it fails to load)."""
+    p = silero_model_path(path)
+    key = str(p) if p is not None else ""
+    with _SILERO_LOCK:
+        if key in _SILERO_CACHE:
+            return _SILERO_CACHE[key]
+        engine: Optional[SileroVAD] = None
+        if p is not None:
+            try:
+                engine = SileroVAD(p)
+            except Exception:
+                engine = None
+        _SILERO_CACHE[key] = engine  # failures are cached too: no reload attempt per call
+        return engine
+
+
+def vad_silero(audio: np.ndarray, sr: int, thresh: float = 0.5, window_ms: float = 30.0, model_path: Optional[str] = None) -> np.ndarray:
     """Return frame-wise speech probability using Silero VAD if available; else energy-based.
 
     audio: mono float32 in [-1,1]
-    returns: probs per frame (0..1)
+    returns: probs per frame (0..1), one per `window_ms` hop like `vad_energy`
     """
     hop = int(sr * (window_ms / 1000.0))
     if audio.ndim > 1:
         audio = np.mean(audio, axis=1)
-    # Attempt Silero
-    model = _load_silero()
-    if model is not None:
+    engine = load_silero(model_path)
+    if engine is not None and len(audio):
         try:
-            import torch
-            with torch.inference_mode():
-                x = torch.from_numpy(audio).float().unsqueeze(0)
-                # The Silero VAD expects 8k/16k; resample if needed
-                if sr not in (8000, 16000):
-                    import librosa
-                    y = librosa.resample(audio, orig_sr=sr, target_sr=16000)
-                    x = torch.from_numpy(y).float().unsqueeze(0)
-                    sr_eff = 16000
-                else:
-                    sr_eff = sr
-                out = model(x, sr_eff)
-                prob = out.squeeze().cpu().numpy()
-                # Upsample/downsample probability to hop rate
-                # Simple approach: frame at hop
-                idx = np.arange(0, len(audio), hop)
-                probs = np.interp(idx, np.linspace(0, len(audio) - 1, len(prob)), prob)
-                return probs
+            x = np.asarray(audio, dtype=np.float32)
+            if sr != SILERO_SR:
+                from scipy.signal import resample_poly
+
+                g = math.gcd(int(sr), SILERO_SR)
+                x = resample_poly(x, SILERO_SR // g, int(sr) // g).astype(np.float32)
+            wp = engine.window_probs(x)
+            # window centres and hop-frame centres on the input time axis
+            centres = (np.arange(len(wp)) * SILERO_WINDOW + SILERO_WINDOW / 2.0) * (sr / float(SILERO_SR))
+            frames = np.arange(0, len(audio), hop) + hop / 2.0
+            return np.interp(frames, centres, wp)
         except Exception:
             pass
     # Fallback: energy-based VAD
-    frames = [audio[i:i + hop] for i in range(0, len(audio), hop)]
-    energies = np.array([np.mean(f**2) if len(f) else 0.0 for f in frames])
+    return vad_energy(audio, sr, window_ms=window_ms)
+
+
+def vad_energy(audio: np.ndarray, sr: int, window_ms: float = 30.0) -> np.ndarray:
+    """Cheap frame-wise speech probability from short-time energy.
+
+    audio: mono float32 in [-1,1]
+    returns: probs per frame (0..1)
+    """
+    hop = int(sr * (window_ms / 1000.0))
+    if audio.ndim > 1:
+        audio = np.mean(audio, axis=1)
+    n = len(audio)
+    n_frames = int(math.ceil(n / hop)) if n else 0
+    if n_frames == 0:
+        return np.zeros(0)
+    # hop-strided frames as one [n_frames, hop] view; the last frame is zero-padded
+    x = np.zeros(n_frames * hop, dtype=np.float32)
+    x[:n] = audio
+    frames = x.reshape(n_frames, hop)
+    counts = np.full(n_frames, hop, dtype=np.float64)
+    counts[-1] = n - (n_frames - 1) * hop
+    energies = np.einsum("ij,ij->i", frames, frames, dtype=np.float64) / counts
     # Robust threshold via percentile
     thr = max(1e-8, float(np.percentile(energies, 75)) * 0.3)
     probs = np.clip((energies - thr) / (thr + 1e-8), 0, 1)
@@ -67,79 +201,336 @@ def vad_silero(audio: np.ndarray, sr: int, thresh: float = 0.5, window_ms: float
 
 
 def segments_from_probs(probs: np.ndarray, sr: int, hop: int, min_speech: float = 0.2, pad: float = 0.05, threshold: float = 0.5) -> List[Tuple[int, int]]:
-    segs: List[Tuple[int, int]] = []
-    in_seg = False
-    start = 0
-    for i, p in enumerate(probs):
-        if p >= threshold and not in_seg:
-            in_seg = True
-            start = i
-        elif p < threshold and in_seg:
-            end = i
-            # convert to samples with padding
-            s = max(0, start * hop - int(pad * sr))
-            e = (end * hop) + int(pad * sr)
-            if (e - s) / sr >= min_speech:
-                segs.append((s, e))
-            in_seg = False
-    if in_seg:
-        s = max(0, start * hop - int(pad * sr))
-        e = len(probs) * hop + int(pad * sr)
-        if (e - s) / sr >= min_speech:
-            segs.append((s, e))
-    return segs
-
-
-def concat_segments(audio: np.ndarray, segs: List[Tuple[int, int]], crossfade: int = 0) -> np.ndarray:
-    chunks = []
-    for s, e in segs:
-        chunks.append(audio[s:e])
-    if not chunks:
-        return np.zeros(1, dtype=np.float32)
-    out = np.concatenate(chunks)
-    return out.astype(np.float32)
-
-
-def demucs_vocals(input_wav: Path, outdir: Path) -> Optional[Path]:
-    """Run Demucs two-stems (vocals) and return path to extracted vocals file.
-    Requires 'demucs' CLI in PATH (provided by our env install).
+    active = (np.asarray(probs) >= threshold).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], active, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    # convert to samples with padding
+    p = int(pad * sr)
+    s = np.maximum(0, starts * hop - p)
+    e = ends * hop + p
+    keep = (e - s) / sr >= min_speech
+    return [(int(a), int(b)) for a, b in zip(s[keep], e[keep])]
+
+
+@dataclass
+class SegmentMap:
+    """Where each kept segment sits in the concatenated output.
+
+    `src[i]` is the segment's [start, end) in the original audio and `dst[i]`
+    its first sample in the output; consecutive segments overlap by
+    `xfade[i]` samples there (`xfade[0]` is 0).
     """
-    outdir = outdir.resolve()
-    outdir.mkdir(parents=True, exist_ok=True)
-    cmd = [
-        'demucs', '--two-stems', 'vocals', '-o', str(outdir), str(input_wav)
-    ]
-    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    # Demucs output: outdir/model/input_stem.wav
-    # Find produced vocals file
-    for p in outdir.rglob(f"{input_wav.stem}/vocals*.wav"):
-        return p
-    # alternative layout
-    for p in outdir.rglob("vocals*.wav"):
-        if input_wav.stem in p.name:
-            return p
-    return None
 
+    src: np.ndarray  # [N, 2] int64
+    dst: np.ndarray  # [N] int64
+    xfade: np.ndarray  # [N] int64
+    length: int  # samples in the original audio
+
+    def __len__(self) -> int:
+        return len(self.dst)
+
+    def to_source(self, idx: np.ndarray) -> np.ndarray:
+        """Original-timeline sample index for output sample indices `idx`.
+
+        Inside a crossfade the later segment wins.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        k = np.clip(np.searchsorted(self.dst, idx, side="right") - 1, 0, max(0, len(self.dst) - 1))
+        return self.src[k, 0] + (idx - self.dst[k])
+
+    def restore(self, processed: np.ndarray) -> np.ndarray:
+        """Place processed output back on the original timeline (silence elsewhere)."""
+        out = np.zeros((self.length,) + processed.shape[1:], dtype=np.float32)
+        for (s, e), d in zip(self.src, self.dst):
+            n = max(0, min(e - s, len(processed) - d))
+            out[s : s + n] = processed[d : d + n]
+        return out
+
+
+def merge_segments(segs: List[Tuple[int, int]], length: int) -> List[Tuple[int, int]]:
+    """Sort, clip to [0, length) and merge overlapping or touching segments."""
+    merged: List[Tuple[int, int]] = []
+    for s, e in sorted(segs):
+        s, e = max(0, int(s)), min(length, int(e))
+        if e <= s:
+            continue
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def concat_segments(audio: np.ndarray, segs: List[Tuple[int, int]], crossfade: int = 0) -> Tuple[np.ndarray, SegmentMap]:
+    """Join speech segments into one buffer with equal-power crossfades.
 
-def spectral_gate_dereverb(y: np.ndarray, sr: int, n_fft: int = 1024, hop: int = 256, reduction_db: float = 12.0) -> np.ndarray:
-    """Simple spectral gating dereverb/noise reduction.
-    Estimate noise floor from 10th percentile per frequency bin and apply soft mask.
+    Segments are merged first (padding makes neighbours overlap), then written
+    once into a preallocated float32 output; each joint overlaps the two
+    segments by up to `crossfade` samples (at most half of either segment).
+    Returns the audio and the SegmentMap back to `audio`'s timeline.
     """
-    import librosa
-    S = librosa.stft(y, n_fft=n_fft, hop_length=hop, win_length=n_fft)
-    mag, phase = np.abs(S), np.angle(S)
-    # Noise floor per bin
-    noise = np.percentile(mag, 10, axis=1, keepdims=True)
-    # Soft mask: 1 where speech dominates
-    eps = 1e-8
-    snr = (mag + eps) / (noise + eps)
-    mask = np.clip((snr - 1.0) / snr, 0.0, 1.0)
-    # Apply reduction
-    att = 10 ** (-reduction_db / 20.0)
-    mag_d = mag * (mask + (1 - mask) * att)
-    Y = mag_d * np.exp(1j * phase)
-    out = librosa.istft(Y, hop_length=hop, win_length=n_fft)
-    return out.astype(np.float32)
+    merged = merge_segments(segs, len(audio))
+    if not merged:
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros((1,) + audio.shape[1:], dtype=np.float32), SegmentMap(empty.reshape(0, 2), empty, empty, len(audio))
+    src = np.array(merged, dtype=np.int64)
+    lens = src[:, 1] - src[:, 0]
+    xfade = np.zeros(len(src), dtype=np.int64)
+    xfade[1:] = np.minimum(max(0, int(crossfade)), np.minimum(lens[:-1], lens[1:]) // 2)
+    dst = np.concatenate(([0], np.cumsum(lens[:-1]))) - np.cumsum(xfade)
+    out = np.empty((int(dst[-1] + lens[-1]),) + audio.shape[1:], dtype=np.float32)
+    fades: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    for (s, e), d, x in zip(merged, dst, xfade):
+        n = e - s
+        if x:
+            if x not in fades:
+                t = (np.arange(x) + 0.5) / x * (math.pi / 2)
+                shape = (x,) + (1,) * (audio.ndim - 1)
+                fades[x] = (np.sin(t).astype(np.float32).reshape(shape), np.cos(t).astype(np.float32).reshape(shape))
+            fin, fout = fades[x]
+            out[d : d + x] *= fout
+            out[d : d + x] += fin * audio[s : s + x]
+        out[d + x : d + n] = audio[s + x : e]
+    return out, SegmentMap(src, dst, xfade, len(audio))
+
+
+def demucs_vocals(input_wav: Path, outdir: Path, model: str = "htdemucs") -> Optional[Path]:
+    """Extract vocals with the shared resident separator; returns the vocals file or None."""
+    from ..stems.service import get_separator
+
+    res = get_separator().separate(Path(input_wav), Path(outdir), model=model, stems=2, two_stems_target="vocals")
+    if not res.get("ok"):
+        return None
+    return next((Path(p) for p in res["stems"] if Path(p).stem.endswith("_vocals")), None)
+
+
+class StreamingSpectralGate:
+    """Block-streaming STFT spectral gate with a running noise-floor estimate.
+
+    The noise floor per bin is tracked with minimum statistics: the power
+    spectrum is recursively smoothed over time and the floor is the minimum
+    of that over the last `floor_seconds`, kept as `_SUBWINDOWS` sub-window
+    minima so memory does not grow with the input. Digital silence is ignored
+    by the tracker. The gain is the same soft mask the one-shot gate used.
+
+    Feed audio with `process()` and finish with `flush()`; each returns the
+    next stretch of output, so output length always equals input length.
+    Work is done `block_frames` frames at a time in float32/complex64.
+    """
+
+    _SUBWINDOWS = 8
+    # sqrt(min of smoothed power) sits above the 10th-percentile magnitude the
+    # one-shot gate used; this brings the floor back to that level for
+    # stationary noise.
+    _FLOOR_SCALE = 0.55
+
+    def __init__(
+        self,
+        sr: int,
+        n_fft: int = 1024,
+        hop: int = 256,
+        reduction_db: float = 12.0,
+        floor_seconds: float = 1.5,
+        smoothing: float = 0.85,
+        block_frames: int = 256,
+    ) -> None:
+        if n_fft % hop:
+            raise ValueError("n_fft must be a multiple of hop")
+        self.n_fft, self.hop = int(n_fft), int(hop)
+        self.att = np.float32(10 ** (-reduction_db / 20.0))
+        self.alpha = float(smoothing)
+        self.block_frames = max(1, int(block_frames))
+        frames = max(self._SUBWINDOWS, int(round(floor_seconds * sr / hop)))
+        self.sub_len = max(1, frames // self._SUBWINDOWS)
+        # sqrt-Hann analysis and synthesis: the squared window overlap-adds to a constant
+        hann = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.n_fft) / self.n_fft)
+        self.win = np.sqrt(hann).astype(np.float32)
+        self.ola_gain = np.float32(hann.sum() / self.hop)
+        bins = self.n_fft // 2 + 1
+        self._power: Optional[np.ndarray] = None  # smoothed power of the last frame
+        self._cur_min = np.full(bins, np.inf, dtype=np.float32)
+        self._cur_count = 0
+        self._ring = np.full((self._SUBWINDOWS, bins), np.inf, dtype=np.float32)
+        self._ring_pos = 0
+        self._ring_min = np.full(bins, np.inf, dtype=np.float32)
+        # analysis starts n_fft - hop samples early so the first samples are fully overlapped
+        self._pad = self.n_fft - self.hop
+        self._in = np.zeros(self._pad, dtype=np.float32)
+        self._ola = np.zeros(self._pad, dtype=np.float32)
+        self._skip = self._pad  # leading output samples that belong to the padding
+        self._pending = 0  # input samples not yet returned
+
+    def _noise_floor(self, power: np.ndarray) -> np.ndarray:
+        """Per-frame floor (power) for a [F, bins] block, updating the tracker."""
+        floor = np.empty_like(power)
+        t = 0
+        while t < len(power):
+            n = min(len(power) - t, self.sub_len - self._cur_count)
+            p = np.where(power[t : t + n] > 1e-12, power[t : t + n], np.inf)
+            run = np.minimum.accumulate(np.concatenate((self._cur_min[None], p)), axis=0)[1:]
+            floor[t : t + n] = np.minimum(run, self._ring_min)
+            self._cur_min = run[-1]
+            self._cur_count += n
+            t += n
+            if self._cur_count == self.sub_len:
+                self._ring[self._ring_pos] = self._cur_min
+                self._ring_pos = (self._ring_pos + 1) % self._SUBWINDOWS
+                self._ring_min = self._ring.min(axis=0)
+                self._cur_min = np.full_like(self._cur_min, np.inf)
+                self._cur_count = 0
+        return np.where(np.isfinite(floor), floor, 0.0)
+
+    def _frames(self, buf: np.ndarray, n_frames: int) -> np.ndarray:
+        from scipy import fft as sfft  # type: ignore
+        from scipy.signal import lfilter  # type: ignore
+
+        frames = np.lib.stride_tricks.sliding_window_view(buf, self.n_fft)[:: self.hop][:n_frames]
+        X = sfft.rfft(frames * self.win, axis=1)
+        mag = np.abs(X)
+        # recursive smoothing along time, carried across blocks
+        prev = self._power if self._power is not None else mag[0] ** 2
+        zi = (self.alpha * prev)[None]
+        power, _ = lfilter([1 - self.alpha], [1, -self.alpha], mag**2, axis=0, zi=zi)
+        power = power.astype(np.float32)
+        self._power = power[-1]
+        noise = np.sqrt(self._noise_floor(power)) * self._FLOOR_SCALE
+        eps = 1e-8
+        snr = (mag + eps) / (noise + eps)
+        mask = np.clip((snr - 1.0) / snr, 0.0, 1.0)
+        X *= mask + (1 - mask) * self.att
+        return sfft.irfft(X, n=self.n_fft, axis=1).astype(np.float32) * self.win
+
+    def _run(self) -> np.ndarray:
+        outs = []
+        while len(self._in) >= self.n_fft:
+            n_frames = min(self.block_frames, (len(self._in) - self.n_fft) // self.hop + 1)
+            y = self._frames(self._in, n_frames)
+            span = (n_frames - 1) * self.hop + self.n_fft
+            ola = np.zeros(span, dtype=np.float32)
+            ola[: len(self._ola)] = self._ola
+            for k in range(0, self.n_fft, self.hop):
+                # frame slices that land on the same hop-grid offset do not overlap
+                seg = y[:, k : k + self.hop]
+                ola[k : k + n_frames * self.hop].reshape(n_frames, self.hop)[:] += seg
+            done = n_frames * self.hop
+            outs.append(ola[:done] / self.ola_gain)
+            self._ola = ola[done:]
+            self._in = self._in[done:]
+        if not outs:
+            return np.zeros(0, dtype=np.float32)
+        out = np.concatenate(outs) if len(outs) > 1 else outs[0]
+        if self._skip:
+            cut = min(self._skip, len(out))
+            out, self._skip = out[cut:], self._skip - cut
+        return out
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        self._in = np.concatenate((self._in, x))
+        self._pending += len(x)
+        out = self._run()[: self._pending]
+        self._pending -= len(out)
+        return out
+
+    def flush(self) -> np.ndarray:
+        self._in = np.concatenate((self._in, np.zeros(self._pad + self.hop, dtype=np.float32)))
+        out = self._run()[: self._pending]
+        self._pending = 0
+        return out
+
+
+def spectral_gate_dereverb(y: np.ndarray, sr: int, n_fft: int = 1024, hop: int = 256, reduction_db: float = 12.0, block_frames: int = 256) -> np.ndarray:
+    """Spectral gating dereverb/noise reduction of a mono array.
+
+    Runs StreamingSpectralGate over `y` block by block into a preallocated
+    float32 output of the same length; working memory does not depend on
+    the input length.
+    """
+    gate = StreamingSpectralGate(sr, n_fft=n_fft, hop=hop, reduction_db=reduction_db, block_frames=block_frames)
+    y = np.asarray(y, dtype=np.float32)
+    out = np.empty(len(y), dtype=np.float32)
+    step = block_frames * hop
+    pos = 0
+    for i in range(0, len(y), step):
+        o = gate.process(y[i : i + step])
+        out[pos : pos + len(o)] = o
+        pos += len(o)
+    o = gate.flush()
+    out[pos : pos + len(o)] = o
+    return out
+
+
+def spectral_gate_file(input_path: Path, output_path: Path, n_fft: int = 1024, hop: int = 256, reduction_db: float = 12.0, block_frames: int = 256) -> int:
+    """Stream `input_path` (mixed to mono) through the spectral gate into `output_path`.
+
+    Reads and writes one block at a time; returns the number of frames written.
+    """
+    step = block_frames * hop
+    written = 0
+    with sf.SoundFile(str(input_path)) as src:
+        gate = StreamingSpectralGate(src.samplerate, n_fft=n_fft, hop=hop, reduction_db=reduction_db, block_frames=block_frames)
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with sf.SoundFile(str(output_path), "w", samplerate=src.samplerate, channels=1) as dst:
+            for block in src.blocks(blocksize=step, dtype="float32", always_2d=True):
+                o = gate.process(block.mean(axis=1))
+                dst.write(o)
+                written += len(o)
+            o = gate.flush()
+            dst.write(o)
+            written += len(o)
+    return written
+
+
+SCRATCH_ENV = "AUDIOBOT_SCRATCH"  # directory for intermediates (default: /dev/shm when it has room)
+
+
+class ScratchSpace:
+    """Bounded, self-cleaning directory for pipeline intermediates.
+
+    Lives on tmpfs (/dev/shm) when that has at least `max_bytes` free, else in
+    the system temp dir; `$AUDIOBOT_SCRATCH` or `root` override. `reserve()`
+    blocks until the requested bytes fit under `max_bytes` (a job larger than
+    the whole budget runs alone). The directory is removed on `cleanup()`,
+    on leaving the `with` block, or at interpreter exit.
+    """
+
+    def __init__(self, max_bytes: int = 2 << 30, root: Optional[str] = None, prefix: str = "audiobot_") -> None:
+        base = root or os.getenv(SCRATCH_ENV) or self._tmpfs(max_bytes)
+        self.path = Path(tempfile.mkdtemp(prefix=prefix, dir=base))
+        self.max_bytes = int(max_bytes)
+        self._used = 0
+        self._cond = threading.Condition()
+        self._finalizer = weakref.finalize(self, shutil.rmtree, str(self.path), True)
+
+    @staticmethod
+    def _tmpfs(max_bytes: int) -> Optional[str]:
+        d = "/dev/shm"
+        try:
+            if os.path.isdir(d) and os.access(d, os.W_OK) and shutil.disk_usage(d).free >= max_bytes:
+                return d
+        except OSError:
+            pass
+        return None
+
+    def reserve(self, nbytes: int) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self._used == 0 or self._used + nbytes <= self.max_bytes)
+            self._used += nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._cond:
+            self._used = max(0, self._used - nbytes)
+            self._cond.notify_all()
+
+    def cleanup(self) -> None:
+        self._finalizer()
+
+    def __enter__(self) -> "ScratchSpace":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
 
 
 @dataclass
@@ -147,48 +538,186 @@ class PreprocessResult:
     output: Path
     segments_count: int
     temp: Optional[Path] = None
+    segment_map: Optional[SegmentMap] = None
+    timings: Optional[Dict[str, float]] = None
 
 
-def preprocess_file(input_path: Path, output_path: Path, tmpdir: Optional[Path] = None) -> PreprocessResult:
-    """Pipeline: VAD (Silero) → concat speech → Demucs (vocals) → spectral dereverb → write output.
-    """
-    input_path = Path(input_path)
-    output_path = Path(output_path)
-    if tmpdir is None:
-        tmpdir = Path(tempfile.mkdtemp(prefix='preproc_'))
-    tmpdir.mkdir(parents=True, exist_ok=True)
-
-    # Load
+def speech_stage(input_path: Path, speech_wav: Path) -> Tuple[SegmentMap, Dict[str, float]]:
+    """Load → VAD → concat speech → write `speech_wav`; returns the map and stage timings."""
+    t = {}
+    t0 = time.perf_counter()
     y, sr = sf.read(str(input_path), always_2d=False)
     if y.ndim > 1:
         y = y.mean(axis=1)
     y = y.astype(np.float32)
+    t["load"] = time.perf_counter() - t0
 
-    # VAD
+    t0 = time.perf_counter()
     window_ms = 30.0
     hop = int(sr * (window_ms / 1000.0))
     probs = vad_silero(y, sr, window_ms=window_ms)
     segs = segments_from_probs(probs, sr, hop, min_speech=0.2, pad=0.05, threshold=0.5)
-    speech = concat_segments(y, segs)
-    speech_wav = tmpdir / f"{input_path.stem}_speech.wav"
+    t["vad"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    speech, seg_map = concat_segments(y, segs, crossfade=int(0.01 * sr))
     sf.write(str(speech_wav), speech, sr)
+    t["concat"] = time.perf_counter() - t0
+    return seg_map, t
+
+
+def dereverb_stage(src_wav: Path, output_path: Path) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    spectral_gate_file(src_wav, output_path, n_fft=1024, hop=256, reduction_db=12.0)
+    return {"dereverb": time.perf_counter() - t0}
+
+
+def preprocess_file(input_path: Path, output_path: Path, tmpdir: Optional[Path] = None) -> PreprocessResult:
+    """Pipeline: VAD (Silero) → concat speech → Demucs (vocals) → spectral dereverb → write output.
+
+    Intermediates go to `tmpdir` if given (and are kept), else to a
+    ScratchSpace that is removed before returning.
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    scratch = None
+    if tmpdir is None:
+        scratch = ScratchSpace(prefix="preproc_")
+        tmpdir = scratch.path
+    tmpdir.mkdir(parents=True, exist_ok=True)
+    try:
+        speech_wav = tmpdir / f"{input_path.stem}_speech.wav"
+        seg_map, timings = speech_stage(input_path, speech_wav)
+
+        # Demucs vocals
+        t0 = time.perf_counter()
+        vocals_path = demucs_vocals(speech_wav, tmpdir / "demucs")
+        src_wav = vocals_path if vocals_path and vocals_path.exists() else speech_wav
+        timings["separate"] = time.perf_counter() - t0
+
+        # Dereverb, streamed file to file
+        timings.update(dereverb_stage(src_wav, output_path))
+    finally:
+        if scratch is not None:
+            scratch.cleanup()
+    return PreprocessResult(output=output_path, segments_count=len(seg_map), temp=None if scratch else tmpdir, segment_map=seg_map, timings=timings)
+
+
+def _pool_init(threads: int) -> None:
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+
+
+def _scratch_estimate(path: Path) -> int:
+    """Upper bound on a file's intermediates: mono PCM16 speech + two stereo PCM16 stems at 44.1 kHz."""
+    info = sf.info(str(path))
+    seconds = info.frames / float(info.samplerate)
+    return int(seconds * (info.samplerate * 2 + 2 * 2 * 2 * 44100)) + 4096
+
+
+def preprocess_dir(
+    input_dir: Path,
+    output_dir: Path,
+    pattern: str = "*.wav",
+    workers: Optional[int] = None,
+    separate: bool = True,
+    model: str = "htdemucs",
+    scratch_bytes: int = 2 << 30,
+    scratch_root: Optional[str] = None,
+    loader: Optional[str] = None,
+    on_file=None,
+) -> Dict:
+    """Preprocess every file under `input_dir` into `output_dir` (same relative paths).
+
+    VAD/concat and dereverb run in a process pool of `workers`; separation
+    goes through the shared resident separator (`stems.service.get_separator`:
+    the `serve-sep` service if configured, else one local worker). Files
+    are pipelined: while one is being separated, others are in VAD or
+    dereverb. Intermediates live in a ScratchSpace bounded by
+    `scratch_bytes` and are deleted as soon as each file is written.
+    Returns per-file stage timings (load, vad, concat, separate, dereverb)
+    plus totals; `on_file(result)` is called as each file finishes.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    from ..stems.service import get_separator
+
+    input_dir, output_dir = Path(input_dir), Path(output_dir)
+    files = sorted(p for p in input_dir.rglob(pattern) if p.is_file())
+    if not files:
+        return {"ok": False, "files": [], "log": f"no files matching {pattern} in {input_dir}"}
+    workers = max(1, int(workers or max(1, (os.cpu_count() or 2) - 1)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    sep_off = threading.Event()
+    if not separate:
+        sep_off.set()
+    notes: List[str] = []
+    t_start = time.perf_counter()
+
+    sep = None if sep_off.is_set() else get_separator(loader)
+    with ScratchSpace(scratch_bytes, root=scratch_root) as scratch, ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp.get_context("spawn"), initializer=_pool_init, initargs=(threads,)
+    ) as pool:
+
+        def one(src: Path) -> Dict:
+            rel = src.relative_to(input_dir)
+            out = output_dir / rel.with_suffix(".wav")
+            out.parent.mkdir(parents=True, exist_ok=True)
+            work = scratch.path / "__".join(rel.with_suffix("").parts)
+            res: Dict = {"input": str(src), "output": str(out), "ok": False}
+            t0 = time.perf_counter()
+            try:
+                est = _scratch_estimate(src)
+            except Exception as e:
+                res.update(log=f"unreadable: {e}", timings={})
+                return res
+            scratch.reserve(est)
+            timings = {"wait": time.perf_counter() - t0}
+            try:
+                work.mkdir(parents=True, exist_ok=True)
+                speech_wav = work / f"{src.stem}_speech.wav"
+                seg_map, t = pool.submit(speech_stage, src, speech_wav).result()
+                timings.update(t)
+                res["segments"] = len(seg_map)
+                src_wav = speech_wav
+                if sep is not None and not sep_off.is_set():
+                    r = sep.separate(speech_wav, work / "stems", model=model, stems=2, two_stems_target="vocals")
+                    timings["separate"] = r.get("elapsed", 0.0)
+                    if r.get("load_s"):
+                        timings["separate_load"] = r["load_s"]
+                    if r.get("ok"):
+                        src_wav = Path(next(s for s in r["stems"] if Path(s).stem.endswith("_vocals")))
+                    elif not sep_off.is_set():
+                        sep_off.set()
+                        notes.append(f"separation disabled: {r.get('log', '')}")
+                timings.update(pool.submit(dereverb_stage, src_wav, out).result())
+                res["ok"] = True
+            except Exception as e:
+                res["log"] = f"{type(e).__name__}: {e}"
+            finally:
+                shutil.rmtree(work, ignore_errors=True)
+                scratch.release(est)
+            timings["total"] = time.perf_counter() - t0
+            res["timings"] = timings
+            if on_file is not None:
+                on_file(res)
+            return res
 
-    # Demucs vocals
-    demucs_out_base = tmpdir / "demucs"
-    vocals_path = demucs_vocals(speech_wav, demucs_out_base)
-    if vocals_path and vocals_path.exists():
-        v, _ = sf.read(str(vocals_path), always_2d=False)
-        if v.ndim > 1:
-            v = v.mean(axis=1)
-        v = v.astype(np.float32)
-    else:
-        v = speech
-
-    # Dereverb
-    v_d = spectral_gate_dereverb(v, sr, n_fft=1024, hop=256, reduction_db=12.0)
-
-    # Write output
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    sf.write(str(output_path), v_d, sr)
-    return PreprocessResult(output=output_path, segments_count=len(segs), temp=tmpdir)
+        # two file threads per pool worker keep the pool and the separator busy
+        with ThreadPoolExecutor(max_workers=2 * workers) as threads_pool:
+            results = list(threads_pool.map(one, files))
+        scratch_path = str(scratch.path)
 
+    stages: Dict[str, float] = {}
+    for r in results:
+        for k, v in r.get("timings", {}).items():
+            stages[k] = stages.get(k, 0.0) + v
+    ok = sum(1 for r in results if r["ok"])
+    elapsed = time.perf_counter() - t_start
+    log = f"{ok}/{len(results)} files in {elapsed:.1f}s with {workers} workers; scratch {scratch_path}"
+    return {"ok": ok == len(results), "files": results, "stages": stages, "elapsed": elapsed, "workers": workers, "log": "\n".join([log] + notes)}
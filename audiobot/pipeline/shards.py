@@ -0,0 +1,183 @@
+"""Pre-decoded training audio cache.
+
+`compile_shards` decodes every source file once (mono, target sample rate,
+normalized float32) and packs the results into `.npy` shards plus an
+`index.json` of (shard, offset, length) per file. Datasets then read crops as
+zero-copy slices of memory-mapped shards instead of re-decoding and
+re-resampling whole files on every access.
+
+An entry is reused while the source file's mtime and size are unchanged and
+the cache config (sample rate, normalization, version) matches; anything else
+is re-decoded into new shards and unreferenced shards are deleted. A shard
+whose live entries fall below `compact_below` of its samples (because files
+changed or left the dataset) has those entries copied into new shards, so the
+stale audio does not stay on disk indefinitely.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+CACHE_VERSION = 1
+INDEX_NAME = "index.json"
+
+
+@dataclass
+class ShardEntry:
+    path: str
+    mtime_ns: int
+    size: int
+    shard: str
+    offset: int
+    length: int
+
+
+class ShardIndex:
+    def __init__(self, root: Path, config: Dict[str, Any], entries: List[ShardEntry]) -> None:
+        self.root = Path(root)
+        self.config = config
+        self.entries = entries
+        self._maps: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # DataLoader workers re-open their own memory maps
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+    def _map(self, shard: str) -> np.ndarray:
+        m = self._maps.get(shard)
+        if m is None:
+            m = np.load(str(self.root / shard), mmap_mode="r")
+            self._maps[shard] = m
+        return m
+
+    def array(self, i: int) -> np.ndarray:
+        """Read-only view of entry `i`'s samples; nothing is copied until sliced data is used."""
+        e = self.entries[i]
+        return self._map(e.shard)[e.offset : e.offset + e.length]
+
+    def lengths(self) -> np.ndarray:
+        return np.array([e.length for e in self.entries], dtype=np.int64)
+
+
+def _read_index(root: Path) -> Optional[ShardIndex]:
+    p = root / INDEX_NAME
+    if not p.exists():
+        return None
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+        return ShardIndex(root, data["config"], [ShardEntry(**e) for e in data["entries"]])
+    except Exception:
+        return None
+
+
+def _write_index(index: ShardIndex) -> None:
+    tmp = index.root / f"{INDEX_NAME}.{os.getpid()}.tmp"
+    payload = {"config": index.config, "entries": [asdict(e) for e in index.entries]}
+    tmp.write_text(json.dumps(payload), encoding="utf-8")
+    os.replace(tmp, index.root / INDEX_NAME)
+
+
+class _ShardWriter:
+    def __init__(self, root: Path, shard_samples: int) -> None:
+        self.root = root
+        self.shard_samples = max(1, int(shard_samples))
+        self._parts: List[np.ndarray] = []
+        self._fill = 0
+        self._name = self._new_name()
+
+    @staticmethod
+    def _new_name() -> str:
+        return f"shard-{uuid.uuid4().hex[:12]}.npy"
+
+    def add(self, path: Path, mtime_ns: int, size: int, y: np.ndarray) -> ShardEntry:
+        e = ShardEntry(str(path), mtime_ns, size, self._name, self._fill, int(len(y)))
+        self._parts.append(np.ascontiguousarray(y, dtype=np.float32))
+        self._fill += len(y)
+        if self._fill >= self.shard_samples:
+            self.flush()
+        return e
+
+    def flush(self) -> None:
+        if not self._parts:
+            return
+        data = np.concatenate(self._parts)
+        tmp = self.root / f"{self._name}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp, self.root / self._name)
+        self._parts, self._fill = [], 0
+        self._name = self._new_name()
+
+
+def compile_shards(
+    paths: Sequence[Path],
+    cache_dir: Path,
+    load_fn: Callable[[Path], np.ndarray],
+    sample_rate: int,
+    normalize: str = "peak",
+    shard_mb: int = 256,
+    compact_below: float = 0.5,
+) -> ShardIndex:
+    """Build or refresh the shard cache for `paths` (in order) and return its index.
+
+    `load_fn` must return mono float32 audio at `sample_rate` normalized as
+    described by `normalize`; both values are part of the cache key. Reused
+    entries in shards less than `compact_below` live are repacked (copied,
+    not re-decoded); 0 disables compaction.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    config = {"version": CACHE_VERSION, "sample_rate": int(sample_rate), "normalize": normalize}
+    old = _read_index(cache_dir)
+    reuse = {e.path: e for e in old.entries} if old is not None and old.config == config else {}
+
+    writer = _ShardWriter(cache_dir, shard_mb * 1024 * 1024 // 4)
+    entries: List[ShardEntry] = []
+    for p in paths:
+        p = Path(p)
+        st = p.stat()
+        e = reuse.get(str(p))
+        if e is not None and e.mtime_ns == st.st_mtime_ns and e.size == st.st_size:
+            entries.append(e)
+            continue
+        entries.append(writer.add(p, st.st_mtime_ns, st.st_size, load_fn(p)))
+
+    if old is not None and reuse and compact_below > 0:
+        old_shards = {e.shard for e in old.entries}
+        used: Dict[str, int] = {}
+        for e in entries:
+            if e.shard in old_shards:
+                used[e.shard] = used.get(e.shard, 0) + e.length
+        sparse = {sh for sh, n in used.items() if n < compact_below * len(old._map(sh))}
+        for i, e in enumerate(entries):
+            if e.shard in sparse:
+                data = old._map(e.shard)[e.offset : e.offset + e.length]
+                entries[i] = writer.add(Path(e.path), e.mtime_ns, e.size, data)
+    writer.flush()
+    if old is not None:
+        old._maps.clear()  # release maps of shards that may be deleted below
+
+    index = ShardIndex(cache_dir, config, entries)
+    if old is None or old.config != config or old.entries != entries:
+        _write_index(index)
+        live = {e.shard for e in entries}
+        for f in cache_dir.glob("shard-*.npy"):
+            if f.name not in live:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+    return index
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import argparse
+import json
 import os
+import subprocess
+import sys
+import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
@@ -11,33 +15,28 @@ import torch.nn.functional as F
 from torch import optim
 import pytorch_lightning as pl  # type: ignore
 
-from .models import DenoiserNet
-from .datasets import AudioDataset, AudioDataConfig, make_loader
+from .metrics import multires_stft_distance, si_sdr
+from .models import MODEL_SIZES, build_denoiser, resolve_arch
+from .datasets import AudioDataset, AudioDataConfig, ShardAwareSampler, make_loader
 
 
-def _download_gcs_prefix(prefix: str, dst_dir: Path) -> None:
-    from google.cloud import storage  # type: ignore
+def _download_gcs_prefix(prefix: str, dst_dir: Path, workers: int = 8) -> int:
+    """Stage a gs:// prefix locally; returns how many files changed."""
+    from ..sync.gcs import sync_prefix
 
-    assert prefix.startswith("gs://"), "prefix must start with gs://"
-    _, rest = prefix.split("gs://", 1)
-    bucket_name, *key_parts = rest.split("/", 1)
-    key_prefix = key_parts[0] if key_parts else ""
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blobs = client.list_blobs(bucket, prefix=key_prefix)
-    dst_dir.mkdir(parents=True, exist_ok=True)
-    for b in blobs:
-        if b.name.endswith("/"):
-            continue
-        local_path = dst_dir / Path(b.name).name
-        local_path.parent.mkdir(parents=True, exist_ok=True)
-        b.download_to_filename(str(local_path))
+    res = sync_prefix(prefix, dst_dir, workers=workers)
+    print(res["log"])
+    if not res["ok"]:
+        raise RuntimeError(f"failed to stage {len(res['failed'])} objects from {prefix}: {res['failed'][:3]}")
+    return int(res["downloaded"])
 
 
 class LitDenoiser(pl.LightningModule):
-    def __init__(self, lr: float = 1e-3):
+    def __init__(self, lr: float = 1e-3, causal: bool = False, channels: int = 64, n_layers: int = 8, kernel_size: int = 9, size: str = "base"):
         super().__init__()
-        self.model = DenoiserNet()
+        # architecture goes into ckpt["hyper_parameters"] so inference rebuilds the same shape
+        self.save_hyperparameters()
+        self.model = build_denoiser(channels=channels, n_layers=n_layers, kernel_size=kernel_size, causal=causal)
         self.lr = lr
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
@@ -74,6 +73,23 @@ class LitDenoiser(pl.LightningModule):
         self.log_dict({"train_l1": l1, "train_stft": spec, "train_loss": loss}, prog_bar=True)
         return loss
 
+    def validation_step(self, batch, batch_idx: int):
+        noisy, clean = batch
+        noisy = noisy.float()
+        clean = clean.float()
+        pred = self(noisy)
+        loss = F.l1_loss(pred, clean) + 0.2 * self.stft_loss(pred, clean)
+        sdr = si_sdr(pred, clean)
+        sdri = sdr - si_sdr(noisy, clean)
+        mr = multires_stft_distance(pred, clean)
+        self.log_dict(
+            {"val_loss": loss, "val_si_sdr": sdr.mean(), "val_si_sdri": sdri.mean(), "val_mrstft": mr.mean()},
+            prog_bar=True,
+            sync_dist=True,
+            batch_size=noisy.shape[0],
+        )
+        return loss
+
 
 def build_datamodule(
     clean_dir: str,
@@ -82,15 +98,174 @@ def build_datamodule(
     num_workers: int,
     sample_rate: int,
     chunk_seconds: float,
-) -> Tuple[torch.utils.data.DataLoader, torch.utils.data.DataLoader]:
-    cfg = AudioDataConfig(sample_rate=sample_rate, chunk_seconds=chunk_seconds, pair_dirs=(noisy_dir is not None))
-    ds = AudioDataset(clean_dir=clean_dir, noisy_dir=noisy_dir, cfg=cfg)
+    cache_dir: Optional[str] = None,
+    manifest_dir: Optional[str] = None,
+    rebuild_manifest: bool = False,
+    distributed: bool = False,
+    seed: int = 0,
+    val_fraction: float = 0.1,
+) -> Tuple[torch.utils.data.DataLoader, Optional[torch.utils.data.DataLoader]]:
+    """Train loader plus a held-out validation loader (None when `val_fraction` is 0 or no file lands in val)."""
+    def dataset(split: str) -> AudioDataset:
+        cfg = AudioDataConfig(
+            sample_rate=sample_rate, chunk_seconds=chunk_seconds, pair_dirs=(noisy_dir is not None), cache_dir=cache_dir,
+            manifest_dir=manifest_dir, rebuild_manifest=rebuild_manifest and split != "val",
+            split=split, val_fraction=val_fraction, eval_mode=(split == "val"), seed=seed,
+        )
+        return AudioDataset(clean_dir=clean_dir, noisy_dir=noisy_dir, cfg=cfg)
+
+    ds = dataset("train" if val_fraction > 0 else "all")
+    dsv = dataset("val") if val_fraction > 0 else None
+    if dsv is not None and len(dsv) == 0:
+        print(f"[val] no files fall in the {val_fraction:.0%} validation split; training without validation")
+        dsv = None
+    if distributed:
+        # each rank reads its own shards; Lightning must not swap in a DistributedSampler
+        dl = make_loader(ds, batch_size=batch_size, workers=num_workers, sampler=ShardAwareSampler(ds, shuffle=True, seed=seed))
+        dval = make_loader(dsv, batch_size=batch_size, workers=num_workers, sampler=ShardAwareSampler(dsv, shuffle=False)) if dsv is not None else None
+        return dl, dval
     dl = make_loader(ds, batch_size=batch_size, workers=num_workers, shuffle=True)
-    # No separate val for simplicity; use a copy with shuffle=False
-    dval = make_loader(ds, batch_size=batch_size, workers=num_workers, shuffle=False)
+    dval = make_loader(dsv, batch_size=batch_size, workers=num_workers, shuffle=False) if dsv is not None else None
     return dl, dval
 
 
+class ThroughputMonitor(pl.Callback):
+    """Measure training samples/s across all ranks and append it to a JSON scaling log."""
+
+    def __init__(self, batch_size: int, report_path: Path, procs: int, threads: int, warmup_steps: int = 5) -> None:
+        self.batch_size = int(batch_size)
+        self.report_path = Path(report_path)
+        self.procs = int(procs)
+        self.threads = int(threads)
+        self.warmup_steps = int(warmup_steps)
+        self._seen = 0
+        self._steps = 0
+        self._t0: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx) -> None:
+        self._seen += 1
+        if self._seen == self.warmup_steps:
+            self._t0 = time.perf_counter()  # skip worker start-up and first allocations
+        elif self._t0 is not None:
+            self._steps += 1
+
+    def on_train_end(self, trainer, pl_module) -> None:
+        if not trainer.is_global_zero or self._t0 is None or self._steps == 0:
+            return
+        elapsed = time.perf_counter() - self._t0
+        sps = self._steps * self.batch_size * trainer.world_size / elapsed
+        self.result = {
+            "procs": self.procs,
+            "threads_per_proc": self.threads,
+            "world_size": int(trainer.world_size),
+            "batch_size": self.batch_size,
+            "steps": self._steps,
+            "elapsed": elapsed,
+            "samples_per_sec": sps,
+            "samples_per_sec_per_proc": sps / max(1, trainer.world_size),
+            "time": time.time(),
+        }
+        log = _read_scaling(self.report_path)
+        log.append(self.result)
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.report_path.write_text(json.dumps(log, indent=2), encoding="utf-8")
+        print(f"[throughput] procs={self.procs} threads/proc={self.threads}: {sps:.1f} samples/s")
+
+
+def _read_scaling(path: Path) -> List[Dict[str, Any]]:
+    try:
+        return list(json.loads(Path(path).read_text(encoding="utf-8")))
+    except Exception:
+        return []
+
+
+def format_scaling_report(entries: List[Dict[str, Any]]) -> str:
+    """Table of samples/s vs process count; speedup is relative to the smallest run."""
+    if not entries:
+        return "no throughput measurements"
+    rows = sorted(entries, key=lambda e: e["procs"])
+    base = rows[0]
+    lines = ["procs  threads  samples/s  speedup  efficiency"]
+    for e in rows:
+        speedup = e["samples_per_sec"] / base["samples_per_sec"]
+        eff = speedup * max(1, base["procs"]) / max(1, e["procs"])
+        lines.append(f"{e['procs']:>5}  {e['threads_per_proc']:>7}  {e['samples_per_sec']:>9.1f}  {speedup:>6.2f}x  {eff:>9.0%}")
+    return "\n".join(lines)
+
+
+def _benchmark_and_stamp(ckpt_path: Path, onnx_path: Optional[Path], train_ds, val_ds, args: argparse.Namespace) -> None:
+    """Benchmark the exported model (ONNX if written, else the checkpoint) and store the result with both."""
+    from .benchmark import benchmark_model, reference_clip, write_model_meta
+
+    try:
+        clean, noisy, source = reference_clip(val_ds if val_ds is not None else train_ds, args.sample_rate, clip_path=args.bench_clip)
+        target = onnx_path if onnx_path is not None else ckpt_path
+        res = benchmark_model(str(target), clean, noisy, sample_rate=args.sample_rate, chunk_seconds=args.chunk_seconds, batch_size=args.batch_size)
+    except Exception as e:
+        print(f"[bench] skipped: {e}")
+        return
+    res["clip"] = source
+    meta = {"benchmark": res}
+    write_model_meta(str(ckpt_path), meta)
+    if onnx_path is not None:
+        write_model_meta(str(onnx_path), meta)
+    mem = f", peak RSS {res['peak_rss_mb']:.0f} MB" if res.get("peak_rss_mb") is not None else ""
+    print(
+        f"[bench] {res['model']} on {res['seconds']:.0f}s reference ({source}): RTF {res['rtf']:.3f}{mem}, "
+        f"SI-SDR {res['si_sdr']:.2f} dB (+{res['si_sdri']:.2f}), MR-STFT {res['mrstft']:.3f}"
+    )
+
+
+def _auto_threads(procs: int, workers: int) -> int:
+    # leave a core per DataLoader worker; the rest is split across ranks
+    return max(1, (os.cpu_count() or 1) // max(1, procs) - workers)
+
+
+def _arch_arg(v: str) -> int:
+    n = int(v)
+    if n < 0:
+        raise argparse.ArgumentTypeError(f"must be positive (0 keeps the size's value), got {n}")
+    return n
+
+
+def _kernel_arg(v: str) -> int:
+    n = _arch_arg(v)
+    if n and n % 2 == 0:
+        raise argparse.ArgumentTypeError(f"kernel size must be odd, got {n}")
+    return n
+
+
+def _run_scaling_sweep(argv: List[str], procs_list: List[int], steps: int, report: Path) -> int:
+    """Run a short training job per process count in fresh interpreters and print the table."""
+    child = []
+    skip = False
+    for a in argv:
+        if skip:
+            skip = False
+            continue
+        if a in ("--scaling-sweep", "--procs", "--max-steps", "--threads-per-proc"):
+            skip = True
+            continue
+        if a.startswith(("--scaling-sweep=", "--procs=", "--max-steps=", "--threads-per-proc=")):
+            continue
+        child.append(a)
+    start = len(_read_scaling(report))
+    failed = []
+    for n in procs_list:
+        cmd = [sys.executable, "-m", "audiobot.pipeline.train_noise", *child, "--procs", str(n), "--max-steps", str(steps), "--no-bench"]
+        print("[sweep]", " ".join(cmd))
+        rc = subprocess.call(cmd)
+        if rc != 0:
+            print(f"[sweep] procs={n} failed with exit code {rc}")
+            failed.append(n)
+    print(format_scaling_report(_read_scaling(report)[start:]))
+    if failed:
+        print(f"[sweep] {len(failed)} of {len(procs_list)} runs failed (procs={','.join(map(str, failed))})")
+        return 1
+    return 0
+
+
 def main(argv: Optional[list[str]] = None) -> int:
     p = argparse.ArgumentParser(description="Train Denoiser (noisy sibilance/click/pop)")
     p.add_argument("--clean-dir", required=True, help="Local path or gs:// prefix of clean WAVs")
@@ -103,8 +278,43 @@ def main(argv: Optional[list[str]] = None) -> int:
     p.add_argument("--lr", type=float, default=1e-3)
     p.add_argument("--outdir", default="web/outputs/models")
     p.add_argument("--save-onnx", action="store_true")
+    p.add_argument("--causal", action="store_true", help="Train the causal (streaming) variant")
+    p.add_argument("--size", choices=list(MODEL_SIZES), default="base", help="Model size family (see models.MODEL_SIZES)")
+    p.add_argument("--channels", type=_arch_arg, default=0, help="Override the size's conv channels")
+    p.add_argument("--layers", type=_arch_arg, default=0, help="Override the size's residual block count")
+    p.add_argument("--kernel-size", type=_kernel_arg, default=0, help="Override the size's kernel size (odd)")
+    p.add_argument("--cache-dir", default="", help="Decode the dataset once into mmap shards here (reused across runs)")
+    p.add_argument("--manifest-dir", default="", help="Where to cache dataset manifests (default: inside each data dir)")
+    p.add_argument("--rebuild-manifest", action="store_true", help="Rescan data dirs instead of using cached manifests")
+    p.add_argument("--download-workers", type=int, default=8, help="Concurrent downloads when staging gs:// data")
+    p.add_argument("--seed", type=int, default=1234, help="Seed for crops and noise synthesis (per-worker generators)")
+    p.add_argument("--val-fraction", type=float, default=0.1, help="Share of files held out for validation (split by path hash)")
+    p.add_argument("--bench-clip", default="", help="Clean WAV for the end-of-training benchmark (default: 60 s from the val split)")
+    p.add_argument("--no-bench", action="store_true", help="Skip the end-of-training latency/quality benchmark")
+    p.add_argument("--procs", type=int, default=0, help="CPU DDP over gloo with N processes (0: single process, accelerator auto)")
+    p.add_argument("--threads-per-proc", type=int, default=0, help="Torch intra-op threads per process (0: cores / procs - workers)")
+    p.add_argument("--max-steps", type=int, default=-1)
+    p.add_argument("--scaling-sweep", default="", help="Comma-separated process counts, e.g. 1,2,4: run --max-steps per count and report samples/s")
     args = p.parse_args(argv)
+    try:
+        arch = resolve_arch(args.size, args.channels, args.layers, args.kernel_size)
+    except ValueError as e:
+        p.error(str(e))
+
+    report_path = Path(args.outdir) / "scaling.json"
+    if args.scaling_sweep:
+        steps = args.max_steps if args.max_steps > 0 else 50
+        procs_list = [int(x) for x in args.scaling_sweep.split(",") if x.strip()]
+        return _run_scaling_sweep(list(argv if argv is not None else sys.argv[1:]), procs_list, steps, report_path)
 
+    threads = 0
+    if args.procs > 0:
+        threads = args.threads_per_proc or _auto_threads(args.procs, args.workers)
+        # DDP ranks are re-launched with the same argv and inherit this as well
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        torch.set_num_threads(threads)
+
+    pl.seed_everything(args.seed, workers=True)
     clean_dir = args.clean_dir
     noisy_dir = args.noisy_dir or None
 
@@ -112,13 +322,15 @@ def main(argv: Optional[list[str]] = None) -> int:
     work_root = Path(os.environ.get("AUDIOBOT_WORK", "./.work"))
     work_root.mkdir(parents=True, exist_ok=True)
 
+    rebuild_manifest = args.rebuild_manifest
     if clean_dir.startswith("gs://"):
         local_clean = work_root / "clean"
-        _download_gcs_prefix(clean_dir, local_clean)
+        # freshly staged files invalidate the cached dataset manifest
+        rebuild_manifest |= _download_gcs_prefix(clean_dir, local_clean, workers=args.download_workers) > 0
         clean_dir = str(local_clean)
     if noisy_dir and noisy_dir.startswith("gs://"):
         local_noisy = work_root / "noisy"
-        _download_gcs_prefix(noisy_dir, local_noisy)
+        rebuild_manifest |= _download_gcs_prefix(noisy_dir, local_noisy, workers=args.download_workers) > 0
         noisy_dir = str(local_noisy)
 
     train_loader, val_loader = build_datamodule(
@@ -128,22 +340,64 @@ def main(argv: Optional[list[str]] = None) -> int:
         num_workers=args.workers,
         sample_rate=args.sample_rate,
         chunk_seconds=args.chunk_seconds,
+        cache_dir=(args.cache_dir or None),
+        manifest_dir=(args.manifest_dir or None),
+        rebuild_manifest=rebuild_manifest,
+        distributed=args.procs > 1,
+        seed=args.seed,
+        val_fraction=args.val_fraction,
     )
 
-    model = LitDenoiser(lr=args.lr)
+    model = LitDenoiser(lr=args.lr, causal=args.causal, size=args.size, **arch)
     ckpt_dir = Path(args.outdir)
     ckpt_dir.mkdir(parents=True, exist_ok=True)
-    ckpt_cb = pl.callbacks.ModelCheckpoint(dirpath=str(ckpt_dir), save_top_k=1, filename="denoiser-{epoch}-{step}")
-    trainer = pl.Trainer(max_epochs=args.epochs, default_root_dir=str(ckpt_dir), callbacks=[ckpt_cb], accelerator="auto")
+    if val_loader is not None:
+        ckpt_cb = pl.callbacks.ModelCheckpoint(dirpath=str(ckpt_dir), save_top_k=1, monitor="val_loss", mode="min", filename="denoiser-{epoch}-{step}")
+    else:
+        ckpt_cb = pl.callbacks.ModelCheckpoint(dirpath=str(ckpt_dir), save_top_k=1, filename="denoiser-{epoch}-{step}")
+    callbacks: List[pl.Callback] = [ckpt_cb]
+    trainer_kw: Dict[str, Any] = {"accelerator": "auto"}
+    if args.procs > 0:
+        callbacks.append(ThroughputMonitor(args.batch_size, report_path, args.procs, threads))
+        trainer_kw = {"accelerator": "cpu", "devices": args.procs}
+        if args.procs > 1:
+            from pytorch_lightning.strategies import DDPStrategy  # type: ignore
+
+            trainer_kw.update(strategy=DDPStrategy(process_group_backend="gloo"), use_distributed_sampler=False)
+    trainer = pl.Trainer(
+        max_epochs=args.epochs,
+        max_steps=args.max_steps,
+        default_root_dir=str(ckpt_dir),
+        callbacks=callbacks,
+        **trainer_kw,
+    )
     trainer.fit(model, train_loader, val_loader)
 
+    if not trainer.is_global_zero:
+        return 0
+    best = ckpt_cb.best_model_path
+    if best:
+        # export and benchmark the checkpoint that would ship
+        model = LitDenoiser.load_from_checkpoint(best, map_location="cpu")
+    onnx_path: Optional[Path] = None
     if args.save_onnx:
         try:
             onnx_path = ckpt_dir / "denoiser.onnx"
             dummy = torch.randn(1, int(args.sample_rate * args.chunk_seconds))
-            torch.onnx.export(model.model, dummy.unsqueeze(1), str(onnx_path), input_names=["noisy"], output_names=["clean"], opset_version=17)
+            torch.onnx.export(
+                model.model.cpu().eval(),
+                dummy.unsqueeze(1),
+                str(onnx_path),
+                input_names=["noisy"],
+                output_names=["clean"],
+                dynamic_axes={"noisy": {0: "batch"}, "clean": {0: "batch"}},
+                opset_version=17,
+            )
         except Exception:
-            pass
+            onnx_path = None
+
+    if best and not args.no_bench:
+        _benchmark_and_stamp(Path(best), onnx_path, train_loader.dataset, val_loader.dataset if val_loader is not None else None, args)
 
     return 0
 
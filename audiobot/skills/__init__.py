@@ -1,17 +1,51 @@
-from .clean import clean_audio, build_filter_chain
-from .separate import separate_stems
-from .inspect import analyze_audio
-# from .video import download_video, extract_audio
-from .ml_denoise import ml_denoise
-from .transcribe import transcribe_audio
-
-__all__ = [
-    "clean_audio",
-    "build_filter_chain",
-    "separate_stems",
-    "analyze_audio",
-    # "download_video",
-    # "extract_audio",
-    "ml_denoise",
-    "transcribe_audio",
-]
+"""Skill functions, imported from their modules on first access.
+
+`from audiobot.skills import clean_audio` only loads `skills.clean`; the
+Google Cloud and ML modules are imported when one of their names is used.
+"""
+
+import sys
+import types
+from importlib import import_module
+from typing import Any
+
+_LAZY = {
+    "clean_audio": ".clean",
+    "build_filter_chain": ".clean",
+    "separate_stems": ".separate",
+    "analyze_audio": ".inspect",
+    # "download_video": ".video",
+    # "extract_audio": ".video",
+    "ml_denoise": ".ml_denoise",
+    "ml_denoise_batch": ".ml_batch",
+    "select_model": ".ml_registry",
+    "transcribe_audio": ".transcribe",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _SkillsModule(types.ModuleType):
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Importing `skills.ml_denoise` binds the submodule over the function
+        # of the same name; keep the package attribute the function
+        if isinstance(value, types.ModuleType) and _LAZY.get(name) == f".{name}":
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _SkillsModule
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .ml_denoise import (
+    _chunk_starts,
+    _frame_rows,
+    _from_rows,
+    _load_predictor,
+    _overlap_add,
+    _read_audio,
+    _resolve_model_path,
+    _to_rows,
+    _write_audio,
+)
+
+
+@dataclass
+class _FileJob:
+    input_path: Path
+    output_path: Path
+    sr: int
+    n: int
+    rows: int
+    starts: np.ndarray
+    den: np.ndarray  # [rows * frames, chunk] model outputs, filled as batches complete
+    remaining: int
+
+
+def _decode_worker(
+    pairs: List[Tuple[Path, Path]],
+    sample_rate: int,
+    q: "queue.Queue[Optional[Tuple[Path, Path, Optional[np.ndarray], str]]]",
+    stop: threading.Event,
+) -> None:
+    for src, dst in pairs:
+        if stop.is_set():
+            break
+        try:
+            x, _ = _read_audio(src, sample_rate)
+            item = (src, dst, x, "")
+        except Exception as e:
+            item = (src, dst, None, str(e))
+        _put(q, item, stop)
+    _put(q, None, stop)
+
+
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> None:
+    # gives up once the consumer has stopped, so a full queue cannot pin the thread
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def ml_denoise_batch(
+    pairs: Iterable[Tuple[Path, Path]],
+    model_path: str,
+    sample_rate: int = 48000,
+    chunk_seconds: float = 1.0,
+    overlap_seconds: float = 0.1,
+    device: Optional[str] = None,
+    stereo_mode: str = "channels",
+    batch_size: int = 32,
+    prefetch: int = 8,
+    on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+    max_rtf: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Denoise many files with shared fixed-size inference batches.
+
+    A background thread decodes files into a bounded prefetch queue. Chunks
+    from consecutive files (all channels) are packed into batches of
+    `batch_size` rows, so short takes fill the model like one long file
+    would. Each file is reassembled and written as soon as its last chunk
+    comes back; `on_done` is called with that file's result.
+    """
+    t0 = time.perf_counter()
+    pairs = [(Path(a), Path(b)) for a, b in pairs]
+    results: List[Dict[str, Any]] = []
+    try:
+        p = _resolve_model_path(model_path)
+        predict = _load_predictor(p, device=device, max_rtf=max_rtf)
+    except Exception as e:
+        return {"ok": False, "log": str(e), "results": results}
+
+    chunk = max(1, int(sample_rate * float(chunk_seconds)))
+    overlap = max(0, int(sample_rate * float(overlap_seconds)))
+    hop = max(1, chunk - overlap)
+    win = np.hanning(chunk).astype(np.float32)
+    flat_win = np.ones(chunk, dtype=np.float32)
+    batch_size = max(1, int(batch_size))
+    batch = np.zeros((batch_size, chunk), dtype=np.float32)
+    slots: List[Tuple[_FileJob, int]] = []
+    stats = {"batches": 0, "rows": 0, "audio_seconds": 0.0}
+
+    def finish(job: _FileJob, err: str = "") -> None:
+        res: Dict[str, Any] = {"input": str(job.input_path), "output": None, "ok": False, "log": err}
+        if not err:
+            try:
+                frames = job.den.reshape(job.rows, len(job.starts), chunk)
+                w = flat_win if len(job.starts) == 1 else win
+                y = _from_rows(_overlap_add(frames, job.starts, job.n, w), stereo_mode)
+                _write_audio(job.output_path, y, job.sr)
+                res.update(ok=True, output=str(job.output_path))
+            except Exception as e:
+                res["log"] = str(e)
+        results.append(res)
+        if on_done is not None:
+            on_done(res)
+
+    def flush() -> None:
+        if not slots:
+            return
+        y = predict(batch[: len(slots)])
+        stats["batches"] += 1
+        stats["rows"] += len(slots)
+        for k, (job, j) in enumerate(slots):
+            job.den[j] = y[k]
+            job.remaining -= 1
+            if job.remaining == 0:
+                finish(job)
+        slots.clear()
+
+    q: "queue.Queue[Optional[Tuple[Path, Path, Optional[np.ndarray], str]]]" = queue.Queue(maxsize=max(1, int(prefetch)))
+    stop = threading.Event()
+    reader = threading.Thread(target=_decode_worker, args=(pairs, sample_rate, q, stop), daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            src, dst, x, err = item
+            if x is None or x.shape[1] == 0:
+                results.append({"input": str(src), "output": None, "ok": False, "log": err or "empty audio"})
+                if on_done is not None:
+                    on_done(results[-1])
+                continue
+            rows = _to_rows(x, stereo_mode)
+            starts = _chunk_starts(rows.shape[1], hop)
+            frames = _frame_rows(rows, starts, chunk).reshape(-1, chunk)
+            job = _FileJob(src, dst, sample_rate, rows.shape[1], rows.shape[0], starts, np.empty_like(frames), len(frames))
+            stats["audio_seconds"] += rows.shape[1] / float(sample_rate)
+            for j in range(len(frames)):
+                batch[len(slots)] = frames[j]
+                slots.append((job, j))
+                if len(slots) == batch_size:
+                    flush()
+        flush()
+    except Exception as e:
+        return {"ok": False, "log": str(e), "results": results}
+    finally:
+        stop.set()
+        while True:  # release prefetched audio and unblock a pending put
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        reader.join(timeout=5)
+
+    elapsed = time.perf_counter() - t0
+    failed = sum(1 for r in results if not r["ok"])
+    audio_s = float(stats["audio_seconds"])
+    return {
+        "ok": failed == 0,
+        "files": len(results),
+        "failed": failed,
+        "audio_seconds": audio_s,
+        "elapsed": elapsed,
+        "rtf": (elapsed / audio_s) if audio_s > 0 else None,
+        "batches": int(stats["batches"]),
+        "batch_fill": (stats["rows"] / float(stats["batches"] * batch_size)) if stats["batches"] else 0.0,
+        "results": results,
+        "log": f"{len(results) - failed}/{len(results)} files, {audio_s:.1f}s audio in {elapsed:.1f}s",
+    }
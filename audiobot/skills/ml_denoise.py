@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import json
 import math
+import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import soundfile as sf  # type: ignore
 import librosa  # type: ignore
 
 
+Predictor = Callable[[np.ndarray], np.ndarray]
+
+
 def _maybe_download_gcs(uri: str, dst: Path) -> Path:
     if not uri.startswith("gs://"):
         return Path(uri)
@@ -26,66 +31,341 @@ def _maybe_download_gcs(uri: str, dst: Path) -> Path:
     return dst
 
 
-def _load_torch_model(model_path: Path):
+def _read_checkpoint(model_path: Path) -> Any:
     import torch
-    from ..pipeline.models import DenoiserNet
-
-    model = DenoiserNet()
-    ckpt = torch.load(str(model_path), map_location="cpu")
-    state = ckpt.get("state_dict") if isinstance(ckpt, dict) else None
-    if state:
-        # strip optional 'model.' prefix from LightningModule
-        new_state = {}
-        for k, v in state.items():
-            if k.startswith("model."):
-                new_state[k[len("model."):]] = v
-            else:
-                new_state[k] = v
-        model.load_state_dict(new_state, strict=False)
-    elif isinstance(ckpt, dict):
-        model.load_state_dict(ckpt, strict=False)
-    else:
+
+    return torch.load(str(model_path), map_location="cpu")
+
+
+def _load_torch_model(model_path: Path, causal: bool = False, ckpt: Any = None):
+    """Rebuild the checkpoint's architecture and load its weights strictly (`ckpt`: already loaded)."""
+    import torch
+    from ..pipeline.models import arch_from_state_dict, build_denoiser
+
+    if ckpt is None:
+        ckpt = _read_checkpoint(model_path)
+    if not isinstance(ckpt, dict):
         raise RuntimeError("Unsupported checkpoint format")
+    hparams = ckpt.get("hyper_parameters") or {}
+    state = ckpt.get("state_dict") or ckpt
+    # strip optional 'model.' prefix from LightningModule; skip metadata entries
+    state = {
+        (k[len("model."):] if k.startswith("model.") else k): v
+        for k, v in state.items()
+        if isinstance(v, torch.Tensor)
+    }
+    if "inp.weight" not in state:
+        raise RuntimeError(f"{model_path.name} does not contain denoiser weights")
+    arch = arch_from_state_dict(state)
+    for k in arch:
+        if hparams.get(k):
+            arch[k] = int(hparams[k])
+    # Causal and non-causal nets share parameter names, so the weights alone cannot tell them
+    # apart; the training hparams are the only record of which padding the net was trained with
+    if causal and not hparams.get("causal"):
+        raise RuntimeError(f"{model_path.name} is not a causal checkpoint (train with --causal)")
+    model = build_denoiser(causal=bool(causal or hparams.get("causal")), **arch)
+    try:
+        model.load_state_dict(state, strict=True)
+    except RuntimeError as e:
+        raise RuntimeError(f"{model_path.name}: weights do not match {arch}: {e}") from None
     model.eval()
     return model
 
 
-def _infer_torch(model, audio: np.ndarray, sample_rate: int, chunk_seconds: float, overlap_seconds: float, device: Optional[str] = None) -> np.ndarray:
+def _torch_predictor(model, device: Optional[str] = None) -> Predictor:
     import torch
 
     device = device or ("cuda" if torch.cuda.is_available() else "cpu")
     model = model.to(device)
-    n = len(audio)
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        # x: [B, T] float32 -> [B, T]
+        with torch.inference_mode():
+            t = torch.from_numpy(np.ascontiguousarray(x, dtype=np.float32)).to(device)
+            return model(t).cpu().numpy().astype(np.float32)
+
+    return predict
+
+
+def _onnx_predictor(sess) -> Predictor:
+    name = sess.get_inputs()[0].name
+    batched = [True]
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if batched[0]:
+            try:
+                return sess.run(None, {name: x[:, None, :]})[0].reshape(len(x), -1).astype(np.float32)
+            except Exception:
+                # exported with a static batch of 1; fall back to row-by-row
+                batched[0] = False
+        rows = [sess.run(None, {name: r[None, None, :]})[0].reshape(-1) for r in x]
+        return np.stack(rows).astype(np.float32)
+
+    return predict
+
+
+def _load_predictor(model_path: Path, device: Optional[str] = None, max_rtf: Optional[float] = None) -> Predictor:
+    """Build a batched [B, T] -> [B, T] inference callable for a Torch or ONNX model.
+
+    With `max_rtf` the latency budget is checked first (see
+    `_check_latency_budget`), from the same loaded checkpoint.
+    """
+    suffix = model_path.suffix.lower()
+    if suffix in {".pt", ".pth", ".ckpt"}:
+        ckpt = _read_checkpoint(model_path)
+        _check_latency_budget(model_path, max_rtf, ckpt)
+        return _torch_predictor(_load_torch_model(model_path, ckpt=ckpt), device=device)
+    _check_latency_budget(model_path, max_rtf)
+    if suffix == ".onnx":
+        try:
+            import onnxruntime as ort  # type: ignore
+        except Exception:
+            raise RuntimeError("onnxruntime not installed; cannot run ONNX model")
+        sess = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])  # simple CPU infer
+        return _onnx_predictor(sess)
+    raise RuntimeError(f"Unsupported model extension: {model_path.suffix}")
+
+
+def model_meta(model_path: Path, ckpt: Any = None) -> Dict[str, Any]:
+    """Metadata written by train_noise (see pipeline/benchmark.py); {} if none."""
+    p = Path(model_path)
+    if p.suffix.lower() == ".onnx":
+        side = p.with_name(p.name + ".json")
+        try:
+            return json.loads(side.read_text(encoding="utf-8")) if side.exists() else {}
+        except Exception:
+            return {}
+    if ckpt is None:
+        ckpt = _read_checkpoint(p)
+    meta = ckpt.get("audiobot") if isinstance(ckpt, dict) else None
+    return meta if isinstance(meta, dict) else {}
+
+
+def _check_latency_budget(model_path: Path, max_rtf: Optional[float], ckpt: Any = None) -> None:
+    """Raise unless the model's recorded benchmark RTF is within `max_rtf`."""
+    if max_rtf is None:
+        return
+    bench = model_meta(model_path, ckpt).get("benchmark") or {}
+    rtf = bench.get("rtf")
+    if rtf is None:
+        raise RuntimeError(f"{model_path.name} has no benchmark metadata; cannot check max_rtf={max_rtf} (re-run train-noise to benchmark it)")
+    if float(rtf) > float(max_rtf):
+        raise RuntimeError(f"{model_path.name} misses the latency budget: RTF {float(rtf):.3f} > {float(max_rtf):.3f} on the 60 s reference clip")
+
+
+def _resolve_model_path(model_path: str) -> Path:
+    if model_path == "auto" or model_path.startswith("auto:"):
+        from .ml_registry import resolve_auto
+
+        return resolve_auto(model_path)
+    if model_path.startswith("gs://"):
+        return _maybe_download_gcs(model_path, Path(".work") / "models" / Path(model_path).name)
+    return Path(model_path)
+
+
+def _read_audio(input_path: Path, sample_rate: int) -> Tuple[np.ndarray, int]:
+    """Read a file as float32 [channels, samples] at `sample_rate`, peak-normalized across channels."""
+    x, sr = sf.read(str(input_path), always_2d=True)
+    x = np.ascontiguousarray(x.T, dtype=np.float32)
+    if sr != sample_rate:
+        x = librosa.resample(x, orig_sr=sr, target_sr=sample_rate, res_type="kaiser_best").astype(np.float32)
+        sr = sample_rate
+    peak = float(np.max(np.abs(x)) + 1e-12) if x.size else 0.0
+    if peak > 0:
+        x = x / peak
+    return x, sr
+
+
+def _write_audio(output_path: Path, y: np.ndarray, sr: int) -> None:
+    y = np.clip(y, -1.0, 1.0)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    sf.write(str(output_path), y[0] if y.shape[0] == 1 else y.T, sr, subtype="PCM_24")
+
+
+def _to_rows(x: np.ndarray, stereo_mode: str) -> np.ndarray:
+    # channels -> model rows; mid/side only applies to stereo input
+    if stereo_mode == "mid_side" and x.shape[0] == 2:
+        return np.stack([(x[0] + x[1]) * 0.5, (x[0] - x[1]) * 0.5])
+    return x
+
+
+def _from_rows(rows: np.ndarray, stereo_mode: str) -> np.ndarray:
+    if stereo_mode == "mid_side" and rows.shape[0] == 2:
+        return np.stack([rows[0] + rows[1], rows[0] - rows[1]])
+    return rows
+
+
+def _chunk_starts(n: int, hop: int) -> np.ndarray:
+    return np.arange(0, n, hop, dtype=np.int64)
+
+
+def _frame_rows(rows: np.ndarray, starts: np.ndarray, chunk: int) -> np.ndarray:
+    """Cut [R, n] rows into zero-padded frames [R, F, chunk]."""
+    n = rows.shape[1]
+    pad = max(0, int(starts[-1]) + chunk - n)
+    xp = np.pad(rows, ((0, 0), (0, pad)))
+    idx = starts[:, None] + np.arange(chunk)[None, :]
+    return xp[:, idx]
+
+
+def _overlap_add(frames: np.ndarray, starts: np.ndarray, n: int, win: np.ndarray) -> np.ndarray:
+    """Windowed overlap-add of [R, F, chunk] frames back to [R, n]."""
+    rows, _, chunk = frames.shape
+    total = int(starts[-1]) + chunk
+    out = np.zeros((rows, total), dtype=np.float32)
+    wsum = np.zeros(total, dtype=np.float32)
+    for f, s in enumerate(starts):
+        out[:, s : s + chunk] += frames[:, f] * win
+        wsum[s : s + chunk] += win
+    return out[:, :n] / np.maximum(wsum[:n], 1e-6)
+
+
+def _run_batches(predict: Predictor, frames: np.ndarray, batch_size: int) -> np.ndarray:
+    out = np.empty_like(frames)
+    step = max(1, int(batch_size))
+    for i in range(0, len(frames), step):
+        out[i : i + step] = predict(frames[i : i + step])
+    return out
+
+
+def _infer(
+    predict: Predictor,
+    rows: np.ndarray,
+    sample_rate: int,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    batch_size: int = 16,
+) -> np.ndarray:
+    """Chunked inference over [R, n] rows; every row's chunks share the same batches."""
+    r, n = rows.shape
     chunk = max(1, int(sample_rate * float(chunk_seconds)))
     overlap = max(0, int(sample_rate * float(overlap_seconds)))
     hop = max(1, chunk - overlap)
     if chunk >= n:
-        x = torch.from_numpy(audio).float().unsqueeze(0).to(device)
-        with torch.no_grad():
-            y = model(x).squeeze(0).cpu().numpy()
-        return y
-    out = np.zeros(n, dtype=np.float32)
-    wsum = np.zeros(n, dtype=np.float32)
+        return predict(rows)
+    starts = _chunk_starts(n, hop)
+    frames = _frame_rows(rows, starts, chunk)  # [R, F, chunk]
+    flat = frames.reshape(r * len(starts), chunk)
+    den = _run_batches(predict, flat, batch_size).reshape(frames.shape)
     win = np.hanning(chunk).astype(np.float32)
-    i = 0
-    while i < n:
-        seg = audio[i : min(n, i + chunk)]
-        if len(seg) < chunk:
-            seg = np.pad(seg, (0, chunk - len(seg)))
-            w = win.copy()
-            w[len(audio) - i :] = 0.0
+    return _overlap_add(den, starts, n, win)
+
+
+def _active_regions(mono: np.ndarray, sr: int, backend: str, pad: float) -> List[Tuple[int, int]]:
+    from ..pipeline.preprocess import segments_from_probs, vad_energy, vad_silero
+
+    window_ms = 30.0
+    hop = int(sr * (window_ms / 1000.0))
+    if backend == "silero":
+        probs = vad_silero(mono, sr, window_ms=window_ms)
+    else:
+        probs = vad_energy(mono, sr, window_ms=window_ms)
+    n = len(mono)
+    segs = segments_from_probs(probs, sr, hop, min_speech=0.0, pad=pad, threshold=0.5)
+    return [(s, min(e, n)) for s, e in segs if s < n]
+
+
+def _merge_regions(regions: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for s, e in sorted(regions):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
         else:
-            w = win
-        x = torch.from_numpy(seg).float().unsqueeze(0).to(device)
-        with torch.no_grad():
-            y = model(x).squeeze(0).cpu().numpy().astype(np.float32)
-        L = min(chunk, n - i)
-        out[i : i + L] += y[:L] * w[:L]
-        wsum[i : i + L] += w[:L]
-        i += hop
-    wsum = np.maximum(wsum, 1e-6)
-    out = out / wsum
-    return out
+            merged.append((s, e))
+    return merged
+
+
+def _gate_mask(n: int, segs: List[Tuple[int, int]], fade: int) -> np.ndarray:
+    """1 inside active segments, 0 in silence, raised-cosine ramps of `fade` samples outside each edge."""
+    m = np.zeros(n, dtype=np.float32)
+    ramp = (np.sin(0.5 * np.pi * np.arange(1, fade + 1) / (fade + 1)) ** 2).astype(np.float32)
+    for s, e in segs:
+        m[s:e] = 1.0
+        if fade > 0:
+            a = max(0, s - fade)
+            m[a:s] = np.maximum(m[a:s], ramp[fade - (s - a) :])
+            b = min(n, e + fade)
+            m[e:b] = np.maximum(m[e:b], ramp[::-1][: b - e])
+    return m
+
+
+def _infer_gated(
+    predict: Predictor,
+    rows: np.ndarray,
+    mono: np.ndarray,
+    sample_rate: int,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    batch_size: int = 16,
+    backend: str = "energy",
+    pad: float = 0.15,
+    atten_db: float = 24.0,
+    crossfade_ms: float = 20.0,
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Run the model only over VAD-active regions; attenuate the silence in between.
+
+    Active regions are widened by the crossfade length, their chunks share
+    the same inference batches, and the denoised and attenuated signals are
+    blended with complementary raised-cosine gains at every boundary.
+    """
+    r, n = rows.shape
+    chunk = max(1, int(sample_rate * float(chunk_seconds)))
+    overlap = max(0, int(sample_rate * float(overlap_seconds)))
+    hop = max(1, chunk - overlap)
+    fade = max(0, int(sample_rate * crossfade_ms / 1000.0))
+
+    t0 = time.perf_counter()
+    segs = _active_regions(mono, sample_rate, backend, pad)
+    mask = _gate_mask(n, segs, fade)
+    regions = _merge_regions([(max(0, s - fade), min(n, e + fade)) for s, e in segs])
+    t_vad = time.perf_counter() - t0
+
+    out = rows * np.float32(10 ** (-atten_db / 20.0))
+    plans = []
+    flats = []
+    for a, b in regions:
+        starts = _chunk_starts(b - a, hop)
+        fr = _frame_rows(rows[:, a:b], starts, chunk)
+        plans.append((a, b, starts, fr.shape))
+        flats.append(fr.reshape(-1, chunk))
+    frames_run = int(sum(len(f) for f in flats))
+    frames_full = r * len(_chunk_starts(n, hop))
+    # Nothing to skip (e.g. continuous speech): the gate would only add frames at region edges
+    gated = frames_run < frames_full
+    t1 = time.perf_counter()
+    if not gated:
+        out = _infer(predict, rows, sample_rate, chunk_seconds, overlap_seconds, batch_size=batch_size)
+        frames_run, regions = frames_full, [(0, n)]
+    elif flats:
+        den_all = _run_batches(predict, np.concatenate(flats), batch_size)
+        win = np.hanning(chunk).astype(np.float32)
+        off = 0
+        for a, b, starts, shape in plans:
+            k = shape[0] * shape[1]
+            w = np.ones(chunk, dtype=np.float32) if len(starts) == 1 else win
+            den = _overlap_add(den_all[off : off + k].reshape(shape), starts, b - a, w)
+            off += k
+            m = mask[a:b]
+            out[:, a:b] = m * den + (1.0 - m) * out[:, a:b]
+    t_model = time.perf_counter() - t1
+
+    active = sum(b - a for a, b in regions)
+    # Not measured: the ungated pass is never run, so its model time is
+    # extrapolated from the per-frame cost, and the VAD pass counts against the gate
+    est_full = t_model * frames_full / frames_run if frames_run else t_model
+    stats = {
+        "gated": gated,
+        "skipped": 1.0 - active / float(n) if n else 0.0,
+        "regions": len(regions),
+        "frames_run": frames_run,
+        "frames_full": frames_full,
+        "vad_seconds": t_vad,
+        "model_seconds": t_model,
+        "est_speedup": est_full / max(t_vad + t_model, 1e-9) if frames_run else float(frames_full),
+    }
+    return out, stats
 
 
 def ml_denoise(
@@ -96,73 +376,59 @@ def ml_denoise(
     chunk_seconds: float = 1.0,
     overlap_seconds: float = 0.1,
     device: Optional[str] = None,
+    stereo_mode: str = "channels",
+    batch_size: int = 16,
+    vad_gate: bool = False,
+    vad_backend: str = "energy",
+    vad_pad: float = 0.15,
+    silence_atten_db: float = 24.0,
+    crossfade_ms: float = 20.0,
+    max_rtf: Optional[float] = None,
 ) -> Dict[str, Any]:
     """Run ML denoiser (PyTorch checkpoint or ONNX) on an input WAV.
 
     If `model_path` starts with gs://, downloads to .work/models first.
+    Each channel (or mid/side with `stereo_mode="mid_side"`) is denoised as a
+    separate row of the same inference batches and the output keeps the
+    input channel layout. With `vad_gate`, an energy (or Silero) VAD pass
+    restricts the model to active regions and silence is attenuated by
+    `silence_atten_db`; the result reports the share skipped and an estimated
+    speedup (VAD time included; the ungated pass is extrapolated, not run).
+    With `max_rtf`, models whose recorded benchmark realtime factor is above
+    the budget (or that were never benchmarked) are refused.
     """
     try:
-        mp = model_path
-        if model_path.startswith("gs://"):
-            mp = str(_maybe_download_gcs(model_path, Path(".work") / "models" / Path(model_path).name))
-        p = Path(mp)
-        x, sr = sf.read(str(input_path), always_2d=False)
-        if x.ndim == 2:
-            x = x.mean(axis=1)
-        if sr != sample_rate:
-            x = librosa.resample(x, sr, sample_rate, res_type="kaiser_best")
-            sr = sample_rate
-        x = x.astype(np.float32)
-        peak = float(np.max(np.abs(x)) + 1e-12)
-        if peak > 0:
-            x = x / peak
-
-        if p.suffix.lower() in {".pt", ".pth", ".ckpt"}:
-            model = _load_torch_model(p)
-            y = _infer_torch(model, x, sr, chunk_seconds, overlap_seconds, device=device)
-        elif p.suffix.lower() == ".onnx":
-            try:
-                import onnxruntime as ort  # type: ignore
-            except Exception:
-                return {"ok": False, "log": "onnxruntime not installed; cannot run ONNX model"}
-            sess = ort.InferenceSession(str(p), providers=["CPUExecutionProvider"])  # simple CPU infer
-            # frame-based similar to torch path for consistency
-            chunk = max(1, int(sr * float(chunk_seconds)))
-            overlap = max(0, int(sr * float(overlap_seconds)))
-            hop = max(1, chunk - overlap)
-            n = len(x)
-            if chunk >= n:
-                y = sess.run(None, {sess.get_inputs()[0].name: x.astype(np.float32)[None, None, :]})[0].squeeze()
-            else:
-                out = np.zeros(n, dtype=np.float32)
-                wsum = np.zeros(n, dtype=np.float32)
-                win = np.hanning(chunk).astype(np.float32)
-                i = 0
-                while i < n:
-                    seg = x[i : min(n, i + chunk)]
-                    if len(seg) < chunk:
-                        seg = np.pad(seg, (0, chunk - len(seg)))
-                        w = win.copy()
-                        w[len(x) - i :] = 0.0
-                    else:
-                        w = win
-                    pred = sess.run(None, {sess.get_inputs()[0].name: seg.astype(np.float32)[None, None, :]})[0].squeeze().astype(np.float32)
-                    L = min(chunk, n - i)
-                    out[i : i + L] += pred[:L] * w[:L]
-                    wsum[i : i + L] += w[:L]
-                    i += hop
-                wsum = np.maximum(wsum, 1e-6)
-                y = out / wsum
-
+        p = _resolve_model_path(model_path)
+        predict = _load_predictor(p, device=device, max_rtf=max_rtf)
+        x, sr = _read_audio(Path(input_path), sample_rate)
+        rows = _to_rows(x, stereo_mode)
+        res: Dict[str, Any] = {"ok": True, "output": str(output_path), "channels": int(x.shape[0])}
+        if vad_gate:
+            y, stats = _infer_gated(
+                predict,
+                rows,
+                x.mean(axis=0),
+                sr,
+                chunk_seconds,
+                overlap_seconds,
+                batch_size=batch_size,
+                backend=vad_backend,
+                pad=vad_pad,
+                atten_db=silence_atten_db,
+                crossfade_ms=crossfade_ms,
+            )
+            res["vad"] = stats
+            res["log"] = (
+                f"VAD gate: skipped {100.0 * stats['skipped']:.0f}% of audio, "
+                f"est. {stats['est_speedup']:.2f}x vs. an ungated pass (VAD time included)"
+            )
+            if not stats["gated"]:
+                res["log"] += "; no silence to skip, ran the full pass"
+            elif stats["est_speedup"] < 1.0:
+                res["log"] += "; warning: the VAD pass cost more than it saved, run without the gate for this material"
         else:
-            return {"ok": False, "log": f"Unsupported model extension: {p.suffix}"}
-
-        # duplicate mono to stereo for compatibility
-        y = np.clip(y, -1.0, 1.0)
-        y_st = np.stack([y, y], axis=1)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        sf.write(str(output_path), y_st, sr, subtype="PCM_24")
-        return {"ok": True, "output": str(output_path)}
+            y = _infer(predict, rows, sr, chunk_seconds, overlap_seconds, batch_size=batch_size)
+        _write_audio(Path(output_path), _from_rows(y, stereo_mode), sr)
+        return res
     except Exception as e:
         return {"ok": False, "log": str(e)}
-
@@ -0,0 +1,173 @@
+"""Denoiser model registry: pick the largest model that meets a realtime budget.
+
+Torch checkpoints under the model dirs (`web/outputs/models` plus
+`AUDIOBOT_MODEL_DIRS`, os.pathsep-separated) are ranked by parameter count.
+Each candidate's realtime factor is measured on this machine through the
+production inference path and cached in Memory's kv table, keyed by host,
+CPU/thread count and the file's mtime/size, so only new or changed models
+are timed. Discovery results are cached per process under the same file
+version, so repeated selection does not reload every checkpoint.
+
+Anywhere a model path is accepted, `auto:<rtf>` selects through the
+registry, e.g. `auto:0.1` for interactive jobs or `auto:2` for overnight
+batches; plain `auto` uses DEFAULT_RTF.
+"""
+
+from __future__ import annotations
+
+import os
+import platform
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_RTF = 0.5
+FAST_RTF = 0.1
+MODEL_SUFFIXES = {".pt", ".pth", ".ckpt"}
+
+
+@dataclass
+class ModelInfo:
+    path: Path
+    params: int
+    arch: Dict[str, int]
+    causal: bool
+
+
+def model_dirs() -> List[Path]:
+    dirs = [Path("web") / "outputs" / "models"]
+    dirs += [Path(d) for d in os.getenv("AUDIOBOT_MODEL_DIRS", "").split(os.pathsep) if d]
+    return dirs
+
+
+# (resolved path, mtime_ns, size) -> ModelInfo, or None for files that do not load
+_INFO: Dict[Tuple[str, int, int], Optional[ModelInfo]] = {}
+
+
+def _inspect(p: Path) -> Optional[ModelInfo]:
+    from .ml_denoise import _load_torch_model
+
+    try:
+        m = _load_torch_model(p)
+    except Exception:
+        return None
+    arch = {"channels": int(m.inp.out_channels), "n_layers": len(m.blocks), "kernel_size": int(m.inp.kernel_size[0])}
+    return ModelInfo(p, sum(int(t.numel()) for t in m.parameters()), arch, hasattr(m, "forward_stream"))
+
+
+def discover(dirs: Optional[List[Path]] = None) -> List[ModelInfo]:
+    """Loadable Torch denoiser checkpoints, largest first."""
+    out: List[ModelInfo] = []
+    seen = set()
+    for d in dirs if dirs is not None else model_dirs():
+        if not Path(d).is_dir():
+            continue
+        for p in sorted(Path(d).rglob("*")):
+            if p.suffix.lower() not in MODEL_SUFFIXES:
+                continue
+            try:
+                real = p.resolve()
+                st = real.stat()
+            except OSError:
+                continue
+            if real in seen:
+                continue
+            seen.add(real)
+            key = (str(real), st.st_mtime_ns, st.st_size)
+            if key not in _INFO:
+                _INFO[key] = _inspect(p)
+            info = _INFO[key]
+            if info is not None:
+                out.append(ModelInfo(p, info.params, dict(info.arch), info.causal))
+    out.sort(key=lambda i: i.params, reverse=True)
+    return out
+
+
+def _machine_key() -> str:
+    import torch
+
+    return f"{platform.node()}|{platform.machine()}|cpu{os.cpu_count()}|t{torch.get_num_threads()}"
+
+
+def measure_rtf(
+    model_path: Path,
+    sample_rate: int = 48000,
+    seconds: float = 10.0,
+    chunk_seconds: float = 1.0,
+    overlap_seconds: float = 0.1,
+    batch_size: int = 16,
+    device: Optional[str] = "cpu",
+) -> float:
+    """Seconds of compute per second of audio for `model_path` on this machine."""
+    from .ml_denoise import _infer, _load_predictor
+
+    predict = _load_predictor(Path(model_path), device=device)
+    rng = np.random.default_rng(0)
+    x = (0.1 * rng.standard_normal((1, int(sample_rate * seconds)))).astype(np.float32)
+    _infer(predict, x[:, :sample_rate], sample_rate, chunk_seconds, overlap_seconds, batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    _infer(predict, x, sample_rate, chunk_seconds, overlap_seconds, batch_size=batch_size)
+    return (time.perf_counter() - t0) / seconds
+
+
+def machine_rtf(info: ModelInfo, memory=None, refresh: bool = False, **bench: Any) -> float:
+    """Cached `measure_rtf` for this host and model file version."""
+    if memory is None:
+        from ..memory import Memory
+
+        memory = Memory()
+    st = info.path.stat()
+    opts = ",".join(f"{k}={bench[k]}" for k in sorted(bench))
+    key = f"ml_rtf|{_machine_key()}|{info.path.resolve()}|{st.st_mtime_ns}|{st.st_size}|{opts}"
+    if not refresh:
+        cached = memory.kv_get(key)
+        if cached is not None:
+            return float(cached)
+    rtf = measure_rtf(info.path, **bench)
+    memory.kv_set(key, rtf)
+    return rtf
+
+
+def select_model(
+    max_rtf: float = DEFAULT_RTF,
+    dirs: Optional[List[Path]] = None,
+    causal: Optional[bool] = None,
+    memory=None,
+    **bench: Any,
+) -> Dict[str, Any]:
+    """Largest model whose measured RTF on this machine is <= `max_rtf`.
+
+    Candidates are tried from largest to smallest, so only models down to the
+    first that fits are ever timed.
+    """
+    cands = [i for i in discover(dirs) if causal is None or i.causal == causal]
+    if not cands:
+        return {"ok": False, "log": f"no denoiser checkpoints found in {', '.join(str(d) for d in (dirs or model_dirs()))}"}
+    tried = []
+    for info in cands:
+        rtf = machine_rtf(info, memory=memory, **bench)
+        tried.append({"path": str(info.path), "params": info.params, "rtf": rtf})
+        if rtf <= max_rtf:
+            return {
+                "ok": True,
+                "path": str(info.path),
+                "params": info.params,
+                "arch": info.arch,
+                "rtf": rtf,
+                "tried": tried,
+                "log": f"selected {info.path.name} ({info.params / 1e3:.0f}k params, RTF {rtf:.3f} <= {max_rtf})",
+            }
+    return {"ok": False, "tried": tried, "log": f"no model meets RTF <= {max_rtf} on this machine (fastest: {tried[-1]['rtf']:.3f})"}
+
+
+def resolve_auto(spec: str) -> Path:
+    """Resolve `auto` / `auto:<rtf>` to a model path, or raise."""
+    _, _, budget = spec.partition(":")
+    res = select_model(float(budget) if budget else DEFAULT_RTF)
+    if not res["ok"]:
+        raise RuntimeError(res["log"])
+    return Path(res["path"])
@@ -0,0 +1,107 @@
+"""Low-latency streaming inference with the causal denoiser.
+
+Latency budget (per connection):
+- Algorithmic latency is exactly one frame (`frame_ms`, 10 ms by default).
+  The causal model has no lookahead; a frame is emitted as soon as its last
+  input sample has arrived.
+- Model history (receptive field) is 249 samples (~5.2 ms at 48 kHz) for the
+  default 64x8 k=9 net. This is past context held in per-layer state, not delay.
+- Anything else (network, client audio buffers, partial frames waiting to be
+  completed) adds on top and is outside the engine.
+
+Per-frame work is one small batch-1 conv stack, so a stream needs a single
+CPU core; `benchmark` measures the realtime factor with torch pinned to one
+intra-op thread.
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+from .ml_denoise import _load_torch_model, _resolve_model_path
+
+
+class StreamingDenoiser:
+    """Frame-by-frame causal denoiser with carried per-layer state."""
+
+    def __init__(self, model, sample_rate: int = 48000, frame_ms: float = 10.0, threads: int = 0) -> None:
+        import torch
+
+        if threads > 0:
+            # process-wide; only pin when the engine owns the process
+            torch.set_num_threads(int(threads))
+        self.model = model.eval()
+        self.sample_rate = int(sample_rate)
+        self.frame_ms = float(frame_ms)
+        self.frame = max(1, int(self.sample_rate * self.frame_ms / 1000.0))
+        self.reset()
+
+    @property
+    def latency_ms(self) -> float:
+        return 1000.0 * self.frame / self.sample_rate
+
+    def reset(self) -> None:
+        self.state = self.model.init_state(1)
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        """Feed mono float32 samples; returns denoised samples for every completed frame."""
+        import torch
+
+        buf = np.concatenate([self._pending, np.asarray(pcm, dtype=np.float32).reshape(-1)])
+        n = (len(buf) // self.frame) * self.frame
+        self._pending = buf[n:]
+        if n == 0:
+            return np.zeros(0, dtype=np.float32)
+        out = np.empty(n, dtype=np.float32)
+        with torch.inference_mode():
+            for i in range(0, n, self.frame):
+                x = torch.from_numpy(buf[i : i + self.frame]).unsqueeze(0)
+                y, self.state = self.model.forward_stream(x, self.state)
+                out[i : i + self.frame] = y.squeeze(0).numpy()
+        return np.clip(out, -1.0, 1.0)
+
+    def benchmark(self, seconds: float = 10.0, threads: int = 1) -> Dict[str, Any]:
+        """Stream `seconds` of noise frame by frame; rtf < 1 means faster than realtime."""
+        import torch
+
+        rng = np.random.default_rng(0)
+        x = (0.1 * rng.standard_normal(int(self.sample_rate * seconds))).astype(np.float32)
+        prev = torch.get_num_threads()
+        torch.set_num_threads(max(1, int(threads)))
+        self.reset()
+        try:
+            t0 = time.perf_counter()
+            for i in range(0, len(x), self.frame):
+                self.process(x[i : i + self.frame])
+            elapsed = time.perf_counter() - t0
+        finally:
+            torch.set_num_threads(prev)
+            self.reset()
+        return {
+            "seconds": seconds,
+            "elapsed": elapsed,
+            "rtf": elapsed / seconds,
+            "threads": max(1, int(threads)),
+            "frame": self.frame,
+            "latency_ms": self.latency_ms,
+        }
+
+
+_MODELS: Dict[str, Any] = {}
+
+
+def load_streaming_denoiser(model_path: str, sample_rate: int = 48000, frame_ms: float = 10.0, threads: int = 0) -> StreamingDenoiser:
+    """Build a streaming engine; the causal model is loaded once per path and shared across engines."""
+    model = _MODELS.get(model_path)
+    if model is None:
+        p = _resolve_model_path(model_path)
+        if p.suffix.lower() not in {".pt", ".pth", ".ckpt"}:
+            raise RuntimeError(f"Streaming needs a Torch checkpoint, got: {Path(model_path).name}")
+        model = _load_torch_model(p, causal=True)
+        _MODELS[model_path] = model
+    return StreamingDenoiser(model, sample_rate=sample_rate, frame_ms=frame_ms, threads=threads)
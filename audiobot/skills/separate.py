@@ -1,7 +1,7 @@
-import shutil
-import subprocess
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
+
+from ..stems.chunked import DEFAULT_OVERLAP, separate_file
 
 
 def separate_stems(
@@ -10,25 +10,25 @@ def separate_stems(
     model: str = "htdemucs",
     stems: int = 4,
     two_stems_target: str = "vocals",
+    jobs: int = 1,
+    segment: Optional[float] = None,
+    overlap: float = DEFAULT_OVERLAP,
+    timeout: Optional[float] = 7200.0,
+    cache: bool = True,
+    memory=None,
 ) -> Dict:
-    cmd = ["demucs", "-n", model, "-o", str(output_base)]
-    if stems == 2:
-        cmd += ["--two-stems", two_stems_target]
-    cmd.append(str(input_path))
-    try:
-        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=7200)
-    except subprocess.TimeoutExpired as e:
-        return {"returncode": 124, "log": (e.output or "") + "\n[timeout] demucs exceeded timeout", "stems": produced}
-    produced = []
-    model_dir = output_base / model
-    folder = model_dir / input_path.stem
-    if folder.exists():
-        for wav in folder.glob("*.wav"):
-            target_name = f"{input_path.stem}_{wav.stem}.wav"
-            target = output_base / target_name
-            try:
-                shutil.copy2(wav, target)
-                produced.append(target.name)
-            except Exception:
-                pass
-    return {"returncode": proc.returncode, "log": proc.stdout, "stems": produced}
+    """Separate `input_path` into `<output_base>/<stem>_<source>.wav` files.
+
+    Runs on the shared separation service/worker, so the model stays loaded
+    between calls; `jobs > 1` or `segment` (seconds) splits long inputs into
+    overlapping chunks separated in parallel (see stems.chunked). Repeat
+    requests for the same audio are served from the stem cache.
+    """
+    res = separate_file(
+        Path(input_path), Path(output_base), model=model, stems=stems, two_stems_target=two_stems_target, jobs=jobs, segment=segment, overlap=overlap, timeout=timeout, cache=cache, memory=memory
+    )
+    produced = [Path(p).name for p in res.get("stems", [])]
+    log = res.get("log", "")
+    if not res.get("ok") and res.get("trace"):
+        log = f"{log}\n{res['trace']}"
+    return {"returncode": 0 if res.get("ok") else 1, "log": log, "stems": produced, "elapsed": res.get("elapsed"), "cached": bool(res.get("cached"))}
@@ -0,0 +1,158 @@
+"""Content-addressed stem cache.
+
+Producers re-upload the same mix while iterating, and each upload used to
+cost a full separation. Results are cached under a key built from a hash of
+the decoded audio (so a re-encode or renamed file still hits), the model,
+the stems mode, the two-stems target and SEPARATOR_VERSION. Stem files are
+stored once per content digest in `<root>/blobs`, shared between entries,
+and indexed in Memory; a hit hardlinks the blobs into the output directory
+(copying only across filesystems). When the blobs exceed `max_bytes`, least
+recently used entries are evicted and unreferenced blobs deleted.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+CACHE_ENV = "AUDIOBOT_STEM_CACHE"  # cache directory (default data/stem_cache)
+CACHE_MB_ENV = "AUDIOBOT_STEM_CACHE_MB"  # size cap (default 10240)
+SEPARATOR_VERSION = "1"  # bump when separation output changes for the same model
+
+
+def separator_version(loader: Optional[str] = None) -> str:
+    ver = SEPARATOR_VERSION
+    try:
+        from importlib.metadata import version
+
+        ver += f"+demucs{version('demucs')}"
+    except Exception:
+        pass
+    return f"{ver}|{loader}" if loader else ver
+
+
+def audio_digest(path: Path, block: int = 1 << 18) -> str:
+    """Hash of the decoded samples (plus rate and channels); raw bytes if undecodable."""
+    h = hashlib.blake2b(digest_size=20)
+    try:
+        import soundfile as sf  # type: ignore
+
+        with sf.SoundFile(str(path)) as f:
+            h.update(f"{f.samplerate}:{f.channels}:".encode())
+            for b in f.blocks(blocksize=block, dtype="float32", always_2d=True):
+                h.update(b.tobytes())
+        return "pcm-" + h.hexdigest()
+    except Exception:
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+        return "raw-" + h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(audio: str, model: str, stems: int, two_stems_target: str, version: str) -> str:
+    target = two_stems_target if int(stems) == 2 else ""
+    return f"{audio}|{model}|{int(stems)}|{target}|{version}"
+
+
+def _tmp_path(dst: Path) -> Path:
+    # unique per process and thread: concurrent jobs may place the same file
+    return dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _place(src: Path, dst: Path) -> None:
+    """Hardlink `src` to `dst` (replacing it), copying only when linking is impossible."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if os.path.samefile(src, dst):
+            return  # already linked by an earlier hit
+    except OSError:
+        pass
+    tmp = _tmp_path(dst)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        # rename() is a no-op when both names already link the same inode
+        tmp.unlink(missing_ok=True)
+
+
+class StemCache:
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None, memory=None) -> None:
+        self.root = Path(root or os.getenv(CACHE_ENV) or Path("data") / "stem_cache")
+        self.blobs = self.root / "blobs"
+        self.max_bytes = int(max_bytes if max_bytes is not None else int(os.getenv(CACHE_MB_ENV, "10240")) << 20)
+        if memory is None:
+            from ..memory import Memory
+
+            memory = Memory()
+        self.memory = memory
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs / digest[:2] / f"{digest}.wav"
+
+    def lookup(self, key: str, input_path: Path, out_dir: Path, name_template: str = "{stem}_{source}.wav") -> Optional[List[str]]:
+        """Place cached stems for `key` into `out_dir`; None on a miss."""
+        files = self.memory.stem_cache_get(key)
+        if not files:
+            return None
+        if not all(self.blob_path(d).is_file() for d in files.values()):
+            self._delete(self.memory.stem_cache_drop([key]))  # blob removed behind our back
+            return None
+        out = []
+        for source, digest in sorted(files.items()):
+            dst = Path(out_dir) / name_template.format(stem=Path(input_path).stem, source=source)
+            try:
+                _place(self.blob_path(digest), dst)
+            except OSError:
+                return None  # e.g. evicted by another process since the check; separate afresh
+            out.append(str(dst))
+        return out
+
+    def store(self, key: str, stems: List[str], params: Dict[str, Any], input_path: Path, name_template: str = "{stem}_{source}.wav") -> None:
+        """Copy freshly separated stems into the blob store and index them under `key`."""
+        prefix, _, suffix = name_template.format(stem=Path(input_path).stem, source="\0").partition("\0")
+        files = {}
+        for p in map(Path, stems):
+            source = p.name[len(prefix) : len(p.name) - len(suffix)] if suffix else p.name[len(prefix) :]
+            digest = file_digest(p)
+            blob = self.blob_path(digest)
+            if not blob.is_file():
+                # a copy, not a link: the output file may be rewritten later
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = _tmp_path(blob)
+                try:
+                    shutil.copyfile(p, tmp)
+                    os.chmod(tmp, 0o444)
+                    os.replace(tmp, blob)
+                except BaseException:
+                    tmp.unlink(missing_ok=True)
+                    raise
+            files[source] = (digest, blob.stat().st_size)
+        self.memory.stem_cache_put(key, files, params)
+        self._delete(self.memory.stem_cache_evict(self.max_bytes))
+
+    def _delete(self, digests: List[str]) -> None:
+        for d in digests:
+            try:
+                self.blob_path(d).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.memory.stem_cache_stats(), "root": str(self.root), "max_bytes": self.max_bytes}
@@ -0,0 +1,264 @@
+"""Chunked multi-process stem separation for long tracks.
+
+One Demucs call on a full-length recording uses a single process and runs far
+slower than realtime on CPU. `separate_chunked` cuts the input into
+overlapping segments, separates them on a process pool (each worker loads the
+model once and runs with `cpu_count // jobs` torch threads) and overlap-adds
+the stems back with linear crossfades. Pools are cached per (loader, jobs), so
+a long-lived process such as the web app loads the models once.
+
+`separate_file` is the entry point used by the CLI and the web app: it
+consults the StemCache (stems.cache), and on a miss runs the plain
+resident-worker call (`jobs == 1`, no `segment`) or the chunked path.
+"""
+
+from __future__ import annotations
+
+import atexit
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .worker import DEFAULT_LOADER, DEFAULT_MODEL, ModelHost, stems_mode, write_stems
+
+
+DEFAULT_SEGMENT = 30.0  # seconds per chunk
+DEFAULT_OVERLAP = 1.0  # seconds shared by neighbouring chunks
+MIN_SEGMENT = 5.0  # shorter requests are raised to this, bounding the chunk count
+
+_HOST: Optional[ModelHost] = None
+_POOLS: Dict[Tuple[str, int], ProcessPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def plan_segments(n: int, sr: int, segment: float = DEFAULT_SEGMENT, overlap: float = DEFAULT_OVERLAP) -> List[Tuple[int, int]]:
+    """[start, end) sample ranges of `segment` seconds overlapping by `overlap`."""
+    seg = max(1, int(segment * sr))
+    ov = min(max(0, int(overlap * sr)), seg // 2)
+    if n <= seg:
+        return [(0, n)]
+    step = seg - ov
+    starts = list(range(0, n - ov, step))
+    if n - starts[-1] < ov + 1 and len(starts) > 1:
+        starts.pop()  # fold a sliver tail into the previous chunk
+    return [(s, min(n, s + seg)) if i < len(starts) - 1 else (s, n) for i, s in enumerate(starts)]
+
+
+def _crossfade_weights(length: int, fade_in: int, fade_out: int) -> np.ndarray:
+    w = np.ones(length, dtype=np.float32)
+    if fade_in:
+        w[:fade_in] = (np.arange(fade_in) + 0.5) / fade_in
+    if fade_out:
+        w[length - fade_out :] = np.minimum(w[length - fade_out :], (np.arange(fade_out)[::-1] + 0.5) / fade_out)
+    return w
+
+
+def _pool_init(loader: str, threads: int) -> None:
+    global _HOST
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+    _HOST = ModelHost(loader)
+
+
+def _separate_chunk(model: str, idx: int, wav: np.ndarray, sr: int) -> Tuple[int, Dict[str, np.ndarray], int, float]:
+    assert _HOST is not None
+    load_s = _HOST.load(model)
+    sources, out_sr = _HOST.models[model](wav, sr)
+    return idx, sources, out_sr, load_s
+
+
+def _pool(loader: str, jobs: int) -> ProcessPoolExecutor:
+    key = (loader, jobs)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            if not _POOLS:
+                atexit.register(close_pools)
+            threads = max(1, (os.cpu_count() or 1) // jobs)
+            _POOLS[key] = ProcessPoolExecutor(max_workers=jobs, mp_context=mp.get_context("spawn"), initializer=_pool_init, initargs=(loader, threads))
+        return _POOLS[key]
+
+
+def _drop_pool(loader: str, jobs: int, pool: ProcessPoolExecutor) -> None:
+    """Forget a broken or stuck pool so the next call starts a fresh one."""
+    with _POOLS_LOCK:
+        if _POOLS.get((loader, jobs)) is pool:
+            del _POOLS[(loader, jobs)]
+    # shutdown() leaves running chunks going; stop the workers they occupy
+    # (Python 3.14 adds ProcessPoolExecutor.terminate_workers for this)
+    for proc in list((getattr(pool, "_processes", None) or {}).values()):
+        try:
+            proc.terminate()
+        except Exception:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def close_pools() -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.shutdown(cancel_futures=True)
+        _POOLS.clear()
+
+
+def separate_chunked(
+    input_path: Path,
+    out_dir: Path,
+    model: str = DEFAULT_MODEL,
+    stems: int = 4,
+    two_stems_target: str = "vocals",
+    name_template: str = "{stem}_{source}.wav",
+    jobs: int = 0,
+    segment: float = DEFAULT_SEGMENT,
+    overlap: float = DEFAULT_OVERLAP,
+    loader: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Separate `input_path` in overlapping chunks across `jobs` processes (0 = all cores).
+
+    `jobs` is capped at the core count and `segment` raised to MIN_SEGMENT:
+    every distinct `jobs` value keeps its own pool of model-loaded workers.
+    """
+    import soundfile as sf  # type: ignore
+
+    t0 = time.perf_counter()
+    cores = os.cpu_count() or 1
+    jobs = min(cores, max(1, int(jobs or cores)))
+    segment = max(float(segment), MIN_SEGMENT)
+    loader = loader or DEFAULT_LOADER
+    pool: Optional[ProcessPoolExecutor] = None
+    try:
+        wav, sr = sf.read(str(input_path), always_2d=True, dtype="float32")
+        wav = np.ascontiguousarray(wav.T)
+        segs = plan_segments(wav.shape[1], sr, segment, overlap)
+        pool = _pool(loader, jobs)
+        futs = [pool.submit(_separate_chunk, model, i, wav[:, s:e], sr) for i, (s, e) in enumerate(segs)]
+        acc: Dict[str, np.ndarray] = {}
+        wsum: Optional[np.ndarray] = None
+        out_sr, load_s = sr, 0.0
+        for fut in as_completed(futs, timeout=timeout):
+            i, sources, out_sr, ls = fut.result()
+            load_s = max(load_s, ls)
+            scale = out_sr / float(sr)
+            n_out = int(round(wav.shape[1] * scale))
+            start = int(round(segs[i][0] * scale))
+            fade_in = int(round((segs[i - 1][1] - segs[i][0]) * scale)) if i > 0 else 0
+            fade_out = int(round((segs[i][1] - segs[i + 1][0]) * scale)) if i + 1 < len(segs) else 0
+            if wsum is None:
+                wsum = np.zeros(n_out, dtype=np.float32)
+            length = min(next(iter(sources.values())).shape[-1], n_out - start)
+            w = _crossfade_weights(length, min(fade_in, length), min(fade_out, length))
+            wsum[start : start + length] += w
+            for name, y in sources.items():
+                if name not in acc:
+                    acc[name] = np.zeros((y.shape[0], n_out), dtype=np.float32)
+                acc[name][:, start : start + length] += y[:, :length] * w
+        assert wsum is not None
+        norm = 1.0 / np.maximum(wsum, 1e-6)
+        for y in acc.values():
+            y *= norm
+        written = write_stems(stems_mode(acc, stems, two_stems_target), out_sr, input_path, out_dir, name_template)
+    except Exception as e:
+        if pool is not None and isinstance(e, (BrokenProcessPool, FutureTimeout)):
+            _drop_pool(loader, jobs, pool)  # a dead worker or abandoned chunks would poison later calls
+        return {"ok": False, "log": f"{type(e).__name__}: {e}", "elapsed": time.perf_counter() - t0}
+    elapsed = time.perf_counter() - t0
+    seconds = wav.shape[1] / float(sr)
+    return {
+        "ok": True,
+        "model": model,
+        "stems": written,
+        "sample_rate": out_sr,
+        "segments": len(segs),
+        "jobs": jobs,
+        "load_s": load_s,
+        "elapsed": elapsed,
+        "log": f"separated with {model} in {len(segs)} chunks on {jobs} processes ({elapsed:.1f}s, {elapsed / max(seconds, 1e-9):.2f}x realtime)",
+    }
+
+
+def _separate_uncached(
+    input_path: Path,
+    out_dir: Path,
+    model: str,
+    stems: int,
+    two_stems_target: str,
+    name_template: str,
+    jobs: int,
+    segment: Optional[float],
+    overlap: float,
+    loader: Optional[str],
+    timeout: Optional[float],
+) -> Dict[str, Any]:
+    if int(jobs or 0) == 1 and not segment:
+        from .service import get_separator
+
+        return get_separator(loader).separate(
+            input_path, out_dir, model=model, stems=stems, two_stems_target=two_stems_target, name_template=name_template, timeout=timeout
+        )
+    return separate_chunked(
+        input_path,
+        out_dir,
+        model=model,
+        stems=stems,
+        two_stems_target=two_stems_target,
+        name_template=name_template,
+        jobs=jobs,
+        segment=segment or DEFAULT_SEGMENT,
+        overlap=overlap,
+        loader=loader,
+        timeout=timeout,
+    )
+
+
+def separate_file(
+    input_path: Path,
+    out_dir: Path,
+    model: str = DEFAULT_MODEL,
+    stems: int = 4,
+    two_stems_target: str = "vocals",
+    name_template: str = "{stem}_{source}.wav",
+    jobs: int = 1,
+    segment: Optional[float] = None,
+    overlap: float = DEFAULT_OVERLAP,
+    loader: Optional[str] = None,
+    timeout: Optional[float] = None,
+    cache: bool = True,
+    memory=None,
+) -> Dict[str, Any]:
+    """Resident single-call separation, or chunked when `jobs > 1` or `segment` is set.
+
+    With `cache`, results are looked up in and added to the StemCache first.
+    """
+    input_path, out_dir = Path(input_path), Path(out_dir)
+    args = (input_path, out_dir, model, stems, two_stems_target, name_template, jobs, segment, overlap, loader, timeout)
+    if not cache:
+        return _separate_uncached(*args)
+    from .cache import StemCache, audio_digest, cache_key, separator_version
+
+    t0 = time.perf_counter()
+    sc = StemCache(memory=memory)
+    key = cache_key(audio_digest(input_path), model, stems, two_stems_target, separator_version(loader))
+    hit = sc.lookup(key, input_path, out_dir, name_template)
+    if hit is not None:
+        elapsed = time.perf_counter() - t0
+        return {"ok": True, "model": model, "stems": hit, "cached": True, "elapsed": elapsed, "log": f"stems from cache ({elapsed * 1000:.0f} ms)"}
+    res = _separate_uncached(*args)
+    if res.get("ok"):
+        try:
+            sc.store(key, res["stems"], {"model": model, "stems": stems, "two_stems_target": two_stems_target, "input": input_path.name}, input_path, name_template)
+        except Exception as e:
+            res["log"] = f"{res.get('log', '')} (not cached: {e})"
+    res["cached"] = False
+    return res
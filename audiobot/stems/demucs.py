@@ -1,31 +1,34 @@
 from __future__ import annotations
 
-import shutil
-import subprocess
 from pathlib import Path
+from typing import Any, Dict, Optional
 
+from .chunked import DEFAULT_OVERLAP, separate_file
+from .worker import DEFAULT_MODEL
 
-def separate_stems(input_wav: str, out_dir: str) -> bool:
-    """
-    Try to run Demucs separation if available. Returns True if succeeded.
-    Prefers CLI call to avoid tight coupling with internal API.
-    """
-    if not shutil.which("python"):
-        return False
-    # Check demucs availability by attempting an import via python -c
-    chk = subprocess.run(["python", "-c", "import demucs"], capture_output=True)
-    if chk.returncode != 0:
-        return False
 
-    Path(out_dir).mkdir(parents=True, exist_ok=True)
-    cmd = [
-        "python",
-        "-m",
-        "demucs.separate",
-        "-o",
-        out_dir,
-        input_wav,
-    ]
-    proc = subprocess.run(cmd)
-    return proc.returncode == 0
+def separate_stems_result(
+    input_wav: str,
+    out_dir: str,
+    model: str = DEFAULT_MODEL,
+    jobs: int = 1,
+    segment: Optional[float] = None,
+    overlap: float = DEFAULT_OVERLAP,
+    cache: bool = True,
+) -> Dict[str, Any]:
+    """Separate into the `demucs` CLI layout: <out_dir>/<model>/<input stem>/<source>.wav."""
+    target = Path(out_dir) / model / Path(input_wav).stem
+    return separate_file(Path(input_wav), target, model=model, name_template="{source}.wav", jobs=jobs, segment=segment, overlap=overlap, cache=cache)
+
 
+def separate_stems(
+    input_wav: str, out_dir: str, model: str = DEFAULT_MODEL, jobs: int = 1, segment: Optional[float] = None, overlap: float = DEFAULT_OVERLAP, cache: bool = True
+) -> bool:
+    """
+    Separate with the shared resident worker (see stems.service), chunked
+    across processes when `jobs > 1` or `segment` is set. Returns True if succeeded.
+    """
+    res = separate_stems_result(input_wav, out_dir, model=model, jobs=jobs, segment=segment, overlap=overlap, cache=cache)
+    if not res.get("ok"):
+        print(res.get("log", ""))
+    return bool(res.get("ok"))
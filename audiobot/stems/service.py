@@ -0,0 +1,249 @@
+"""Resident separation service shared by the CLI, the web app and preprocess.
+
+`audiobot serve-sep` runs a ModelHost behind a multiprocessing.connection
+Listener (TCP on localhost, or a Unix socket path) with an auth key. Requests
+are small dicts:
+
+    {"op": "ping"}                       -> {"ok": True, "models": [...], "loader": ...}
+    {"op": "separate", **separate_request(...)}  -> ModelHost.separate() result
+    {"op": "shutdown"}                   -> {"ok": True}
+
+Connections are served on their own threads; separation itself runs one job
+at a time so only one copy of each model is resident.
+
+`get_separator()` is what callers use: a SeparationClient when
+$AUDIOBOT_SEP_ADDRESS points at a running service, else a process-wide
+SeparationWorker (started on first use, stopped at exit). Both expose the same
+`separate()` signature.
+"""
+
+from __future__ import annotations
+
+import atexit
+import ipaddress
+import os
+import secrets
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .worker import DEFAULT_LOADER, DEFAULT_MODEL, ModelHost, SeparationWorker, separate_request
+
+
+SERVICE_ENV = "AUDIOBOT_SEP_ADDRESS"  # host:port or a Unix socket path
+AUTHKEY_ENV = "AUDIOBOT_SEP_AUTHKEY"
+DEFAULT_ADDRESS = "127.0.0.1:50071"
+KEY_FILE = Path("data") / "sep.key"  # generated key when $AUDIOBOT_SEP_AUTHKEY is unset
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(spec: str) -> Address:
+    host, sep, port = spec.rpartition(":")
+    if sep and port.isdigit() and "/" not in spec:
+        return (host or "127.0.0.1", int(port))
+    return spec
+
+
+def _is_loopback(addr: Address) -> bool:
+    if isinstance(addr, str):
+        return True  # Unix socket; access is governed by file permissions
+    host = addr[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _authkey(authkey: Optional[bytes] = None, create: bool = False) -> bytes:
+    """The shared key: explicit, then $AUDIOBOT_SEP_AUTHKEY, then KEY_FILE.
+
+    With `create` (the service side) a missing KEY_FILE is generated with a
+    random key, readable only by its owner.
+    """
+    if authkey:
+        return authkey
+    env = os.getenv(AUTHKEY_ENV, "")
+    if env:
+        return env.encode()
+    if KEY_FILE.is_file():
+        return KEY_FILE.read_bytes().strip()
+    if not create:
+        raise RuntimeError(f"no separation service key: set {AUTHKEY_ENV} or start serve-sep here to create {KEY_FILE}")
+    KEY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    try:
+        fd = os.open(str(KEY_FILE), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return KEY_FILE.read_bytes().strip()  # another service won the race
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def serve(address: str = DEFAULT_ADDRESS, loader: str = DEFAULT_LOADER, authkey: Optional[bytes] = None, preload: Tuple[str, ...] = (), log=print) -> None:
+    """Run the service until a `shutdown` request arrives.
+
+    Raises RuntimeError for a non-loopback TCP address unless the key was
+    given explicitly (`authkey` or $AUDIOBOT_SEP_AUTHKEY): the connection
+    carries pickles, so a guessable or shared-by-accident key is remote code
+    execution.
+    """
+    addr = parse_address(address)
+    if not _is_loopback(addr) and not (authkey or os.getenv(AUTHKEY_ENV)):
+        raise RuntimeError(f"refusing to listen on {address} without {AUTHKEY_ENV} set")
+    key = _authkey(authkey, create=True)
+    if isinstance(addr, str) and Path(addr).exists():
+        Path(addr).unlink()  # stale socket from a previous run
+    host = ModelHost(loader)
+    job_lock = threading.Lock()
+    for name in preload:
+        log(f"loaded {name} in {host.load(name):.1f}s")
+    listener = Listener(addr, authkey=key)
+    stop = threading.Event()
+
+    def handle(conn) -> None:
+        with conn:
+            while not stop.is_set():
+                try:
+                    req = conn.recv()
+                except (EOFError, OSError):
+                    return
+                op = req.pop("op", "")
+                if op == "ping":
+                    res: Dict[str, Any] = {"ok": True, "models": sorted(host.models), "loader": host.loader, "pid": os.getpid()}
+                elif op == "separate":
+                    with job_lock:
+                        res = host.separate(**req)
+                    log(f"{Path(req.get('input_path', '')).name}: {res['log']} in {res['elapsed']:.1f}s")
+                elif op == "shutdown":
+                    stop.set()
+                    conn.send({"ok": True})
+                    Client(addr, authkey=key).close()  # wake accept()
+                    return
+                else:
+                    res = {"ok": False, "log": f"unknown op: {op!r}"}
+                conn.send(res)
+
+    log(f"separation service on {address} (loader {loader})")
+    try:
+        while not stop.is_set():
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            if stop.is_set():
+                conn.close()
+                break
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        listener.close()
+
+
+class SeparationClient:
+    """Connection to a running service; `separate()` matches SeparationWorker."""
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None) -> None:
+        self.address = address
+        self._key = _authkey(authkey)
+        self._conn: Any = Client(parse_address(address), authkey=self._key)
+        self._lock = threading.Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is None
+
+    def _call(self, req: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """One request; a dropped connection is re-opened once (requests are idempotent)."""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        self._conn = Client(parse_address(self.address), authkey=self._key)
+                    self._conn.send(req)
+                    if not self._conn.poll(timeout):
+                        self.close()
+                        return {"ok": False, "log": "[timeout] separation service did not answer"}
+                    return self._conn.recv()
+                except (OSError, EOFError):
+                    self.close()
+                    if attempt:
+                        raise
+            raise AssertionError("unreachable")
+
+    def ping(self, timeout: Optional[float] = 5.0) -> Dict[str, Any]:
+        return self._call({"op": "ping"}, timeout)
+
+    def separate(
+        self,
+        input_path: Path,
+        out_dir: Path,
+        model: str = DEFAULT_MODEL,
+        stems: int = 4,
+        two_stems_target: str = "vocals",
+        name_template: str = "{stem}_{source}.wav",
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        req = {"op": "separate", **separate_request(input_path, out_dir, model, stems, two_stems_target, name_template)}
+        return self._call(req, timeout)
+
+    def shutdown(self) -> None:
+        self._call({"op": "shutdown"}, 5.0)
+        self.close()
+
+    def close(self) -> None:
+        conn, self._conn = self._conn, None
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
+
+
+_LOCAL: Dict[str, SeparationWorker] = {}
+_CLIENTS: Dict[str, SeparationClient] = {}
+_LOCAL_LOCK = threading.Lock()
+
+
+def _close_local() -> None:
+    for w in _LOCAL.values():
+        w.close()
+    _LOCAL.clear()
+    for c in _CLIENTS.values():
+        c.close()
+    _CLIENTS.clear()
+
+
+def get_separator(loader: Optional[str] = None) -> Union[SeparationClient, SeparationWorker]:
+    """The shared separator for this process.
+
+    With $AUDIOBOT_SEP_ADDRESS set (and no explicit `loader`) this connects
+    to the running service, once per process and address; if it is
+    unreachable, or not configured, a process-wide SeparationWorker for
+    `loader` is used instead.
+    """
+    addr = os.getenv(SERVICE_ENV, "")
+    with _LOCAL_LOCK:
+        if not (_LOCAL or _CLIENTS):
+            atexit.register(_close_local)
+        if addr and loader is None:
+            client = _CLIENTS.get(addr)
+            if client is not None and not client.closed:
+                return client
+            _CLIENTS.pop(addr, None)
+            try:
+                client = SeparationClient(addr)
+                if client.ping().get("ok"):
+                    _CLIENTS[addr] = client
+                    return client
+                client.close()
+            except (OSError, EOFError, RuntimeError, AuthenticationError):
+                pass
+        key = loader or DEFAULT_LOADER
+        if key not in _LOCAL:
+            _LOCAL[key] = SeparationWorker(key)
+        return _LOCAL[key].start()
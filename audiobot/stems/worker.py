@@ -0,0 +1,224 @@
+"""Long-lived stem separation worker.
+
+`demucs_vocals` and the `demucs` CLI start a new interpreter per file, which
+re-imports torch and reloads the weights every time. `SeparationWorker` runs
+one spawned process that keeps each loaded model resident by name and serves
+`separate` requests over a pair of multiprocessing queues; files are passed
+by path, so no audio crosses the pipe. `stems.service` serves the same
+requests to other processes over a local socket.
+
+Models come from a loader, given as a "module:function" string so the spawned
+process can import it. A loader takes a model name and returns a separator
+`fn(wav[C, T] float32, sr) -> ({source: wav[C, T]}, out_sr)`. The default
+runs Demucs in-process.
+"""
+
+from __future__ import annotations
+
+import importlib
+import itertools
+import multiprocessing as mp
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+DEFAULT_LOADER = "audiobot.stems.worker:load_demucs"
+DEFAULT_MODEL = "htdemucs"
+
+Separator = Callable[[np.ndarray, int], Tuple[Dict[str, np.ndarray], int]]
+
+
+def load_demucs(name: str = DEFAULT_MODEL) -> Separator:
+    """In-process Demucs separator (same normalization as `demucs.separate`)."""
+    import torch
+    from demucs.apply import apply_model  # type: ignore
+    from demucs.pretrained import get_model  # type: ignore
+
+    model = get_model(name)
+    model.eval()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model.to(device)
+
+    def separate(wav: np.ndarray, sr: int) -> Tuple[Dict[str, np.ndarray], int]:
+        if sr != model.samplerate:
+            from scipy.signal import resample_poly  # type: ignore
+
+            g = np.gcd(int(sr), int(model.samplerate))
+            wav = resample_poly(wav, model.samplerate // g, sr // g, axis=1).astype(np.float32)
+        if wav.shape[0] != model.audio_channels:
+            wav = np.repeat(wav.mean(axis=0, keepdims=True), model.audio_channels, axis=0)
+        x = torch.from_numpy(np.ascontiguousarray(wav, dtype=np.float32))
+        ref = x.mean(0)
+        mean, std = ref.mean(), ref.std() + 1e-8
+        with torch.no_grad():
+            out = apply_model(model, ((x - mean) / std)[None].to(device), split=True, overlap=0.25, progress=False)[0]
+        out = (out * std + mean).cpu().numpy()
+        return {src: out[i] for i, src in enumerate(model.sources)}, int(model.samplerate)
+
+    return separate
+
+
+def separate_request(input_path: Path, out_dir: Path, model: str, stems: int, two_stems_target: str, name_template: str) -> Dict[str, Any]:
+    return {
+        "input_path": str(Path(input_path).resolve()),
+        "out_dir": str(Path(out_dir).resolve()),
+        "model": model,
+        "stems": int(stems),
+        "two_stems_target": two_stems_target,
+        "name_template": name_template,
+    }
+
+
+def resolve_loader(spec: str) -> Callable[[str], Separator]:
+    mod, _, fn = spec.partition(":")
+    return getattr(importlib.import_module(mod), fn or "load")
+
+
+def stems_mode(sources: Dict[str, np.ndarray], stems: int = 4, two_stems_target: str = "vocals") -> Dict[str, np.ndarray]:
+    """All sources, or (target, no_target) for two-stem mode."""
+    if stems != 2:
+        return sources
+    if two_stems_target not in sources:
+        raise ValueError(f"model has no '{two_stems_target}' source (has: {', '.join(sources)})")
+    rest = sum(v for k, v in sources.items() if k != two_stems_target)
+    return {two_stems_target: sources[two_stems_target], f"no_{two_stems_target}": rest}
+
+
+def write_stems(sources: Dict[str, np.ndarray], sr: int, input_path: Path, out_dir: Path, name_template: str = "{stem}_{source}.wav") -> List[str]:
+    import soundfile as sf  # type: ignore
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, audio in sources.items():
+        target = out_dir / name_template.format(stem=Path(input_path).stem, source=name)
+        if target.exists():
+            target.unlink()  # may be a hardlink into the stem cache; never write through it
+        sf.write(str(target), np.asarray(audio, dtype=np.float32).T, sr)
+        written.append(str(target))
+    return written
+
+
+def run_separation(
+    separator: Separator,
+    input_path: Path,
+    out_dir: Path,
+    stems: int = 4,
+    two_stems_target: str = "vocals",
+    name_template: str = "{stem}_{source}.wav",
+) -> Dict[str, Any]:
+    """Separate one file and write one WAV per source into `out_dir`."""
+    import soundfile as sf  # type: ignore
+
+    wav, sr = sf.read(str(input_path), always_2d=True, dtype="float32")
+    sources, out_sr = separator(wav.T, sr)
+    sources = stems_mode(sources, stems, two_stems_target)
+    return {"stems": write_stems(sources, out_sr, input_path, out_dir, name_template), "sample_rate": out_sr}
+
+
+class ModelHost:
+    """Loaded separators by model name; `separate()` loads on first use."""
+
+    def __init__(self, loader: str = DEFAULT_LOADER) -> None:
+        self.loader = loader
+        self._load: Optional[Callable[[str], Separator]] = None
+        self.models: Dict[str, Separator] = {}
+
+    def load(self, model: str) -> float:
+        """Make `model` resident; returns the seconds spent loading (0 if it already was)."""
+        if model in self.models:
+            return 0.0
+        t0 = time.perf_counter()
+        if self._load is None:
+            self._load = resolve_loader(self.loader)
+        self.models[model] = self._load(model)
+        return time.perf_counter() - t0
+
+    def separate(self, model: str = DEFAULT_MODEL, **kw: Any) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            load_s = self.load(model)
+            res = {"ok": True, "model": model, "load_s": load_s, **run_separation(self.models[model], **kw)}
+            res["log"] = f"separated with {model} ({'loaded' if load_s else 'resident'})"
+        except Exception as e:
+            res = {"ok": False, "log": f"{type(e).__name__}: {e}", "trace": traceback.format_exc()}
+        res["elapsed"] = time.perf_counter() - t0
+        return res
+
+
+def _serve(requests: "mp.Queue", responses: "mp.Queue", loader: str) -> None:
+    host = ModelHost(loader)
+    while True:
+        req = requests.get()
+        if req is None:
+            break
+        job_id, kw = req
+        responses.put((job_id, host.separate(**kw)))
+
+
+class SeparationWorker:
+    """One spawned process with resident models; `separate()` is thread-safe."""
+
+    def __init__(self, loader: str = DEFAULT_LOADER) -> None:
+        self.loader = loader
+        self._proc: Optional[mp.process.BaseProcess] = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def start(self) -> "SeparationWorker":
+        if self._proc is None or not self._proc.is_alive():
+            ctx = mp.get_context("spawn")
+            self._req, self._resp = ctx.Queue(), ctx.Queue()
+            self._proc = ctx.Process(target=_serve, args=(self._req, self._resp, self.loader), daemon=True, name="audiobot-separation")
+            self._proc.start()
+        return self
+
+    def separate(
+        self,
+        input_path: Path,
+        out_dir: Path,
+        model: str = DEFAULT_MODEL,
+        stems: int = 4,
+        two_stems_target: str = "vocals",
+        name_template: str = "{stem}_{source}.wav",
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        with self._lock:  # one job at a time; the worker is sequential anyway
+            self.start()
+            job_id = next(self._ids)
+            self._req.put((job_id, separate_request(input_path, out_dir, model, stems, two_stems_target, name_template)))
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                try:
+                    got, res = self._resp.get(timeout=1.0)
+                except Exception:
+                    if self._proc is None or not self._proc.is_alive():
+                        return {"ok": False, "log": "separation worker exited"}
+                    if deadline is not None and time.monotonic() > deadline:
+                        self.close(kill=True)
+                        return {"ok": False, "log": "[timeout] separation exceeded timeout"}
+                    continue
+                if got == job_id:
+                    return res
+
+    def close(self, kill: bool = False) -> None:
+        if self._proc is None:
+            return
+        if self._proc.is_alive() and not kill:
+            self._req.put(None)
+            self._proc.join(timeout=10)
+        if self._proc.is_alive():
+            self._proc.kill()
+            self._proc.join()
+        self._proc = None
+
+    def __enter__(self) -> "SeparationWorker":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 def upload_if_configured(local_path: str) -> Optional[Dict[str, str]]:
     """
@@ -32,3 +37,197 @@ def upload_if_configured(local_path: str) -> Optional[Dict[str, str]]:
         return {"gs_uri": f"gs://{bucket_name}/{obj_name}", "object_name": obj_name}
     except Exception:
         return None
+
+
+# ---------------------------------------------------------------------------
+# Prefix sync (dataset staging)
+# ---------------------------------------------------------------------------
+
+SYNC_MANIFEST = ".gcs_sync.json"
+
+
+def parse_gs_uri(uri: str) -> Tuple[str, str]:
+    """Split gs://bucket/prefix into (bucket, prefix); the prefix is treated as a directory."""
+    assert uri.startswith("gs://"), "prefix must start with gs://"
+    bucket, _, key = uri[len("gs://"):].partition("/")
+    key = key.strip("/")
+    return bucket, (key + "/" if key else "")
+
+
+def storage_client():
+    """storage.Client(); talks to a local fake server when STORAGE_EMULATOR_HOST is set."""
+    from google.cloud import storage  # type: ignore
+
+    if os.getenv("STORAGE_EMULATOR_HOST"):
+        from google.auth.credentials import AnonymousCredentials  # type: ignore
+
+        return storage.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT", "test"), credentials=AnonymousCredentials())
+    return storage.Client()
+
+
+def _file_checksums(path: Path, want_crc: bool, want_md5: bool) -> Dict[str, str]:
+    crc = None
+    if want_crc:
+        try:
+            import google_crc32c  # type: ignore  # ships with google-cloud-storage
+
+            crc = google_crc32c.Checksum()
+        except Exception:
+            crc = None
+    md5 = hashlib.md5() if (want_md5 or (want_crc and crc is None)) else None
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            if crc is not None:
+                crc.update(chunk)
+            if md5 is not None:
+                md5.update(chunk)
+    out: Dict[str, str] = {}
+    if crc is not None:
+        out["crc32c"] = base64.b64encode(crc.digest()).decode("ascii")
+    if md5 is not None:
+        out["md5"] = base64.b64encode(md5.digest()).decode("ascii")
+    return out
+
+
+def _matches(path: Path, remote: Dict[str, Any]) -> bool:
+    """Verify a local file against the object's crc32c (preferred) or md5."""
+    got = _file_checksums(path, bool(remote.get("crc32c")), bool(remote.get("md5")))
+    if remote.get("crc32c") and "crc32c" in got:
+        return got["crc32c"] == remote["crc32c"]
+    if remote.get("md5") and "md5" in got:
+        return got["md5"] == remote["md5"]
+    return path.stat().st_size == remote["size"]
+
+
+def _load_sync_manifest(dst: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        return json.loads((dst / SYNC_MANIFEST).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_sync_manifest(dst: Path, entries: Dict[str, Dict[str, Any]]) -> None:
+    tmp = dst / (SYNC_MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(entries), encoding="utf-8")
+    os.replace(tmp, dst / SYNC_MANIFEST)
+
+
+def _download_one(bucket, remote: Dict[str, Any], local: Path) -> Tuple[int, bool]:
+    """Download into `<local>.part`, resuming a previous partial; returns (bytes fetched, resumed)."""
+    local.parent.mkdir(parents=True, exist_ok=True)
+    part = local.with_name(local.name + ".part")
+    # pin the generation so a resumed tail can't come from a newer object
+    blob = bucket.blob(remote["name"], generation=remote["generation"])
+    for attempt in range(2):
+        offset = part.stat().st_size if part.exists() else 0
+        if offset > remote["size"]:
+            offset = 0
+        fetched = 0
+        if offset < remote["size"]:
+            with open(part, "ab" if offset else "wb") as f:
+                if offset:
+                    blob.download_to_file(f, start=offset, checksum=None)
+                else:
+                    blob.download_to_file(f, checksum=None)
+            fetched = part.stat().st_size - offset
+        if part.stat().st_size == remote["size"] and _matches(part, remote):
+            os.replace(part, local)
+            return fetched, offset > 0
+        part.unlink()  # corrupt or stale partial: start over once
+    raise RuntimeError(f"checksum mismatch for gs://{bucket.name}/{remote['name']}")
+
+
+def sync_prefix(
+    uri: str,
+    dst_dir: Path,
+    workers: int = 8,
+    client=None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Mirror gs://bucket/prefix into `dst_dir`, keeping paths relative to the prefix.
+
+    Objects already present (same generation/size/checksum as recorded in
+    `dst_dir/.gcs_sync.json`, or a local file whose size and crc32c/md5 match)
+    are skipped; the rest are fetched by a pool of `workers` threads. Partial
+    downloads are kept as `.part` files and resumed with ranged reads on the
+    next run. `client` defaults to `storage_client()`, so tests can point it
+    at a fake GCS server.
+    """
+    t0 = time.perf_counter()
+    dst = Path(dst_dir)
+    dst.mkdir(parents=True, exist_ok=True)
+    bucket_name, key_prefix = parse_gs_uri(uri)
+    client = client or storage_client()
+    bucket = client.bucket(bucket_name)
+
+    remote: Dict[str, Dict[str, Any]] = {}
+    for b in client.list_blobs(bucket_name, prefix=key_prefix):
+        rel = b.name[len(key_prefix):]
+        if not rel or rel.endswith("/"):
+            continue
+        if rel.startswith("/") or ".." in Path(rel).parts:
+            continue  # never write outside dst_dir
+        remote[rel] = {
+            "name": b.name,
+            "generation": b.generation,
+            "size": int(b.size or 0),
+            "crc32c": b.crc32c,
+            "md5": b.md5_hash,
+        }
+
+    manifest = _load_sync_manifest(dst)
+    todo: List[str] = []
+    skipped = 0
+    for rel, r in remote.items():
+        local = dst / rel
+        m = manifest.get(rel)
+        if local.exists():
+            st = local.stat()
+            if m is not None and m.get("generation") == r["generation"] and m.get("size") == st.st_size and m.get("mtime_ns") == st.st_mtime_ns:
+                skipped += 1
+                continue
+            if st.st_size == r["size"] and _matches(local, r):
+                manifest[rel] = dict(r, mtime_ns=st.st_mtime_ns)
+                skipped += 1
+                continue
+        todo.append(rel)
+
+    stats = {"downloaded": 0, "resumed": 0, "bytes": 0}
+    failed: List[Dict[str, str]] = []
+    done_since_save = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            futs = {pool.submit(_download_one, bucket, remote[rel], dst / rel): rel for rel in todo}
+            for fut in as_completed(futs):
+                rel = futs[fut]
+                try:
+                    fetched, resumed = fut.result()
+                except Exception as e:
+                    failed.append({"path": rel, "error": str(e)})
+                    continue
+                manifest[rel] = dict(remote[rel], mtime_ns=(dst / rel).stat().st_mtime_ns)
+                stats["downloaded"] += 1
+                stats["resumed"] += int(resumed)
+                stats["bytes"] += fetched
+                done_since_save += 1
+                if done_since_save >= 100:
+                    _save_sync_manifest(dst, manifest)
+                    done_since_save = 0
+                if on_progress is not None:
+                    on_progress({"path": rel, "done": stats["downloaded"] + len(failed), "total": len(todo)})
+    finally:
+        # keep progress even when interrupted; entries for deleted objects are dropped
+        _save_sync_manifest(dst, {k: v for k, v in manifest.items() if k in remote})
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "ok": not failed,
+        "files": len(remote),
+        "downloaded": stats["downloaded"],
+        "resumed": stats["resumed"],
+        "skipped": skipped,
+        "failed": failed,
+        "bytes": stats["bytes"],
+        "elapsed": elapsed,
+        "log": f"{uri}: {stats['downloaded']} downloaded ({stats['bytes'] / 1e6:.1f} MB), {skipped} up to date, {len(failed)} failed in {elapsed:.1f}s",
+    }
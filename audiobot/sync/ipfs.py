@@ -4,8 +4,6 @@ import os
 from pathlib import Path
 from typing import Optional, Dict
 
-import requests  # type: ignore
-
 
 def pin_file(local_path: str) -> Optional[Dict[str, str]]:
     """
@@ -18,6 +16,8 @@ def pin_file(local_path: str) -> Optional[Dict[str, str]]:
     api = os.getenv("IPFS_API")
     if not api:
         return None
+    import requests  # type: ignore
+
     api = api.rstrip("/")
     url = f"{api}/api/v0/add?pin=true"
     with open(local_path, "rb") as f:
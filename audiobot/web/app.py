@@ -7,18 +7,18 @@ from pathlib import Path
 import shutil
 from typing import List, Optional
 
-from fastapi import FastAPI, UploadFile, File, Form, Depends, Header, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Form, Depends, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 from audiobot.config import SETTINGS
 import requests  # type: ignore
-from audiobot.core import Bot
+from audiobot.core import get_bot
 from pathlib import Path
 from audiobot.memory import Memory
 from audiobot.ai import Advisor
-from audiobot.processing.clean import clean_audio as py_clean_audio
 
 
 def _auth_dep(authorization: str | None = Header(default=None)):
@@ -68,11 +68,36 @@ def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "presets": presets, "outputs": outputs})
 
 
+def _job_filters(kind: str, ok: str, since: str, until: str) -> dict:
+    return {
+        "kind": kind.strip() or None,
+        "ok": {"1": True, "true": True, "0": False, "false": False}.get(ok.strip().lower()),
+        "since": since.strip() or None,
+        "until": until.strip() or None,
+    }
+
+
 @app.get("/history")
-def history(request: Request):
+def history(request: Request, kind: str = "", ok: str = "", since: str = "", until: str = "", before: Optional[int] = None, limit: int = 100):
+    mem = Memory()
+    mem.flush(2.0)  # include jobs still in this process's write-behind journal
+    page = mem.job_page(limit=max(1, min(limit, 500)), before=before, **_job_filters(kind, ok, since, until))
+    filters = {"kind": kind, "ok": ok, "since": since, "until": until, "limit": limit}
+    return templates.TemplateResponse("history.html", {"request": request, "jobs": page["jobs"], "next": page["next"], "filters": filters})
+
+
+@app.get("/api/jobs")
+def api_jobs(kind: str = "", ok: str = "", since: str = "", until: str = "", before: Optional[int] = None, limit: int = 100):
+    """Job history as JSON; follow `next` (pass it as `before`) for older jobs."""
     mem = Memory()
-    jobs = mem.list_jobs(limit=100)
-    return templates.TemplateResponse("history.html", {"request": request, "jobs": jobs})
+    mem.flush(2.0)
+    return mem.job_page(limit=max(1, min(limit, 500)), before=before, **_job_filters(kind, ok, since, until))
+
+
+@app.get("/api/rollups")
+def api_rollups(kind: str = "", since: str = ""):
+    """Daily per-kind job counts, ok rate and metric mean/p95 (kept after jobs are pruned)."""
+    return {"days": Memory().rollups(kind=kind.strip() or None, since=since.strip() or None)}
 
 
 @app.get("/download/{name}")
@@ -159,7 +184,7 @@ async def api_advice(file: UploadFile | None = File(default=None), context: str
 
 @app.post("/api/transcribe")
 async def api_transcribe(file: UploadFile = File(...)):
-    bot = Bot()
+    bot = get_bot()
     tmp = UPLOADS_DIR / "transcribe_input.wav"
     tmp.write_bytes(await file.read())
     res = bot.skills["transcribe"].run(tmp)
@@ -197,11 +222,12 @@ async def process(
     ml_chunk_seconds: float = Form(1.0),
     ml_overlap: float = Form(0.1),
     ml_device: str = Form(""),
+    ml_vad_gate: bool = Form(False),
     keep_float: bool = Form(False),
     fast_mode: bool = Form(False),
     download: bool = Form(False),
 ):
-    bot = Bot()
+    bot = get_bot()
     results = []
     # Resolve DB presets when requested
     selected_preset = (preset or "").strip()
@@ -215,15 +241,22 @@ async def process(
         # ML denoiser path (takes precedence if enabled and model provided)
         if ml_enable and ml_model.strip():
             den_out = OUTPUTS_DIR / f"{Path(in_name).stem}_denoised.wav"
+            model_spec = ml_model.strip()
+            if model_spec == "auto" and fast_mode:
+                # registry picks the largest model that stays well under realtime
+                from ..skills.ml_registry import FAST_RTF
+
+                model_spec = f"auto:{FAST_RTF}"
             try:
-                res = Bot().skills["denoise"].run(
+                res = get_bot().skills["denoise"].run(
                     in_path,
                     den_out,
-                    model_path=ml_model.strip(),
+                    model_path=model_spec,
                     sample_rate=int(ml_sample_rate),
                     chunk_seconds=float(ml_chunk_seconds),
                     overlap_seconds=float(ml_overlap),
                     device=(ml_device.strip() or None),
+                    vad_gate=bool(ml_vad_gate),
                 )
                 ok = bool(res.get("ok"))
                 log = str(res.get("log", ""))
@@ -273,9 +306,8 @@ async def process(
             )
             # If a DB preset is chosen (value like "db:NAME"), merge stored params
             if selected_preset.lower().startswith("db:"):
-                from audiobot.memory import Memory
                 name = selected_preset.split(":",1)[1]
-                dbp = Memory().get_preset(name)
+                dbp = bot.memory.get_preset(name)  # served from the in-process preset cache
                 if isinstance(dbp, dict) and dbp:
                     params.update(dbp)
             if fast_mode:
@@ -290,6 +322,8 @@ async def process(
             log = str(res.get("log", ""))[-2000:]
         else:
             try:
+                from audiobot.processing.clean import clean_audio as py_clean_audio
+
                 py_clean_audio(str(in_path), str(out_path), target_lufs=-14.0, deess=True)
                 ok = True
                 log = "python-clean"
@@ -314,13 +348,24 @@ async def process(
 
 
 @app.post("/separate")
-async def separate(request: Request, file: UploadFile = File(...), model: str = Form("htdemucs"), stems: int = Form(4), two_stems_target: str = Form("vocals")):
-    bot = Bot()
+async def separate(
+    request: Request,
+    file: UploadFile = File(...),
+    model: str = Form("htdemucs"),
+    stems: int = Form(4),
+    two_stems_target: str = Form("vocals"),
+    jobs: int = Form(1),
+    segment: float = Form(0.0),
+    overlap: float = Form(1.0),
+):
+    bot = get_bot()
     raw = await file.read()
     in_name = file.filename or "input.wav"
     in_path = UPLOADS_DIR / in_name
     in_path.write_bytes(raw)
-    res = bot.skills["separate"].run(in_path, OUTPUTS_DIR, model=model, stems=int(stems), two_stems_target=two_stems_target)
+    res = bot.skills["separate"].run(
+        in_path, OUTPUTS_DIR, model=model, stems=int(stems), two_stems_target=two_stems_target, jobs=int(jobs), segment=float(segment) or None, overlap=float(overlap)
+    )
     base = Path(in_name).stem
     out = {
         "input": in_name,
@@ -332,9 +377,46 @@ async def separate(request: Request, file: UploadFile = File(...), model: str =
     return templates.TemplateResponse("result.html", {"request": request, "results": [out]})
 
 
+@app.post("/vocal-chain")
+async def vocal_chain(
+    request: Request,
+    file: UploadFile = File(...),
+    model: str = Form("htdemucs"),
+    target: str = Form("vocals"),
+    preset: str = Form(""),
+    ml_model: str = Form(""),
+    jobs: int = Form(1),
+    segment: float = Form(0.0),
+    overlap: float = Form(1.0),
+    keep_float: bool = Form(False),
+):
+    bot = get_bot()
+    raw = await file.read()
+    in_name = file.filename or "input.wav"
+    in_path = UPLOADS_DIR / in_name
+    in_path.write_bytes(raw)
+    res = await run_in_threadpool(
+        bot.skills["vocal_chain"].run,
+        in_path,
+        OUTPUTS_DIR,
+        model=model,
+        target=target,
+        preset=preset.strip(),
+        ml_model=ml_model.strip(),
+        jobs=int(jobs),
+        segment=float(segment) or None,
+        overlap=float(overlap),
+        keep_float=bool(keep_float),
+    )
+    log = str(res.get("log", ""))[-2000:]
+    vocal = {"input": in_name, "ok": bool(res.get("ok")), "output": Path(res["output"]).name if res.get("output") else None, "log": log}
+    stems = {"input": in_name, "ok": bool(res.get("stems")), "stems": res.get("stems", []), "base": Path(in_name).stem, "log": ""}
+    return templates.TemplateResponse("result.html", {"request": request, "results": [vocal, stems]})
+
+
 @app.post("/download-audio")
 async def download_audio(request: Request, url: str = Form(...), separate: bool = Form(False)):
-    bot = Bot()
+    bot = get_bot()
     # Step 1: download to uploads
     d = bot.skills["download"].run(url, UPLOADS_DIR)
     if not d.get("ok") or not d.get("path"):
@@ -364,10 +446,59 @@ async def download_audio(request: Request, url: str = Form(...), separate: bool
     return templates.TemplateResponse("result.html", {"request": request, "results": results})
 
 
+@app.websocket("/ws/denoise")
+async def ws_denoise(
+    websocket: WebSocket,
+    model: str = "",
+    sample_rate: int = 48000,
+    frame_ms: float = 10.0,
+    fmt: str = "f32",
+):
+    """Live causal denoise: send raw mono PCM frames (f32 or s16 little-endian), receive denoised PCM.
+
+    Algorithmic latency is one frame (`frame_ms`); see audiobot.skills.ml_stream.
+    """
+    import numpy as np
+    from audiobot.skills.ml_stream import load_streaming_denoiser
+
+    await websocket.accept()
+    dtype = np.int16 if fmt == "s16" else np.float32
+    try:
+        engine = await run_in_threadpool(load_streaming_denoiser, model.strip(), int(sample_rate), float(frame_ms))
+    except Exception as e:
+        await websocket.send_json({"ok": False, "error": f"cannot load streaming model: {e}"})
+        await websocket.close(code=1011)
+        return
+    await websocket.send_json({
+        "ok": True,
+        "sample_rate": engine.sample_rate,
+        "frame": engine.frame,
+        "latency_ms": engine.latency_ms,
+        "fmt": "s16" if dtype is np.int16 else "f32",
+    })
+    try:
+        while True:
+            data = await websocket.receive_bytes()
+            if len(data) % np.dtype(dtype).itemsize:
+                await websocket.send_json({"ok": False, "error": f"frame of {len(data)} bytes is not a whole number of {'s16' if dtype is np.int16 else 'f32'} samples"})
+                await websocket.close(code=1003)
+                return
+            x = np.frombuffer(data, dtype=dtype)
+            if dtype is np.int16:
+                x = x.astype(np.float32) / 32768.0
+            y = await run_in_threadpool(engine.process, x)
+            if len(y):
+                if dtype is np.int16:
+                    y = (y * 32767.0).astype(np.int16)
+                await websocket.send_bytes(y.astype(dtype).tobytes())
+    except WebSocketDisconnect:
+        pass
+
+
 @app.post("/batch")
 async def batch(files: List[str], out_dir: Optional[str] = None):
     # Legacy JSON batch endpoint retained for compatibility
-    bot = Bot()
+    bot = get_bot()
     out = Path(out_dir or OUTPUTS_DIR)
     out.mkdir(parents=True, exist_ok=True)
     done = []